@@ -0,0 +1,160 @@
+"""
+Concurrent-request throughput of blocking vs async database sessions.
+
+Two small apps serve the same endpoint, which lists a user's contacts with
+a query that takes ``--query-ms`` milliseconds on the database side
+(simulated with a ``sleep_ms`` SQL function registered on every SQLite
+connection):
+
+- ``sync``: the previous layout, a blocking ``Session`` used inside an
+  ``async def`` handler, so every query stalls the event loop.
+- ``async``: the current layout, an ``AsyncSession`` on aiosqlite, so the
+  loop keeps serving other requests while a query is running.
+
+Both apps are driven in-process through ``httpx.ASGITransport`` with
+``--concurrency`` requests in flight.
+
+Usage::
+
+    python -m benchmarks.bench_async_db --requests 200 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import date
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.models.models import Base, ContactDB, UserDB
+
+
+def _sleep_ms(ms):
+    time.sleep(ms / 1000)
+    return 0
+
+
+def _register_sleep(dbapi_connection, connection_record):
+    dbapi_connection.create_function("sleep_ms", 1, _sleep_ms)
+
+
+def seed(path: str, contacts: int) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(UserDB(id=1, username="bench", email="bench@example.com", password="x", confirmed=True))
+        db.add_all(
+            ContactDB(first_name=f"First{i}", last_name=f"Last{i}", email=f"c{i}@example.com",
+                      phone_number="000", birthday=date(1990, 1 + i % 12, 1 + i % 28), user_id=1)
+            for i in range(contacts)
+        )
+        db.commit()
+    engine.dispose()
+
+
+def slow_contacts_query(query_ms: int):
+    # The uncorrelated subquery is evaluated once per statement, not per row
+    delay = select(func.sleep_ms(query_ms)).scalar_subquery()
+    return select(ContactDB).filter(ContactDB.user_id == 1, delay == 0)
+
+
+def build_sync_app(path: str, query_ms: int, pool_size: int) -> FastAPI:
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, pool_size=pool_size)
+    event.listen(engine, "connect", _register_sleep)
+    local = sessionmaker(bind=engine, autoflush=False)
+    app = FastAPI()
+
+    def get_db():
+        db = local()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @app.get("/contacts")
+    async def contacts(db: Session = Depends(get_db)):
+        return len(db.scalars(slow_contacts_query(query_ms)).all())
+
+    app.state.dispose = engine.dispose
+    return app
+
+
+def build_async_app(path: str, query_ms: int, pool_size: int) -> FastAPI:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=AsyncAdaptedQueuePool, pool_size=pool_size)
+    event.listen(engine.sync_engine, "connect", _register_sleep)
+    local = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    app = FastAPI()
+
+    async def get_db():
+        async with local() as db:
+            yield db
+
+    @app.get("/contacts")
+    async def contacts(db: AsyncSession = Depends(get_db)):
+        return len((await db.scalars(slow_contacts_query(query_ms))).all())
+
+    app.state.dispose = engine.dispose
+    return app
+
+
+async def drive(app: FastAPI, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get("/contacts")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    # Close pooled connections while the loop that opened them is still running
+    disposed = app.state.dispose()
+    if asyncio.iscoroutine(disposed):
+        await disposed
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--contacts", type=int, default=100)
+    parser.add_argument("--query-ms", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.contacts)
+        results = {}
+        for name, build in (("sync", build_sync_app), ("async", build_async_app)):
+            # One pooled connection per in-flight request, so neither app waits on the pool
+            app = build(path, args.query_ms, args.concurrency)
+            results[name] = asyncio.run(drive(app, args.requests, args.concurrency))
+        results["speedup"] = round(results["async"]["throughput_rps"] / results["sync"]["throughput_rps"], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
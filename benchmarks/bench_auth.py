@@ -0,0 +1,91 @@
+"""
+Per-request authentication overhead with and without the access token cache.
+
+Measures two things for the same access token, once with the verified-claims
+cache disabled (every call runs the full HMAC verification in ``jwt.decode``)
+and once with it enabled:
+
+- ``get_current_user``: the dependency alone, called directly.
+- ``request``: a ``GET /secret`` through the whole ASGI stack, in process.
+
+The user is served from the in-process user cache in both runs, so the
+difference is the cost of token verification. Redis is not used.
+
+Usage::
+
+    python -m benchmarks.bench_auth --calls 20000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+from main import app
+from src.auth.auth import auth_service
+from src.models.models import UserDB
+from src.services.cache import TTLCache
+from src.services.redis_client import set_redis
+from src.services.user_cache import user_cache
+
+
+def summary(values: list[float]) -> dict:
+    values = sorted(values)
+    return {
+        "mean_us": round(statistics.mean(values) * 1e6, 2),
+        "p50_us": round(values[len(values) // 2] * 1e6, 2),
+        "p99_us": round(values[int(len(values) * 0.99) - 1] * 1e6, 2),
+    }
+
+
+async def run(token: str, calls: int, cache_size: int) -> dict:
+    auth_service.token_cache = TTLCache(maxsize=cache_size, ttl=15 * 60)
+    direct, request = [], []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await auth_service.get_current_user(token=token, db=None)
+        direct.append(time.perf_counter() - start)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"Authorization": f"Bearer {token}"}
+        for _ in range(calls):
+            start = time.perf_counter()
+            response = await client.get("/secret", headers=headers)
+            request.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+    return {
+        "get_current_user": summary(direct),
+        "request": summary(request),
+        "token_cache_hit_ratio": round(auth_service.token_cache.hit_ratio, 4),
+    }
+
+
+async def measure(calls: int) -> dict:
+    set_redis(None)
+    await user_cache.set(UserDB(id=1, username="bench", email="bench@example.com", confirmed=True))
+    token = await auth_service.create_access_token(data={"sub": "bench@example.com"})
+    result = {
+        "uncached": await run(token, calls, cache_size=0),
+        "cached": await run(token, calls, cache_size=10000),
+    }
+    for part in ("get_current_user", "request"):
+        result[f"{part}_saved_us"] = round(
+            result["uncached"][part]["mean_us"] - result["cached"][part]["mean_us"], 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+    result = asyncio.run(measure(args.calls))
+    result.update(calls=args.calls, algorithm=auth_service.ALGORITHM)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Bytes saved and latency added by response compression.
+
+Contact lists of ``--sizes`` contacts, encoded as the list endpoints encode
+them, are served through :class:`src.services.compression.CompressionMiddleware`
+with every encoding it offers, and without compression (``identity``). For
+each, the benchmark reports the bytes sent and the median time the server
+takes to produce the response, over ``--repeat`` requests driven straight
+through ASGI (no network, no client-side decoding).
+
+It then measures why large bodies are compressed in a thread pool: small
+requests are served while ``--concurrency`` large responses are being
+compressed, once with every body compressed on the event loop (``inline``)
+and once with the middleware's default offloading (``offloaded``), and the
+latency of the small requests is compared.
+
+Usage::
+
+    python -m benchmarks.bench_compression --sizes 100 1000 10000 --repeat 20
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import statistics
+import time
+
+from starlette.responses import Response
+
+from src.services.compression import AVAILABLE_ENCODINGS, CompressionMiddleware
+from src.services.serialization import dump_contact_rows
+
+
+def contact_list(size: int) -> bytes:
+    rows = [(f"First{i}", f"Last{i}", f"contact{i}@example.com", f"+38050{i:07d}",
+             datetime.date(1990, 1, 1) + datetime.timedelta(days=i % 10000), "met at a conference", i)
+            for i in range(size)]
+    return dump_contact_rows(rows)
+
+
+async def request(app, accept_encoding: str) -> int:
+    """
+    Serve one GET request through ASGI and return the number of body bytes sent.
+    """
+    sent = 0
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal sent
+        sent += len(message.get("body", b""))
+        # Writing to a socket gives the event loop a chance to run other tasks
+        await asyncio.sleep(0)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    await app(scope, receive, send)
+    return sent
+
+
+async def compare_encodings(payload: bytes, repeat: int) -> dict:
+    app = CompressionMiddleware(Response(payload, media_type="application/json"))
+    result = {}
+    for encoding in ("identity",) + AVAILABLE_ENCODINGS:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            sent = await request(app, encoding)
+            timings.append(time.perf_counter() - start)
+        result[encoding] = {"bytes": sent, "saved": round(1 - sent / len(payload), 3),
+                            "median_ms": round(statistics.median(timings) * 1000, 3)}
+    return result
+
+
+async def small_requests_under_load(large: bytes, offload_size: int, concurrency: int, repeat: int) -> dict:
+    small_app = CompressionMiddleware(Response(contact_list(10), media_type="application/json"))
+    large_app = CompressionMiddleware(Response(large, media_type="application/json"), offload_size=offload_size)
+    timings = []
+    done = asyncio.Event()
+
+    async def small():
+        # One small request every millisecond, timed from when it should have
+        # started, so time spent waiting for a blocked event loop is counted
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        while not done.is_set():
+            due += 0.001
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            await request(small_app, "gzip")
+            timings.append(loop.time() - due)
+
+    async def large_responses():
+        for _ in range(repeat):
+            await request(large_app, "gzip")
+
+    async def load():
+        await asyncio.gather(*(large_responses() for _ in range(concurrency)))
+        done.set()
+
+    await asyncio.gather(small(), load())
+    timings.sort()
+    return {"small_requests": len(timings),
+            "small_median_ms": round(statistics.median(timings) * 1000, 3),
+            "small_p95_ms": round(timings[int(len(timings) * 0.95) - 1] * 1000, 3),
+            "small_max_ms": round(timings[-1] * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    results = {"encodings": {}}
+    for size in args.sizes:
+        payload = contact_list(size)
+        results["encodings"][size] = {"payload_bytes": len(payload),
+                                      **asyncio.run(compare_encodings(payload, args.repeat))}
+    large = contact_list(max(args.sizes))
+    results["offload"] = {
+        "inline": asyncio.run(small_requests_under_load(large, len(large) + 1, args.concurrency, args.repeat)),
+        "offloaded": asyncio.run(small_requests_under_load(large, 64 * 1024, args.concurrency, args.repeat)),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
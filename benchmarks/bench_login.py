@@ -0,0 +1,140 @@
+"""
+Login throughput under concurrency: bcrypt on the event loop vs the hashing pool.
+
+Runs ``--logins`` ``POST /auth/login`` requests in process, ``--concurrency``
+at a time, against a temporary SQLite database, twice:
+
+- ``inline``: bcrypt runs directly in the request handler, as before.
+- ``pool``: bcrypt runs in the bounded ``PasswordHasher`` thread pool.
+
+While the logins run, ``GET /`` is scheduled every 10 ms to show how long an
+unrelated request waits behind password hashing.
+
+Usage::
+
+    python -m benchmarks.bench_login --logins 200 --concurrency 16 --rounds 12
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from main import app
+from src.auth.auth import auth_service
+from src.auth.hashing import PasswordHasher
+from src.db.database import get_db
+from src.models.models import Base, UserDB
+from src.services.redis_client import set_redis
+
+
+class InlineHasher(PasswordHasher):
+    """The previous behaviour: hashing on the event loop."""
+
+    async def _run(self, func, *args):
+        return func(*args)
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return round(values[max(int(len(values) * q) - 1, 0)] * 1000, 2)
+
+
+def seed(url: str, users: int, password_hash: str) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(UserDB), [
+            {"id": u, "username": f"user{u}", "email": f"user{u}@example.com", "password": password_hash,
+             "confirmed": True}
+            for u in range(1, users + 1)
+        ])
+    engine.dispose()
+
+
+async def run(client: httpx.AsyncClient, logins: int, users: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, probes = [], []
+    done = asyncio.Event()
+
+    async def login(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/auth/login", data={"username": f"user{1 + i % users}@example.com",
+                                                              "password": "password"})
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+
+    async def probe():
+        while not done.is_set():
+            # Includes the time the loop was too busy to wake the probe up
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            await client.get("/")
+            probes.append(time.perf_counter() - start - 0.01)
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+    return {
+        "logins_per_second": round(logins / elapsed, 1),
+        "login_p50_ms": percentile(latencies, 0.5),
+        "login_p99_ms": percentile(latencies, 0.99),
+        "other_request_p50_ms": percentile(probes, 0.5),
+        "other_request_max_ms": round(max(probes) * 1000, 2),
+    }
+
+
+async def measure(url: str, logins: int, users: int, concurrency: int, rounds: int, workers: int) -> dict:
+    set_redis(None)
+    engine = create_async_engine(url)
+    local = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_db():
+        async with local() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    result = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, hasher in (("inline", InlineHasher(rounds, workers, logins)),
+                             ("pool", PasswordHasher(rounds, workers, logins))):
+            auth_service.hasher = hasher
+            result[name] = await run(client, logins, users, concurrency)
+            hasher.shutdown()
+    app.dependency_overrides.pop(get_db)
+    await engine.dispose()
+    result["speedup"] = round(result["pool"]["logins_per_second"] / result["inline"]["logins_per_second"], 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(f"sqlite:///{path}", args.users, PasswordHasher(args.rounds, 1, 1).pwd_context.hash("password"))
+        result = asyncio.run(measure(f"sqlite+aiosqlite:///{path}", args.logins, args.users, args.concurrency,
+                                     args.rounds, args.workers))
+    result.update(logins=args.logins, concurrency=args.concurrency, rounds=args.rounds, workers=args.workers)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
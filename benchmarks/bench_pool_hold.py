@@ -0,0 +1,117 @@
+"""
+Pool hold time per request of request-long vs read sessions.
+
+Two small apps serve the same endpoint, which lists a user's contacts through
+the ``ContactResponse`` model, so every request serializes ``--contacts``
+contacts after its query:
+
+- ``held``: the previous ``get_db``, a plain ``AsyncSession`` that keeps its
+  connection until the request ends, serialization included.
+- ``released``: the current ``get_db`` for GET requests, a ``ReadSession`` that
+  returns its connection to the pool as soon as the query has returned.
+
+Both apps run on a pool of ``--pool-size`` connections and are driven
+in-process through ``httpx.ASGITransport`` with ``--concurrency`` requests in
+flight. Hold times come from :class:`src.db.metrics.SessionMetrics`, checkout
+waits from :class:`src.db.metrics.DatabaseMetrics`.
+
+Usage::
+
+    python -m benchmarks.bench_pool_hold --requests 300 --concurrency 20 --pool-size 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from benchmarks.bench_async_db import seed
+from src.db.metrics import DatabaseMetrics, InstrumentedQueuePool, SessionMetrics
+from src.db.routing import ReadSession, RequestSession
+from src.models.models import UserDB
+from src.repository import contacts as repository_contacts
+from src.schemas.schemas import ContactResponse
+
+USER = UserDB(id=1, username="bench", email="bench@example.com")
+
+
+def build_app(path: str, session_class: type, pool_size: int) -> FastAPI:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=InstrumentedQueuePool,
+                                 pool_size=pool_size, max_overflow=0)
+    pool_metrics = DatabaseMetrics(slow_query_ms=0)
+    pool_metrics.instrument(engine)
+    # RequestSession is already instrumented by src.db.database, imported through the models
+    session_metrics = SessionMetrics()
+    local = async_sessionmaker(bind=engine, class_=session_class, autoflush=False, expire_on_commit=False,
+                               sync_session_class=RequestSession)
+    app = FastAPI()
+
+    async def get_db():
+        async with local() as db:
+            yield db
+        session_metrics.record(db)
+
+    @app.get("/contacts", response_model=list[ContactResponse])
+    async def contacts(db: AsyncSession = Depends(get_db)):
+        return await repository_contacts.get_contacts(db, USER)
+
+    app.state.engine = engine
+    app.state.pool_metrics = pool_metrics
+    app.state.session_metrics = session_metrics
+    return app
+
+
+async def drive(app: FastAPI, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                response = await client.get("/contacts")
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    await app.state.engine.dispose()
+    hold = app.state.session_metrics.hold_time.snapshot()
+    wait = app.state.pool_metrics.checkout_wait.snapshot()
+    return {
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "hold_mean_ms": round(hold["mean"] * 1000, 2),
+        "hold_p95_ms": round(hold["p95"] * 1000, 2),
+        "checkout_wait_mean_ms": round(wait["mean"] * 1000, 2),
+        "checkout_wait_p95_ms": round(wait["p95"] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--contacts", type=int, default=500)
+    parser.add_argument("--pool-size", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.contacts)
+        results = {}
+        for name, session_class in (("held", AsyncSession), ("released", ReadSession)):
+            app = build_app(path, session_class, args.pool_size)
+            results[name] = asyncio.run(drive(app, args.requests, args.concurrency))
+        results["hold_reduction"] = round(1 - results["released"]["hold_mean_ms"] / results["held"]["hold_mean_ms"], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Contact list response time of ORM objects vs plain rows.
+
+For each list size, a user with that many contacts is listed through two
+small apps serving the same endpoint:
+
+- ``orm``: the previous path, ORM objects returned through
+  ``response_model=list[ContactResponse]``, so FastAPI validates a model per
+  contact and encodes the list with its default JSON encoder.
+- ``rows``: the current path, column tuples from
+  :func:`src.repository.contacts.get_contact_rows` encoded with orjson by
+  :class:`src.services.serialization.ContactListResponse`.
+
+The query alone is timed separately for both, so the rest of the request time
+is mostly serialization. Requests run in-process through ``httpx.ASGITransport``
+on a SQLite file database; every figure is the median of ``--repeat`` runs.
+
+Usage::
+
+    python -m benchmarks.bench_serialization --sizes 1000 10000 100000 --repeat 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from benchmarks.bench_async_db import seed
+from src.models.models import UserDB
+from src.repository import contacts as repository_contacts
+from src.schemas.schemas import ContactResponse
+from src.services.serialization import ContactListResponse
+
+USER = UserDB(id=1, username="bench", email="bench@example.com")
+
+
+def build_app(local) -> FastAPI:
+    app = FastAPI()
+
+    async def get_db():
+        async with local() as db:
+            yield db
+
+    @app.get("/orm", response_model=list[ContactResponse])
+    async def orm(db: AsyncSession = Depends(get_db)):
+        return await repository_contacts.get_contacts(db, USER)
+
+    @app.get("/rows", response_model=list[ContactResponse])
+    async def rows(db: AsyncSession = Depends(get_db)):
+        return ContactListResponse(await repository_contacts.get_contact_rows(db, USER))
+
+    return app
+
+
+async def median_ms(repeat: int, call) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - start)
+    return round(statistics.median(timings) * 1000, 2)
+
+
+async def measure(path: str, repeat: int) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    local = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    queries = {"orm": repository_contacts.get_contacts, "rows": repository_contacts.get_contact_rows}
+    result = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=build_app(local)), base_url="http://bench") as client:
+        for name, query in queries.items():
+            async def run_query():
+                async with local() as db:
+                    await query(db, USER)
+
+            async def run_request():
+                response = await client.get(f"/{name}")
+                response.raise_for_status()
+
+            query_ms = await median_ms(repeat, run_query)
+            total_ms = await median_ms(repeat, run_request)
+            result[name] = {"query_ms": query_ms, "total_ms": total_ms,
+                            "serialization_ms": round(total_ms - query_ms, 2)}
+    await engine.dispose()
+    result["speedup"] = round(result["orm"]["total_ms"] / result["rows"]["total_ms"], 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, f"bench-{size}.db")
+            seed(path, size)
+            results[size] = asyncio.run(measure(path, args.repeat))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
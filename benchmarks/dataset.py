@@ -0,0 +1,141 @@
+"""
+Seed a database with users and contacts for load tests and benchmarks.
+
+Creates the schema, then ``--users`` confirmed users, each with ``--contacts``
+contacts. Names are drawn from common first and last names, birthdays are
+spread over every day of the year between 1945 and 2007, and some contacts
+carry notes, so listing, searching and upcoming-birthday queries see realistic
+selectivity. The same ``--seed`` always generates the same dataset.
+
+Rows are inserted with executemany batches of SQLAlchemy Core inserts, and
+every user gets the same password hash, computed once: 100k contacts take
+about ten seconds on SQLite, most of it in the full-text search triggers.
+Users log in as ``user<n>@loadtest.example`` (n from 0) with the password
+``loadtest-password``.
+
+Usage::
+
+    python -m benchmarks.dataset --url sqlite:///./loadtest.db --users 100 --contacts 1000
+"""
+
+import argparse
+import json
+import random
+import time
+import unicodedata
+from datetime import date, timedelta
+
+from passlib.context import CryptContext
+from sqlalchemy import create_engine, insert
+
+from src.conf.config import settings
+from src.models.models import Base, ContactDB, UserDB, birthday_mmdd
+
+PASSWORD = "loadtest-password"
+
+# Rows per executemany
+BATCH_SIZE = 10000
+
+FIRST_NAMES = (
+    "Olena", "Andrii", "Iryna", "Dmytro", "Oksana", "Taras", "Kateryna", "Serhii", "Nataliia", "Oleksandr",
+    "Mariia", "Volodymyr", "Yuliia", "Mykola", "Anna", "Bohdan", "Sofiia", "Ivan", "Viktoriia", "Maksym",
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "Zoë", "José", "Ana", "Lukas", "Emma", "Noah", "Mia", "Liam", "Chloé", "Mateo",
+)
+
+LAST_NAMES = (
+    "Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Oliinyk", "Shevchuk", "Koval",
+    "Polishchuk", "Melnyk", "Boiko", "Moroz", "Lysenko", "Marchenko", "Rudenko", "Savchenko",
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Wilson", "Anderson",
+    "Müller", "Schmidt", "Rossi", "Dubois", "Novak", "García", "Fernández", "O'Brien", "Nowak", "Jensen",
+)
+
+# Range of the birthdays
+FIRST_BIRTHDAY, LAST_BIRTHDAY = date(1945, 1, 1), date(2007, 12, 31)
+
+NOTES = ("met at a conference", "neighbour", "former colleague", "school friend", "dentist", "plumber")
+
+
+def user_email(n: int) -> str:
+    return f"user{n}@loadtest.example"
+
+
+def ascii_name(name: str) -> str:
+    return unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower().replace("'", "")
+
+
+def contact_rows(rng: random.Random, user_id: int, contacts: int):
+    for i in range(contacts):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        birthday = FIRST_BIRTHDAY + timedelta(days=rng.randrange((LAST_BIRTHDAY - FIRST_BIRTHDAY).days + 1))
+        yield {
+            "first_name": first,
+            "last_name": last,
+            # Contact emails are unique across all users
+            "email": f"{ascii_name(first)}.{ascii_name(last)}.{user_id}.{i}@example.com",
+            "phone_number": f"+380{rng.randrange(10 ** 8, 10 ** 9)}",
+            "birthday": birthday,
+            "birthday_mmdd": birthday_mmdd(birthday),
+            "additional_data": rng.choice(NOTES) if rng.random() < 0.3 else None,
+            "user_id": user_id,
+        }
+
+
+def generate(url: str, users: int, contacts: int, seed: int = 0, rounds: int | None = None) -> dict:
+    """
+    Create the schema and insert the users and their contacts.
+
+    :param url: The database URL, with a synchronous driver.
+    :type url: str
+    :param users: The number of users.
+    :type users: int
+    :param contacts: The number of contacts of each user.
+    :type contacts: int
+    :param seed: The seed of the generator.
+    :type seed: int
+    :param rounds: The bcrypt rounds of the password hash; the application setting by default.
+    :type rounds: int | None
+    :return: What was generated and how long it took.
+    :rtype: dict
+    """
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    rounds = rounds or settings.bcrypt_rounds
+    password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds).hash(PASSWORD)
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        first_user = conn.execute(insert(UserDB.__table__).returning(UserDB.__table__.c.id).values(
+            username="user0", email=user_email(0), password=password, confirmed=True)).scalar()
+        conn.execute(insert(UserDB.__table__), [
+            {"username": f"user{n}", "email": user_email(n), "password": password, "confirmed": True}
+            for n in range(1, users)
+        ])
+        batch = []
+        for user_id in range(first_user, first_user + users):
+            for row in contact_rows(rng, user_id, contacts):
+                batch.append(row)
+                if len(batch) == BATCH_SIZE:
+                    conn.execute(insert(ContactDB.__table__), batch)
+                    batch = []
+        if batch:
+            conn.execute(insert(ContactDB.__table__), batch)
+    engine.dispose()
+    return {"users": users, "contacts_per_user": contacts, "seed": seed, "bcrypt_rounds": rounds,
+            "seconds": round(time.perf_counter() - started, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="sqlite:///./loadtest.db")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--contacts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bcrypt-rounds", type=int, default=None,
+                        help="fewer rounds seed faster, but logins then rehash with the configured rounds")
+    args = parser.parse_args()
+    print(json.dumps(generate(args.url, args.users, args.contacts, args.seed, args.bcrypt_rounds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Load test of the main scenarios, with throughput and latency percentiles in JSON.
+
+Runs each scenario in turn, ``--requests`` requests ``--concurrency`` at a
+time, spread over ``--users`` users of a dataset seeded by
+:mod:`benchmarks.dataset`:
+
+- ``login``: ``POST /auth/login``.
+- ``list``: ``GET /contacts/contacts/``, a page of 100 contacts.
+- ``search``: ``GET /contacts/contacts/search/`` for a common last name.
+- ``birthdays``: ``GET /contacts/contacts/birthdays/``, the next 7 days.
+- ``create``: ``POST /contacts/contacts/``.
+- ``update``: ``PUT /contacts/contacts/{contact_id}`` on the created contacts.
+- ``delete``: ``DELETE /contacts/contacts/{contact_id}`` on the created contacts,
+  leaving the dataset as it was.
+
+By default the application runs in process, on an ASGI transport, with
+``--db-url`` as its database and an in-memory Redis. With ``--url`` the
+requests go to a server already running against the same dataset; with
+``--spawn`` a uvicorn server is started for the run, with ``--db-url`` as its
+database and the Redis server of ``REDIS_HOST`` and ``REDIS_PORT``. Rate
+limits are turned off in the in-process and spawned applications, and must be
+on a server given with ``--url`` (``RATE_LIMIT_ENABLED=false``).
+
+The report holds, for each scenario, the requests per second and the latency
+percentiles in milliseconds, along with the commit under test. Saved with
+``--output``, it can be given as ``--baseline`` to a later run, which then adds
+the throughput and p95 ratios to the baseline.
+
+Usage::
+
+    python -m benchmarks.dataset --url sqlite:///./loadtest.db --users 100 --contacts 1000
+    python -m benchmarks.loadtest --db-url sqlite:///./loadtest.db --requests 500 --output before.json
+    python -m benchmarks.loadtest --db-url sqlite:///./loadtest.db --requests 500 --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.dataset import LAST_NAMES, PASSWORD, user_email
+from src.conf.config import settings
+
+SCENARIOS = ("login", "list", "search", "birthdays", "create", "update", "delete")
+
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99}
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return round(values[max(int(len(values) * q) - 1, 0)] * 1000, 2)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class LoadTest:
+    """The scenarios, run by virtual users sharing one client."""
+
+    def __init__(self, client: httpx.AsyncClient, users: int, concurrency: int):
+        self.client = client
+        self.users = users
+        self.concurrency = concurrency
+        self.tokens = []
+        self.created = []
+
+    def headers(self, i: int) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[i % self.users]}"}
+
+    async def login(self, i: int) -> httpx.Response:
+        return await self.client.post("/auth/login", data={"username": user_email(i % self.users),
+                                                           "password": PASSWORD})
+
+    async def list(self, i: int) -> httpx.Response:
+        return await self.client.get("/contacts/contacts/", headers=self.headers(i))
+
+    async def search(self, i: int) -> httpx.Response:
+        return await self.client.get("/contacts/contacts/search/", headers=self.headers(i),
+                                     params={"query": LAST_NAMES[i % len(LAST_NAMES)]})
+
+    async def birthdays(self, i: int) -> httpx.Response:
+        return await self.client.get("/contacts/contacts/birthdays/", headers=self.headers(i), params={"days": 7})
+
+    @staticmethod
+    def contact(i: int, first_name: str) -> dict:
+        return {"first_name": first_name, "last_name": "Loadtest", "email": f"loadtest.{i}@example.com",
+                "phone_number": "+380501234567", "birthday": "1990-05-17", "additional_data": "load test"}
+
+    async def create(self, i: int) -> httpx.Response:
+        response = await self.client.post("/contacts/contacts/", headers=self.headers(i),
+                                          json=self.contact(i, "Created"))
+        if response.status_code == 201:
+            self.created.append((i, response.json()["id"]))
+        return response
+
+    async def update(self, i: int) -> httpx.Response:
+        owner, contact_id = self.created[i % len(self.created)]
+        return await self.client.put(f"/contacts/contacts/{contact_id}", headers=self.headers(owner),
+                                     json=self.contact(owner, "Updated"))
+
+    async def delete(self, i: int) -> httpx.Response:
+        owner, contact_id = self.created[i]
+        return await self.client.delete(f"/contacts/contacts/{contact_id}", headers=self.headers(owner))
+
+    async def setup(self):
+        for i in range(self.users):
+            response = await self.login(i)
+            response.raise_for_status()
+            self.tokens.append(response.json()["access_token"])
+
+    async def run(self, scenario: str, requests: int) -> dict:
+        if scenario in ("update", "delete"):
+            # Only the contacts created by the run are changed, each deleted once
+            if not self.created:
+                return {"requests": 0, "skipped": "no contacts created"}
+            if scenario == "delete":
+                requests = len(self.created)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        latencies, errors = [], {}
+
+        async def one(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await getattr(self, scenario)(i)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+        return {
+            "requests": requests,
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(requests / elapsed, 1),
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 2),
+                **{name: percentile(latencies, q) for name, q in PERCENTILES.items()},
+                "max": round(max(latencies) * 1000, 2),
+            },
+        }
+
+
+async def measure(client: httpx.AsyncClient, args) -> dict:
+    test = LoadTest(client, args.users, args.concurrency)
+    await test.setup()
+    return {scenario: await test.run(scenario, args.requests) for scenario in args.scenarios}
+
+
+async def in_process(args) -> dict:
+    import fakeredis
+    from fastapi import Request
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from main import app
+    from src.db.database import READ_METHODS, engine_options, get_db, get_primary_db, to_async_url
+    from src.db.routing import ReadSession
+    from src.services.redis_client import set_redis
+
+    settings.rate_limit_enabled = False
+    set_redis(fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer()))
+    url = to_async_url(args.db_url)
+    engine = create_async_engine(url, **engine_options(url))
+    primary = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    reads = async_sessionmaker(bind=engine, class_=ReadSession, autoflush=False, expire_on_commit=False)
+
+    # The sessions of get_db, on the database under test
+    async def override_get_db(request: Request):
+        async with (reads if request.method in READ_METHODS else primary)() as db:
+            yield db
+
+    async def override_get_primary_db():
+        async with primary() as db:
+            yield db
+
+    app.dependency_overrides.update({get_db: override_get_db, get_primary_db: override_get_primary_db})
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            return await measure(client, args)
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+
+
+async def against(url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        return await measure(client, args)
+
+
+def spawn(args) -> subprocess.Popen:
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URL=args.db_url, RATE_LIMIT_ENABLED="false")
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+                               "--log-level", "warning"], env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{args.port}/")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def compare(result: dict, baseline: dict) -> dict:
+    """Throughput and p95 latency of each scenario, relative to the baseline."""
+    ratios = {}
+    for scenario, figures in result.items():
+        before = baseline["scenarios"].get(scenario, {})
+        if figures.get("requests") and before.get("requests"):
+            ratios[scenario] = {
+                "throughput": round(figures["throughput_rps"] / before["throughput_rps"], 2),
+                "p95": round(figures["latency_ms"]["p95"] / before["latency_ms"]["p95"], 2),
+            }
+    return {"commit": baseline["meta"].get("commit"), "ratios": ratios}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db-url", default="sqlite:///./loadtest.db")
+    parser.add_argument("--users", type=int, default=20, help="virtual users, among the seeded users")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="a running server, instead of the application in process")
+    target.add_argument("--spawn", action="store_true", help="start a uvicorn server for the run")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+    args.scenarios = [scenario for scenario in SCENARIOS if scenario in args.scenarios]
+
+    if args.url:
+        target_name, scenarios = args.url, asyncio.run(against(args.url, args))
+    elif args.spawn:
+        server = spawn(args)
+        try:
+            target_name = "uvicorn"
+            scenarios = asyncio.run(against(f"http://127.0.0.1:{args.port}", args))
+        finally:
+            server.terminate()
+            server.wait()
+    else:
+        target_name, scenarios = "asgi", asyncio.run(in_process(args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "target": target_name,
+            "db_url": None if args.url else args.db_url,
+            "users": args.users,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "scenarios": scenarios,
+    }
+    if args.baseline:
+        with open(args.baseline) as file:
+            report["baseline"] = compare(scenarios, json.load(file))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,23 +2,28 @@
 Main application entry point.
 
 This module initializes the FastAPI application, sets up middleware, includes routers,
-and defines the startup event for initializing the rate limiter.
+and defines the startup and shutdown events of the background services.
 
 Attributes:
     app (FastAPI): The main FastAPI application instance.
 """
 
 # main.py
-import redis.asyncio as redis
+import asyncio
 import uvicorn
 from fastapi import FastAPI, Depends
 from src.routes import contacts
 from src.routes import user
+from src.routes import metrics
 from src.auth.auth import auth_service
 from src.models.models import UserDB
 from src.conf.config import settings
-from fastapi_limiter import FastAPILimiter
+from src.services.user_cache import user_cache
+from src.services.compression import CompressionMiddleware
+from src.services.instrumentation import InstrumentationMiddleware, http_metrics
+from src.services.profiling import ProfilerMiddleware
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 
 # Initialize the FastAPI application
 app = FastAPI()
@@ -35,19 +40,56 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compress large textual responses with the best encoding the client accepts
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    offload_size=settings.compression_offload_size,
+    encodings=settings.compression_encodings,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality,
+    zstd_level=settings.compression_zstd_level,
+)
+# Profile single requests, on demand with the admin token or at random
+if settings.profiler_token or settings.profiler_sample_rate > 0:
+    app.add_middleware(
+        ProfilerMiddleware,
+        directory=settings.profiler_dir,
+        token=settings.profiler_token,
+        sample_rate=settings.profiler_sample_rate,
+        interval=settings.profiler_interval,
+        max_files=settings.profiler_max_files,
+        max_age=settings.profiler_max_age,
+    )
+# Record the latency, status and Redis and database calls of every request; added
+# last, so it also times the other middleware
+app.add_middleware(InstrumentationMiddleware, metrics=http_metrics, debug_queries=settings.db_debug_queries,
+                   n_plus_one_threshold=settings.db_n_plus_one_threshold)
 
-# Include the contacts and user routers
+# Include the contacts, user and metrics routers
 app.include_router(contacts.router)
 app.include_router(user.router)
+app.include_router(metrics.router)
+
+# Serve the avatars kept by the local avatar storage
+if settings.avatar_storage == "local":
+    app.mount(settings.avatar_url_prefix, StaticFiles(directory=settings.avatar_dir, check_dir=False), name="avatars")
 
 @app.on_event("startup")
 async def startup():
     """
-    Initializes the rate limiter by connecting to the Redis server.
+    Starts listening for user cache invalidations from other processes.
+    """
+    app.state.user_cache_listener = asyncio.create_task(user_cache.listen())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Stops the user cache invalidation listener and the password hashing threads.
     """
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
-                          decode_responses=True)
-    await FastAPILimiter.init(r)
+    app.state.user_cache_listener.cancel()
+    auth_service.hasher.shutdown()
 
 @app.get("/")
 async def start():
@@ -0,0 +1,42 @@
+"""contacts birthday_mmdd
+
+Revision ID: 5b1e7c3a9d42
+Revises: 2886065be030
+Create Date: 2026-10-18 10:12:41.511204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e7c3a9d42'
+down_revision: Union[str, None] = '2886065be030'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_mmdd', sa.Integer(), nullable=True))
+    # Backfill month * 100 + day for existing rows
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute(
+            "UPDATE contacts SET birthday_mmdd = "
+            "CAST(strftime('%m', birthday) AS INTEGER) * 100 + CAST(strftime('%d', birthday) AS INTEGER) "
+            "WHERE birthday IS NOT NULL"
+        )
+    else:
+        op.execute(
+            "UPDATE contacts SET birthday_mmdd = "
+            "CAST(EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday) AS INTEGER) "
+            "WHERE birthday IS NOT NULL"
+        )
+    op.create_index('ix_contacts_user_id_birthday_mmdd', 'contacts', ['user_id', 'birthday_mmdd'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_mmdd', table_name='contacts')
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_column('birthday_mmdd')
@@ -0,0 +1,27 @@
+"""drop users refresh token
+
+Revision ID: 7f2b9d4c6e31
+Revises: e3a8b05f7c19
+Create Date: 2026-10-18 16:20:41.508213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f2b9d4c6e31'
+down_revision: Union[str, None] = 'e3a8b05f7c19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Refresh tokens are tracked in Redis by src.services.token_store
+    op.drop_column('users', 'refresh_token')
+
+
+def downgrade() -> None:
+    op.add_column('users', sa.Column('refresh_token', sa.String(length=255), nullable=True))
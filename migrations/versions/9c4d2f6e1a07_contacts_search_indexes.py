@@ -0,0 +1,61 @@
+"""contacts search indexes
+
+Revision ID: 9c4d2f6e1a07
+Revises: 5b1e7c3a9d42
+Create Date: 2026-10-18 11:03:27.904118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4d2f6e1a07'
+down_revision: Union[str, None] = '5b1e7c3a9d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        # External-content FTS5 table with the trigram tokenizer, kept in sync by triggers
+        op.execute(
+            "CREATE VIRTUAL TABLE contacts_fts USING fts5("
+            "first_name, last_name, email, content='contacts', content_rowid='id', tokenize='trigram')"
+        )
+        op.execute(
+            "CREATE TRIGGER contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+            "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+            "VALUES (new.id, new.first_name, new.last_name, new.email); END"
+        )
+        op.execute(
+            "CREATE TRIGGER contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+            "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+            "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END"
+        )
+        op.execute(
+            "CREATE TRIGGER contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+            "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+            "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+            "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+            "VALUES (new.id, new.first_name, new.last_name, new.email); END"
+        )
+        op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+    else:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_contacts_first_name_trgm ON contacts USING gin (first_name gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_contacts_last_name_trgm ON contacts USING gin (last_name gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_contacts_email_trgm ON contacts USING gin (email gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER contacts_fts_au")
+        op.execute("DROP TRIGGER contacts_fts_ad")
+        op.execute("DROP TRIGGER contacts_fts_ai")
+        op.execute("DROP TABLE contacts_fts")
+    else:
+        op.execute("DROP INDEX ix_contacts_email_trgm")
+        op.execute("DROP INDEX ix_contacts_last_name_trgm")
+        op.execute("DROP INDEX ix_contacts_first_name_trgm")
@@ -0,0 +1,31 @@
+"""drop contacts name prefix indexes
+
+Revision ID: a41c7e2d9b58
+Revises: 7f2b9d4c6e31
+Create Date: 2026-10-18 16:58:12.704395
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c7e2d9b58'
+down_revision: Union[str, None] = '7f2b9d4c6e31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Short searches match substrings again, which these indexes cannot serve
+    op.drop_index('ix_contacts_user_id_lower_last_name', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_lower_first_name', table_name='contacts')
+
+
+def downgrade() -> None:
+    op.create_index('ix_contacts_user_id_lower_first_name', 'contacts',
+                    ['user_id', sa.text('lower(first_name)')], unique=False)
+    op.create_index('ix_contacts_user_id_lower_last_name', 'contacts',
+                    ['user_id', sa.text('lower(last_name)')], unique=False)
@@ -0,0 +1,32 @@
+"""contacts user composite indexes
+
+Revision ID: e3a8b05f7c19
+Revises: 9c4d2f6e1a07
+Create Date: 2026-10-18 11:48:02.316574
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a8b05f7c19'
+down_revision: Union[str, None] = '9c4d2f6e1a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'], unique=False)
+    op.create_index('ix_contacts_user_id_lower_first_name', 'contacts',
+                    ['user_id', sa.text('lower(first_name)')], unique=False)
+    op.create_index('ix_contacts_user_id_lower_last_name', 'contacts',
+                    ['user_id', sa.text('lower(last_name)')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_lower_last_name', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_lower_first_name', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
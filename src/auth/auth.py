@@ -8,20 +8,22 @@ authentication-related operations such as password hashing, token creation,
 token decoding, and user retrieval from the database.
 """
 
-import redis
-import pickle
+import hashlib
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 from starlette import status
 from  src.db.database import get_db
 from  ..models.models import UserDB
 from src.repository import user as repository_users
 from src.conf.config import settings
+from src.auth.hashing import PasswordHasher
+from src.services.cache import TTLCache
+from src.services.user_cache import user_cache
 
 
 class Auth:
@@ -31,15 +33,17 @@ class Auth:
     This class provides methods for password hashing, token creation,
     token decoding, and user retrieval from the database.
     """
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    hasher = PasswordHasher(rounds=settings.bcrypt_rounds, workers=settings.password_hash_workers,
+                            max_pending=settings.password_hash_max_pending)
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    # Verified access token claims keyed by token digest, each kept until the token expires
+    token_cache = TTLCache(maxsize=settings.token_cache_size, ttl=15 * 60)
 
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_password(self, plain_password, hashed_password):
         """
-        Verify a plain password against a hashed password.
+        Verify a plain password against a hashed password, off the event loop.
 
         :param plain_password: The plain password to verify.
         :type plain_password: str
@@ -47,19 +51,35 @@ class Auth:
         :type hashed_password: str
         :return: True if the passwords match, False otherwise.
         :rtype: bool
+        :raises HTTPException: If the hashing pool is saturated.
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self.hasher.verify(plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def verify_and_update_password(self, plain_password, hashed_password):
         """
-        Hash a password.
+        Verify a plain password, and rehash it if the bcrypt rounds setting has changed.
+
+        :param plain_password: The plain password to verify.
+        :type plain_password: str
+        :param hashed_password: The hashed password to compare against.
+        :type hashed_password: str
+        :return: Whether the passwords match, and the new hash to store or None.
+        :rtype: tuple[bool, str | None]
+        :raises HTTPException: If the hashing pool is saturated.
+        """
+        return await self.hasher.verify_and_update(plain_password, hashed_password)
+
+    async def get_password_hash(self, password: str):
+        """
+        Hash a password, off the event loop.
 
         :param password: The password to hash.
         :type password: str
         :return: The hashed password.
         :rtype: str
+        :raises HTTPException: If the hashing pool is saturated.
         """
-        return self.pwd_context.hash(password)
+        return await self.hasher.hash(password)
 
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         """
@@ -97,7 +117,7 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=settings.refresh_token_ttl)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
         encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
@@ -108,27 +128,54 @@ class Auth:
 
         :param refresh_token: The refresh token to decode.
         :type refresh_token: str
-        :return: The email contained in the refresh token.
-        :rtype: str
+        :return: The claims of the refresh token: the email in ``sub``, and the token
+                 id and family in ``jti`` and ``fam``.
+        :rtype: dict
         :raises HTTPException: If the token is invalid or has an invalid scope.
         """
         try:
             payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    def decode_access_token(self, token: str) -> dict:
         """
-        Retrieve the current user from the database using a JWT token.
+        Verify a JWT and return its claims, reusing the claims of a token verified before.
+
+        Verified claims are cached under the SHA-256 digest of the token until the
+        token's ``exp``, so a client repeating the same token skips the signature
+        check. Tokens that fail verification are never cached.
+
+        :param token: The JWT token.
+        :type token: str
+        :return: The claims of the token.
+        :rtype: dict
+        :raises JWTError: If the token is invalid or expired.
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        payload = self.token_cache.get(key)
+        if payload is None:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            if "exp" in payload:
+                ttl = payload["exp"] - time.time()
+                if ttl > 0:
+                    self.token_cache.set(key, payload, ttl=ttl)
+        return payload
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+        """
+        Retrieve the current user using a JWT token.
+
+        The user is read from the user cache when possible, and from the database
+        otherwise. A cached user is detached and carries no password.
 
         :param token: The JWT token.
         :type token: str
         :param db: The database session.
-        :type db: Session
+        :type db: AsyncSession
         :return: The current user.
         :rtype: UserDB
         :raises HTTPException: If the token is invalid or has an invalid scope.
@@ -141,7 +188,7 @@ class Auth:
 
         try:
             # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_access_token(token)
             if payload['scope'] == 'access_token':
                 email = payload["sub"]
                 if email is None:
@@ -150,16 +197,14 @@ class Auth:
                 raise credentials_exception
         except JWTError as e:
             raise credentials_exception
-        user = self.r.get(f"user:{email}")
+        user = await user_cache.get(email)
         if user is None:
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
                 raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            await user_cache.set(user)
         return user
+
     async def create_email_token(self, data: dict):
         """
         Create a new email token.
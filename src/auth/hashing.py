@@ -0,0 +1,111 @@
+# src.auth.hashing.py
+
+"""
+Password hashing module.
+
+This module contains the PasswordHasher class, which runs bcrypt hashing and
+verification in a dedicated, bounded thread pool instead of on the event loop.
+bcrypt releases the GIL while it works, so threads give real parallelism, and
+one slow login no longer freezes every other request.
+
+The number of hashing jobs that may wait for a worker is limited. When the
+pool is saturated new jobs are rejected with ``503 Service Unavailable``
+instead of piling up behind a queue that would only time out later.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from starlette import status
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing and verification off the event loop, with back-pressure.
+    """
+
+    def __init__(self, rounds: int, workers: int, max_pending: int):
+        """
+        :param rounds: The bcrypt cost factor used for new hashes.
+        :type rounds: int
+        :param workers: The number of hashing threads.
+        :type workers: int
+        :param max_pending: The maximum number of jobs running or waiting for a thread.
+        :type max_pending: int
+        """
+        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hasher")
+        return self._executor
+
+    async def _run(self, func, *args):
+        """
+        Run ``func(*args)`` in the hashing pool.
+
+        :raises HTTPException: If ``max_pending`` jobs are already running or waiting.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Too many concurrent logins, try again later",
+                                headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password with the configured number of rounds.
+
+        :param password: The password to hash.
+        :type password: str
+        :return: The hashed password.
+        :rtype: str
+        """
+        return await self._run(self.pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """
+        Verify a password against a hash.
+
+        :param password: The plain password.
+        :type password: str
+        :param hashed_password: The hash to compare against.
+        :type hashed_password: str
+        :return: True if the password matches, False otherwise.
+        :rtype: bool
+        """
+        return await self._run(self.pwd_context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        Verify a password, and rehash it if its hash no longer matches the configured rounds.
+
+        :param password: The plain password.
+        :type password: str
+        :param hashed_password: The hash to compare against.
+        :type hashed_password: str
+        :return: Whether the password matches, and the new hash to store or None.
+        :rtype: tuple[bool, str | None]
+        """
+        return await self._run(self.pwd_context.verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        """
+        Stop the hashing threads once the running jobs are done.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -27,6 +27,7 @@ class Settings(BaseSettings):
     - mail_server: The email server address.
     - redis_host: The host for the Redis server.
     - redis_port: The port for the Redis server.
+    - redis_timeout: The connect and read timeout for Redis calls, in seconds.
     - postgres_db: The name of the PostgreSQL database.
     - postgres_user: The username for the PostgreSQL database.
     - postgres_password: The password for the PostgreSQL database.
@@ -34,6 +35,65 @@ class Settings(BaseSettings):
     - cloudinary_name: The name of the Cloudinary account.
     - cloudinary_api_key: The API key for Cloudinary.
     - cloudinary_api_secret: The API secret for Cloudinary.
+    - user_cache_ttl: How long an authenticated user is cached in Redis, in seconds.
+    - user_cache_local_ttl: How long an authenticated user is cached in process, in seconds.
+    - user_cache_size: The maximum number of users cached in process.
+    - token_cache_size: The maximum number of verified access tokens cached in process.
+    - refresh_token_ttl: How long a session stays valid without a refresh, in seconds.
+    - max_sessions: The maximum number of concurrent sessions (devices) per user.
+    - rate_limit_enabled: Whether rate limits are enforced; turned off for load tests.
+    - rate_limit_fail_open: Whether rate limits are enforced per process (True) or requests are
+      rejected (False) while Redis is unavailable.
+    - rate_limit_batch_fraction: The share of a rate limit each process reserves from Redis at a time.
+    - rate_limit_lease: The longest time a process may spend reserved rate limit tokens, in seconds.
+    - rate_limit_local_size: The maximum number of rate limit buckets kept in process.
+    - trusted_proxies: The addresses or networks of the reverse proxies whose X-Forwarded-For header is
+      trusted; empty to count requests against the peer address.
+    - email_batch_size: The maximum number of emails the worker sends per batch.
+    - email_max_attempts: The number of delivery attempts before an email is given up.
+    - email_retry_base: The delay before the first retry of an email, in seconds; it doubles on every attempt.
+    - email_retry_max: The longest delay between two delivery attempts, in seconds.
+    - avatar_storage: Where avatars are stored: "local" or "cloudinary".
+    - avatar_dir: The directory of locally stored avatars.
+    - avatar_url_prefix: The URL locally stored avatars are served under.
+    - avatar_max_bytes: The largest accepted avatar upload.
+    - avatar_workers: The number of threads resizing avatars.
+    - db_pool_size: The number of PostgreSQL connections kept open by each process.
+    - db_max_overflow: The number of extra connections a process may open under load.
+    - db_pool_timeout: How long a request waits for a free connection, in seconds.
+    - db_pool_recycle: The age after which a connection is replaced, in seconds.
+    - db_pool_pre_ping: Whether to test connections when they are checked out of the pool.
+    - db_statement_timeout: The PostgreSQL statement timeout, in milliseconds; 0 disables it.
+    - db_slow_query_ms: The duration from which a query is logged as slow, in milliseconds; 0 disables the log.
+    - db_replica_urls: The URLs of the read replicas serving GET requests; empty to read from the primary.
+    - db_replica_strategy: How a replica is picked: "round_robin" or "latency" (lowest recent query latency).
+    - db_replica_retry_seconds: How long a replica that failed to connect is left out, in seconds.
+    - db_sticky_seconds: How long after a write the reads of the same client go to the primary, in seconds.
+    - db_debug_queries: Whether to report the number and time of the statements of every request in
+      response headers and logs, and flag likely N+1 queries.
+    - db_n_plus_one_threshold: The most runs of the same statement in one request not flagged as N+1.
+    - gravatar_default: The Gravatar fallback image ("" for the Gravatar logo, or e.g. "identicon").
+    - gravatar_verify: Whether to check that an email has a Gravatar before using it.
+    - gravatar_timeout: The timeout of Gravatar requests, in seconds.
+    - gravatar_cache_size: The maximum number of resolved Gravatars kept in memory.
+    - gravatar_cache_ttl: How long a resolved Gravatar is kept in memory, in seconds.
+    - bcrypt_rounds: The bcrypt cost factor for new password hashes; older hashes are upgraded on login.
+    - password_hash_workers: The number of threads hashing and verifying passwords.
+    - password_hash_max_pending: The maximum number of password hashing jobs running or queued.
+    - compression_encodings: The response encodings offered, preferred first ("zstd", "br", "gzip").
+    - compression_minimum_size: The smallest response body compressed, in bytes.
+    - compression_offload_size: The smallest body chunk compressed in a worker thread, in bytes.
+    - compression_workers: The number of threads compressing large responses.
+    - compression_gzip_level: The gzip compression level (1-9).
+    - compression_brotli_quality: The brotli quality (0-11).
+    - compression_zstd_level: The zstd compression level (1-22).
+    - metrics_token: The bearer token the metrics routes require; empty to disable the routes.
+    - profiler_token: The admin token profiling a request sent in its X-Profile header; empty to disable.
+    - profiler_sample_rate: The share of requests profiled at random; 0 to disable.
+    - profiler_interval: The time between two stack samples of a profiled request, in seconds.
+    - profiler_dir: The directory request profiles are saved to.
+    - profiler_max_files: The most request profiles kept.
+    - profiler_max_age: How long request profiles are kept, in seconds.
 
     The settings are loaded from a .env file located in the root of the project.
     """
@@ -47,6 +107,7 @@ class Settings(BaseSettings):
     mail_server: str="test"
     redis_host: str ="test"
     redis_port: int=1
+    redis_timeout: float=0.5
     postgres_db: str ="test"
     postgres_user: str ="test"
     postgres_password: str ="test"
@@ -54,6 +115,62 @@ class Settings(BaseSettings):
     cloudinary_name: str="test"
     cloudinary_api_key: str="test"
     cloudinary_api_secret: str="test"
+    user_cache_ttl: int=900
+    user_cache_local_ttl: int=60
+    user_cache_size: int=10000
+    token_cache_size: int=10000
+    refresh_token_ttl: int=7 * 24 * 3600
+    max_sessions: int=10
+    rate_limit_enabled: bool=True
+    rate_limit_fail_open: bool=True
+    rate_limit_batch_fraction: float=0.1
+    rate_limit_lease: float=5.0
+    rate_limit_local_size: int=100000
+    trusted_proxies: list[str]=[]
+    email_batch_size: int=50
+    email_max_attempts: int=8
+    email_retry_base: float=30
+    email_retry_max: float=3600
+    avatar_storage: str="local"
+    avatar_dir: str="static/avatars"
+    avatar_url_prefix: str="/static/avatars"
+    avatar_max_bytes: int=10 * 1024 * 1024
+    avatar_workers: int=2
+    db_pool_size: int=5
+    db_max_overflow: int=10
+    db_pool_timeout: float=30
+    db_pool_recycle: int=1800
+    db_pool_pre_ping: bool=True
+    db_statement_timeout: int=0
+    db_slow_query_ms: float=200
+    db_replica_urls: list[str]=[]
+    db_replica_strategy: str="round_robin"
+    db_replica_retry_seconds: float=30.0
+    db_sticky_seconds: float=5.0
+    db_debug_queries: bool=False
+    db_n_plus_one_threshold: int=5
+    gravatar_default: str=""
+    gravatar_verify: bool=False
+    gravatar_timeout: float=5.0
+    gravatar_cache_size: int=10000
+    gravatar_cache_ttl: float=24 * 3600
+    bcrypt_rounds: int=12
+    password_hash_workers: int=4
+    password_hash_max_pending: int=64
+    compression_encodings: list[str]=["zstd", "br", "gzip"]
+    compression_minimum_size: int=1024
+    compression_offload_size: int=64 * 1024
+    compression_workers: int=2
+    compression_gzip_level: int=6
+    compression_brotli_quality: int=4
+    compression_zstd_level: int=3
+    metrics_token: str=""
+    profiler_token: str=""
+    profiler_sample_rate: float=0.0
+    profiler_interval: float=0.005
+    profiler_dir: str="profiles"
+    profiler_max_files: int=200
+    profiler_max_age: float=7 * 24 * 3600
 
     class Config:
         """
@@ -6,20 +6,127 @@ This module contains the configuration for the database connection,
 the session creation, and the base declarative class. It also includes
 a function to yield a database session that should be used as a dependency
 in FastAPI routes.
+
+The application talks to the database through an asynchronous engine
+(asyncpg for PostgreSQL, aiosqlite for SQLite), so a slow query only
+suspends the request that issued it instead of blocking the event loop.
+The synchronous ``DATABASE_URL`` is still exported for Alembic migrations.
+
+The PostgreSQL connection pool is sized through the ``db_pool_*`` settings and
+the engine is instrumented by :mod:`src.db.metrics`.
+
+Sessions only take a connection from the pool when they run their first
+statement, and the sessions of GET requests give it back after every statement.
+Read replicas listed in ``db_replica_urls`` serve the GET requests, except for
+clients that wrote within the last ``db_sticky_seconds`` (see :mod:`src.db.routing`).
 """
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from fastapi import Request
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from src.conf.config import settings
+from src.db.metrics import DatabaseMetrics, InstrumentedQueuePool, SessionMetrics
+from src.db.routing import ReadSession, ReadYourWrites, ReplicaSet, RequestSession, client_key
 # Database URL from configuration
 DATABASE_URL = settings.sqlalchemy_database_url
 
+# Async drivers used for each synchronous dialect
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """
+    Convert a synchronous SQLAlchemy database URL into its async counterpart.
+
+    ``postgresql+psycopg2://...`` becomes ``postgresql+asyncpg://...`` and
+    ``sqlite:///...`` becomes ``sqlite+aiosqlite:///...``. URLs that already
+    name an async driver are returned unchanged.
+
+    :param url: The database URL.
+    :type url: str
+    :return: The database URL with an async driver.
+    :rtype: str
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() not in ASYNC_DRIVERS or parsed.drivername in ASYNC_DRIVERS.values():
+        return url
+    return parsed.set(drivername=ASYNC_DRIVERS[parsed.get_backend_name()]).render_as_string(hide_password=False)
+
+
+def engine_options(url: str, read_only: bool = False) -> dict:
+    """
+    Build the engine options for a database URL from the settings.
+
+    PostgreSQL gets a sized, instrumented queue pool and an optional statement
+    timeout. SQLite keeps the pool SQLAlchemy picks for it, which has nothing to size.
+
+    :param url: The database URL.
+    :type url: str
+    :param read_only: Whether PostgreSQL transactions should be read-only, for replicas.
+    :type read_only: bool
+    :return: The keyword arguments for ``create_async_engine``.
+    :rtype: dict
+    """
+    options = {"pool_pre_ping": settings.db_pool_pre_ping}
+    if make_url(url).get_backend_name() != "postgresql":
+        return options
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+    )
+    server_settings = {}
+    if settings.db_statement_timeout:
+        server_settings["statement_timeout"] = str(settings.db_statement_timeout)
+    if read_only:
+        server_settings["default_transaction_read_only"] = "on"
+    if server_settings:
+        options["connect_args"] = {"server_settings": server_settings}
+    return options
+
+
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
 # Create engine for database connection
-engine = create_engine(DATABASE_URL)
+engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+
+# Pool and query metrics of the engine
+db_metrics = DatabaseMetrics(slow_query_ms=settings.db_slow_query_ms)
+db_metrics.instrument(engine)
+
+# Read replicas, each with its own engine and metrics
+replicas = ReplicaSet(
+    [create_async_engine(to_async_url(url), **engine_options(to_async_url(url), read_only=True))
+     for url in settings.db_replica_urls],
+    strategy=settings.db_replica_strategy,
+    slow_query_ms=settings.db_slow_query_ms,
+    retry_seconds=settings.db_replica_retry_seconds,
+)
+
+# Clients whose reads stay on the primary after a write
+read_your_writes = ReadYourWrites(settings.db_sticky_seconds)
+
+# Request methods served by replicas
+READ_METHODS = frozenset({"GET", "HEAD"})
+
+# Create a configured "Session" class. Objects stay loaded after commit,
+# so routes can serialize them without triggering implicit IO.
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False,
+                                  sync_session_class=RequestSession)
+
+# Sessions of read requests on the primary, releasing their connection after every statement
+ReadSessionLocal = async_sessionmaker(bind=engine, class_=ReadSession, autoflush=False, expire_on_commit=False,
+                                      sync_session_class=RequestSession)
 
-# Create a configured "Session" class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Connection hold time of the request sessions
+session_metrics = SessionMetrics()
+session_metrics.instrument(RequestSession)
 
 # Base class for declarative class definitions
 Base = declarative_base()
@@ -27,19 +134,41 @@ Base = declarative_base()
 
 
 # Dependency
-def get_db():
+async def get_db(request: Request):
     """
     Yield a database session that should be used as a dependency in FastAPI routes.
 
-    This function is a generator that creates a new SessionLocal instance for each request,
-    and ensures that the session is closed after the request is finished. This is done using
-    Python's context manager (yield statement) and try/finally blocks.
+    GET and HEAD requests get a read session, which returns its connection to the
+    pool after every statement, on a replica when replicas are configured unless
+    their client wrote recently or no replica is reachable. Other requests get a session on the primary and
+    open the read-your-writes window of their client. No session takes a
+    connection before its first statement, so a request served from caches never
+    touches the pool. The session is closed after the request is finished.
+
+    :param request: The HTTP request.
+    :type request: Request
+    :yield: A database session.
+    :rtype: sqlalchemy.ext.asyncio.AsyncSession
+    """
+    session_factory = SessionLocal
+    if request.method in READ_METHODS:
+        session_factory = ReadSessionLocal
+        if replicas and not await read_your_writes.sticky(client_key(request)):
+            session_factory = replicas.session_factory() or session_factory
+    elif replicas:
+        await read_your_writes.wrote(client_key(request))
+    async with session_factory() as db:
+        yield db
+    session_metrics.record(db)
+
+
+async def get_primary_db():
+    """
+    Yield a session on the primary, for routes that write on GET requests.
 
     :yield: A database session.
-    :rtype: sqlalchemy.orm.Session
+    :rtype: sqlalchemy.ext.asyncio.AsyncSession
     """
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+    session_metrics.record(db)
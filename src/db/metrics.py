@@ -0,0 +1,285 @@
+#src.db.metrics.py
+
+"""
+Database Metrics Module.
+
+This module instruments an engine through SQLAlchemy events. It records:
+
+- how long sessions wait to check a connection out of the pool, and how often the
+  pool was exhausted when they asked (its saturation);
+- the connections checked out right now and at peak, against the pool capacity;
+- the latency of every statement, overall and per statement text;
+- slow statements, which are also logged on the ``src.db.slow_queries`` logger;
+- how long each connection is held between checkout and checkin.
+
+Every statement is also counted towards the request being served, see
+:mod:`src.services.instrumentation`.
+
+:class:`SessionMetrics` adds how long each request session holds a connection
+in total, and how many sessions never needed one.
+
+The capacity of the pool is the most connections one process opens, so the
+number of workers that fit a PostgreSQL server is about ``max_connections``
+divided by it.
+"""
+
+import logging
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.services.instrumentation import add_db_time, count_db_statement
+from src.services.metrics import Histogram
+
+slow_query_logger = logging.getLogger("src.db.slow_queries")
+
+# Weight of the latest statement in the moving average of the statement latency
+LATENCY_EWMA_WEIGHT = 0.1
+
+# Longest statement text kept in the per-statement table and in the slow query log
+MAX_STATEMENT_LENGTH = 1000
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that reports checkout waits to the metrics of its engine.
+    """
+
+    metrics = None
+
+    def __init__(self, creator, pool_size: int = 5, max_overflow: int = 10, **kw):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kw)
+        self.capacity = pool_size + max_overflow if max_overflow >= 0 else None
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        metrics = self.metrics
+        if metrics is None:
+            return super()._do_get()
+        if self.capacity is not None and self.checkedout() >= self.capacity:
+            metrics.saturated += 1
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.timeouts += 1
+            raise
+        finally:
+            metrics.checkout_wait.observe(time.perf_counter() - start)
+
+
+class DatabaseMetrics:
+    """
+    Pool and statement metrics of one engine.
+    """
+
+    def __init__(self, slow_query_ms: float, max_statements: int = 200):
+        """
+        :param slow_query_ms: The duration from which a statement is logged as slow, in milliseconds; 0 disables the log.
+        :type slow_query_ms: float
+        :param max_statements: The most distinct statements timed separately; later ones are counted as ``<other>``.
+        :type max_statements: int
+        """
+        self.slow_query_ms = slow_query_ms
+        self.max_statements = max_statements
+        self.engine = None
+        self.checkout_wait = Histogram()
+        self.hold_time = Histogram()
+        self.statement_latency = Histogram()
+        self.statements = {}
+        self.checkouts = 0
+        self.saturated = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidated = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.slow_queries = 0
+        self.latency_ewma = None
+
+    def instrument(self, engine):
+        """
+        Register the event hooks on an engine.
+
+        :param engine: The engine.
+        :type engine: sqlalchemy.ext.asyncio.AsyncEngine | sqlalchemy.engine.Engine
+        """
+        self.engine = getattr(engine, "sync_engine", engine)
+        if isinstance(self.engine.pool, InstrumentedQueuePool):
+            self.engine.pool.metrics = self
+        event.listen(self.engine, "connect", self._on_connect)
+        event.listen(self.engine, "checkout", self._on_checkout)
+        event.listen(self.engine, "checkin", self._on_checkin)
+        event.listen(self.engine, "invalidate", self._on_invalidate)
+        event.listen(self.engine, "before_cursor_execute", self._before_execute)
+        event.listen(self.engine, "after_cursor_execute", self._after_execute)
+        event.listen(self.engine, "handle_error", self._on_error)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        self.checkouts += 1
+        self.in_use += 1
+        if self.in_use > self.peak_in_use:
+            self.peak_in_use = self.in_use
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.in_use -= 1
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            self.hold_time.observe(time.perf_counter() - checked_out_at)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidated += 1
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+        count_db_statement(statement)
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        self.record_statement(statement, elapsed)
+        add_db_time(elapsed)
+
+    def _on_error(self, context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    def record_statement(self, statement: str, elapsed: float):
+        """
+        Record the execution of a statement.
+
+        :param statement: The SQL text, with bound parameters as placeholders.
+        :type statement: str
+        :param elapsed: The execution time, in seconds.
+        :type elapsed: float
+        """
+        self.statement_latency.observe(elapsed)
+        if self.latency_ewma is None:
+            self.latency_ewma = elapsed
+        else:
+            self.latency_ewma += LATENCY_EWMA_WEIGHT * (elapsed - self.latency_ewma)
+        statement = statement[:MAX_STATEMENT_LENGTH]
+        stats = self.statements.get(statement)
+        if stats is None:
+            if len(self.statements) >= self.max_statements:
+                statement = "<other>"
+                stats = self.statements.setdefault(statement, [0, 0.0, 0.0])
+            else:
+                stats = self.statements[statement] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+        if self.slow_query_ms and elapsed * 1000 >= self.slow_query_ms:
+            self.slow_queries += 1
+            slow_query_logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split()))
+
+    def snapshot(self, top: int = 20) -> dict:
+        """
+        Summarize the metrics.
+
+        :param top: The number of statements listed, by total time.
+        :type top: int
+        :return: The pool and statement metrics.
+        :rtype: dict
+        """
+        pool = self.engine.pool if self.engine is not None else None
+        capacity = getattr(pool, "capacity", None)
+        statements = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        return {
+            "pool": {
+                "class": type(pool).__name__,
+                "capacity": capacity,
+                "checked_out": self.in_use,
+                "peak_checked_out": self.peak_in_use,
+                "utilization": self.in_use / capacity if capacity else None,
+                "checkouts": self.checkouts,
+                "saturated": self.saturated,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidated": self.invalidated,
+                "checkout_wait": self.checkout_wait.snapshot(),
+                "hold_time": self.hold_time.snapshot(),
+            },
+            "statements": {
+                "latency": self.statement_latency.snapshot(),
+                "latency_ewma": self.latency_ewma,
+                "slow": self.slow_queries,
+                "slow_query_ms": self.slow_query_ms,
+                "top": [
+                    {"statement": statement, "count": count, "total": total, "mean": total / count, "max": longest}
+                    for statement, (count, total, longest) in statements
+                ],
+            },
+        }
+
+
+class SessionMetrics:
+    """
+    Connection use of the sessions opened for requests.
+    """
+
+    def __init__(self):
+        self.hold_time = Histogram()
+        self.sessions = 0
+        self.without_connection = 0
+
+    def instrument(self, session_class):
+        """
+        Register the event hooks on a session class and its subclasses.
+
+        :param session_class: The synchronous session class.
+        :type session_class: type[sqlalchemy.orm.Session]
+        """
+        event.listen(session_class, "after_begin", self._on_begin)
+        event.listen(session_class, "after_transaction_end", self._on_transaction_end)
+
+    @staticmethod
+    def _on_begin(session, transaction, connection):
+        if "connected_at" not in session.info:
+            session.info["connected_at"] = time.perf_counter()
+
+    @staticmethod
+    def _on_transaction_end(session, transaction):
+        if transaction.parent is not None:
+            return
+        connected_at = session.info.pop("connected_at", None)
+        if connected_at is not None:
+            session.info["held"] = session.info.get("held", 0.0) + time.perf_counter() - connected_at
+
+    def record(self, session):
+        """
+        Record the connection use of a finished session.
+
+        :param session: The closed session.
+        :type session: sqlalchemy.ext.asyncio.AsyncSession
+        """
+        self.sessions += 1
+        held = session.info.pop("held", None)
+        if held is None:
+            self.without_connection += 1
+        else:
+            self.hold_time.observe(held)
+
+    def snapshot(self) -> dict:
+        """
+        Summarize the metrics.
+
+        :return: The number of sessions, those that never took a connection, and the hold time per session.
+        :rtype: dict
+        """
+        return {
+            "sessions": self.sessions,
+            "without_connection": self.without_connection,
+            "hold_time": self.hold_time.snapshot(),
+        }
@@ -0,0 +1,282 @@
+#src.db.routing.py
+
+"""
+Read Replica Routing Module.
+
+This module contains what :func:`src.db.database.get_db` needs to serve reads
+cheaply:
+
+- :class:`ReadSession` gives its connection back to the pool as soon as each
+  statement has returned its rows, instead of holding it until the request ends.
+- :class:`ReplicaSet` picks the replica of the next read-only session, either in
+  turn (``round_robin``) or the one with the lowest recent statement latency
+  (``latency``), leaving out for a while the replicas that failed to connect.
+- :class:`ReadYourWrites` remembers, for a short window, the clients that just
+  wrote, so their next reads go to the primary and see their own writes despite
+  replication lag. The window is kept in process and in Redis, so it holds when
+  the next request reaches another worker.
+"""
+
+import itertools
+import logging
+import time
+
+from fastapi import Request
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from src.db.metrics import DatabaseMetrics
+from src.services.cache import TTLCache
+from src.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("round_robin", "latency")
+
+
+class RequestSession(Session):
+    """
+    Synchronous session behind the sessions opened for requests.
+
+    Only this class and its subclasses are instrumented by
+    :class:`src.db.metrics.SessionMetrics`, so sessions opened outside requests,
+    by background jobs or scripts, do not count.
+    """
+
+
+class ReadOnlySession(RequestSession):
+    """
+    Session refusing to flush changes, used on replicas.
+    """
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise InvalidRequestError("This session reads from a replica and cannot write")
+        super().flush(objects)
+
+
+class ReadSession(AsyncSession):
+    """
+    Session for read requests, ending its transaction after every statement.
+
+    Results of an async session are buffered, so once a statement has returned
+    the connection is no longer needed: it goes back to the pool while the
+    request goes on serializing the response. Loaded objects stay usable, as
+    sessions do not expire them on commit. The transaction is only ended when
+    the session has no pending changes, so a handler that does write keeps its
+    transaction until it commits; this relies on autoflush being off, as it is
+    for every session of the application.
+    """
+
+    async def execute(self, *args, **kwargs):
+        result = await super().execute(*args, **kwargs)
+        await self._release()
+        return result
+
+    async def scalar(self, *args, **kwargs):
+        result = await super().scalar(*args, **kwargs)
+        await self._release()
+        return result
+
+    async def get(self, *args, **kwargs):
+        result = await super().get(*args, **kwargs)
+        await self._release()
+        return result
+
+    async def _release(self):
+        if self.in_transaction() and not (self.new or self.dirty or self.deleted):
+            await self.commit()
+
+
+class ReplicaSet:
+    """
+    The read replicas of the database, each with its own engine and metrics.
+
+    A replica failing to connect, or dropping its connection, is left out for
+    ``retry_seconds``; reads go to the primary while no replica is usable.
+    """
+
+    def __init__(self, engines: list, strategy: str = "round_robin", slow_query_ms: float = 0,
+                 retry_seconds: float = 30.0):
+        """
+        :param engines: The async engines of the replicas.
+        :type engines: list[sqlalchemy.ext.asyncio.AsyncEngine]
+        :param strategy: ``round_robin`` or ``latency``.
+        :type strategy: str
+        :param slow_query_ms: The slow query threshold of the replica metrics, in milliseconds.
+        :type slow_query_ms: float
+        :param retry_seconds: How long a failed replica is left out before it is tried again, in seconds.
+        :type retry_seconds: float
+        :raises ValueError: If the strategy is unknown.
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown replica strategy {strategy!r}, expected one of {STRATEGIES}")
+        self.engines = engines
+        self.strategy = strategy
+        self.retry_seconds = retry_seconds
+        self.metrics = []
+        self.sessions = []
+        self.down_until = [0.0] * len(engines)
+        self.failures = [0] * len(engines)
+        for i, engine in enumerate(engines):
+            metrics = DatabaseMetrics(slow_query_ms=slow_query_ms)
+            metrics.instrument(engine)
+            self.metrics.append(metrics)
+            self.sessions.append(async_sessionmaker(bind=engine, class_=ReadSession, autoflush=False,
+                                                    expire_on_commit=False, sync_session_class=ReadOnlySession))
+            event.listen(engine.sync_engine, "handle_error", self._error_handler(i))
+        self._turn = itertools.cycle(range(len(engines)))
+
+    def __bool__(self):
+        return bool(self.engines)
+
+    def _error_handler(self, i: int):
+        def handle_error(context):
+            # No connection means the replica could not be reached at all
+            if context.connection is None or context.is_disconnect:
+                self.mark_down(i)
+        return handle_error
+
+    def mark_down(self, i: int):
+        """
+        Leave a replica out of the next reads for ``retry_seconds``.
+
+        :param i: The index of the replica.
+        :type i: int
+        """
+        self.failures[i] += 1
+        self.down_until[i] = time.monotonic() + self.retry_seconds
+        logger.warning("Read replica %s is unavailable, reading from the primary or other replicas for %s s",
+                       i, self.retry_seconds)
+
+    def usable(self) -> list[int]:
+        """
+        List the replicas not left out after a failure.
+
+        :return: The indexes of the usable replicas.
+        :rtype: list[int]
+        """
+        now = time.monotonic()
+        return [i for i, until in enumerate(self.down_until) if until <= now]
+
+    def pick(self) -> int | None:
+        """
+        Choose the replica of the next session.
+
+        :return: The index of the replica, or None if no replica is usable.
+        :rtype: int | None
+        """
+        usable = self.usable()
+        if not usable:
+            return None
+        if self.strategy == "latency":
+            # Replicas without measurements yet are tried first
+            return min(usable, key=lambda i: self.metrics[i].latency_ewma or 0.0)
+        for _ in range(len(self.engines)):
+            i = next(self._turn)
+            if i in usable:
+                return i
+
+    def session_factory(self) -> async_sessionmaker | None:
+        """
+        Choose the session factory of the next read.
+
+        :return: The session factory of a usable replica, or None if no replica is usable.
+        :rtype: async_sessionmaker | None
+        """
+        i = self.pick()
+        return None if i is None else self.sessions[i]
+
+    def session(self) -> AsyncSession:
+        """
+        Open a read-only session on the next replica.
+
+        :return: The session.
+        :rtype: AsyncSession
+        :raises LookupError: If no replica is usable.
+        """
+        factory = self.session_factory()
+        if factory is None:
+            raise LookupError("No read replica is usable")
+        return factory()
+
+
+def client_key(request: Request) -> str:
+    """
+    Identify the client of a request for read-your-writes.
+
+    Clients are keyed the way rate limits count them: a signed-in client by the
+    ``sub`` of its access token, so the window survives a token refresh, and
+    other clients by their address behind the ``trusted_proxies``.
+
+    :param request: The HTTP request.
+    :type request: Request
+    :return: The key of the client.
+    :rtype: str
+    """
+    # Imported here: src.services.rate_limit imports src.db.database through src.auth.auth
+    from src.services.rate_limit import client_identity
+
+    return client_identity(request)
+
+
+class ReadYourWrites:
+    """
+    Clients whose reads go to the primary because they wrote recently.
+    """
+
+    def __init__(self, seconds: float, maxsize: int = 100000):
+        """
+        :param seconds: How long after a write the reads of a client go to the primary.
+        :type seconds: float
+        :param maxsize: The most clients remembered in process.
+        :type maxsize: int
+        """
+        self.seconds = seconds
+        self.local = TTLCache(maxsize=maxsize, ttl=seconds)
+
+    @staticmethod
+    def _key(client: str) -> str:
+        return f"db:primary:{client}"
+
+    async def wrote(self, client: str):
+        """
+        Record a write by a client.
+
+        :param client: The key of the client.
+        :type client: str
+        """
+        if self.seconds <= 0:
+            return
+        self.local.set(client, True)
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.set(self._key(client), 1, px=int(self.seconds * 1000))
+        except (RedisError, OSError) as e:
+            logger.warning("Could not share the write window of %s: %s", client, e)
+
+    async def sticky(self, client: str) -> bool:
+        """
+        Tell whether the reads of a client must go to the primary.
+
+        :param client: The key of the client.
+        :type client: str
+        :return: True if the client wrote within the window.
+        :rtype: bool
+        """
+        if self.seconds <= 0:
+            return False
+        if self.local.get(client):
+            return True
+        redis = get_redis()
+        if redis is None:
+            return False
+        try:
+            return bool(await redis.exists(self._key(client)))
+        except (RedisError, OSError):
+            return False
@@ -7,8 +7,8 @@ This module contains the SQLAlchemy models for the database tables.
 """
 
 from src.db.database import Base
-from sqlalchemy import Column, Integer, String, Date, func, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Date, func, Boolean, Index, DDL, event, table, column
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql.schema import ForeignKey
 from sqlalchemy.sql.sqltypes import DateTime
 
@@ -25,21 +25,90 @@ class ContactDB(Base):
     - email: The email of the contact.
     - phone_number: The phone number of the contact.
     - birthday: The birthday of the contact.
+    - birthday_mmdd: The month and day of the birthday as ``month * 100 + day``,
+      kept in sync with ``birthday`` and indexed for upcoming-birthday queries.
     - additional_data: Additional data about the contact.
     - user_id: The foreign key linking the contact to a user.
     - user: The relationship to the UserDB model.
+
+    Every per-user query leads with ``user_id``, so each index starts with it.
     """
     __tablename__ = "contacts"
+    __table_args__ = (
+        Index("ix_contacts_user_id_id", "user_id", "id"),
+        Index("ix_contacts_user_id_birthday_mmdd", "user_id", "birthday_mmdd"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String)
     last_name = Column(String)
     email = Column(String, unique=True, index=True)
     phone_number = Column(String)
     birthday = Column(Date)
+    birthday_mmdd = Column(Integer, nullable=True)
     additional_data = Column(String, nullable=True)
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
     user = relationship('UserDB', backref="contacts")
 
+    @validates("birthday")
+    def _sync_birthday_mmdd(self, key, birthday):
+        """
+        Keep ``birthday_mmdd`` current whenever ``birthday`` is assigned.
+        """
+        self.birthday_mmdd = birthday_mmdd(birthday)
+        return birthday
+
+
+def birthday_mmdd(birthday):
+    """
+    Returns the month/day key stored in ``ContactDB.birthday_mmdd``.
+
+    :param birthday: The birthday, or None.
+    :type birthday: date | None
+    :return: ``month * 100 + day``, or None if there is no birthday.
+    :rtype: int | None
+    """
+    if birthday is None:
+        return None
+    return birthday.month * 100 + birthday.day
+
+
+# Full-text search structures for ContactDB.
+#
+# SQLite keeps an external-content FTS5 table with the trigram tokenizer, synced
+# by triggers; PostgreSQL gets pg_trgm GIN indexes on the searched columns.
+# Both are created with the contacts table and mirrored by the migrations.
+CONTACTS_FTS_TABLE = "contacts_fts"
+contacts_fts = table(CONTACTS_FTS_TABLE, column("rowid"))
+
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+    "first_name, last_name, email, content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+]
+
+POSTGRESQL_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_contacts_first_name_trgm ON contacts USING gin (first_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_contacts_last_name_trgm ON contacts USING gin (last_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_contacts_email_trgm ON contacts USING gin (email gin_trgm_ops)",
+]
+
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(ContactDB.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(ContactDB.__table__, "before_drop", DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect="sqlite"))
+for statement in POSTGRESQL_SEARCH_DDL:
+    event.listen(ContactDB.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
 
 class UserDB(Base):
     """
@@ -53,7 +122,6 @@ class UserDB(Base):
     - created_at: The date and time the user was created.
     - password: The hashed password of the user.
     - avatar: The URL of the user's avatar.
-    - refresh_token: The refresh token for the user.
     - confirmed: A boolean indicating whether the user's email has been confirmed.
     """
     __tablename__ = "users"
@@ -63,7 +131,6 @@ class UserDB(Base):
     created_at = Column('crated_at', DateTime, default=func.now())
     password = Column(String(255), nullable=False)
     avatar = Column(String(255), nullable=True)
-    refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
     # hashed_password = Column(String)
 
@@ -1,19 +1,20 @@
 #src.repository.contacts.py
-from ..models.models import ContactDB, UserDB
-from sqlalchemy.orm import Session
+from ..models.models import ContactDB, UserDB, birthday_mmdd, contacts_fts, CONTACTS_FTS_TABLE
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.schemas.schemas import ContactCreate
-from sqlalchemy import or_, and_
-from datetime import datetime, timedelta, date
+from sqlalchemy import select, insert, case, func, literal_column, or_, and_
+from sqlalchemy.exc import IntegrityError
+from datetime import timedelta, date
 
 
-async def create_contact(contact: ContactCreate, db: Session, user: UserDB):
+async def create_contact(contact: ContactCreate, db: AsyncSession, user: UserDB):
     """
     Creates a new contact for a specific user.
 
     :param contact: The data for the contact to create.
     :type contact: ContactCreate
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user to create the contact for.
     :type user: UserDB
     :return: The newly created contact.
@@ -21,31 +22,234 @@ async def create_contact(contact: ContactCreate, db: Session, user: UserDB):
     """
     db_contact = ContactDB(**contact.model_dump(), user_id=user.id)
     db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
+    await db.commit()
+    await db.refresh(db_contact)
     return db_contact
 
 
-async def get_contacts(db: Session, user: UserDB):
+def _contact_values(contact: ContactCreate, user: UserDB) -> dict:
     """
-    Retrieves a list of contacts for a specific user.
+    Builds the column values of a new contact for a bulk insert.
+
+    :param contact: The data for the contact to create.
+    :type contact: ContactCreate
+    :param user: The user the contact belongs to.
+    :type user: UserDB
+    :return: The values keyed by column name.
+    :rtype: dict
+    """
+    values = contact.model_dump()
+    values.update(birthday_mmdd=birthday_mmdd(contact.birthday), user_id=user.id)
+    return values
+
+
+async def _insert_many(db: AsyncSession, values: list[dict]):
+    """
+    Inserts contacts with a single executemany statement.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param values: The column values of the contacts.
+    :type values: list[dict]
+    """
+    await db.execute(insert(ContactDB), values)
+
+
+async def _copy_many(db: AsyncSession, values: list[dict]):
+    """
+    Inserts contacts on PostgreSQL with ``COPY``, through the session's asyncpg connection.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param values: The column values of the contacts.
+    :type values: list[dict]
+    :raises IntegrityError: If a row violates a constraint.
+    """
+    import asyncpg
+
+    columns = list(values[0])
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    try:
+        await raw.driver_connection.copy_records_to_table(
+            ContactDB.__tablename__, records=[tuple(value[c] for c in columns) for value in values], columns=columns
+        )
+    except asyncpg.IntegrityConstraintViolationError as e:
+        raise IntegrityError("COPY contacts", None, e)
+
+
+BULK_INSERTERS = {
+    "postgresql": _copy_many,
+}
+
+
+async def bulk_create_contacts(db: AsyncSession, contacts: list, user: UserDB):
+    """
+    Creates many contacts for a specific user in one round trip and commits them.
+
+    The batch is written with ``COPY`` on PostgreSQL and with an executemany
+    insert elsewhere. If the batch violates a constraint, it is retried row by
+    row, each in its own savepoint, so the valid rows are kept and the failing
+    ones are reported.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param contacts: The ``(row, ContactCreate)`` pairs to create.
+    :type contacts: list[tuple[int, ContactCreate]]
+    :param user: The user to create the contacts for.
+    :type user: UserDB
+    :return: The ``(row, error)`` pairs of the contacts that could not be created.
+    :rtype: list[tuple[int, str]]
+    """
+    if not contacts:
+        return []
+    values = [_contact_values(contact, user) for _, contact in contacts]
+    inserter = BULK_INSERTERS.get(db.get_bind().dialect.name, _insert_many)
+    failed = []
+    try:
+        async with db.begin_nested():
+            await inserter(db, values)
+    except IntegrityError:
+        for (row, _), value in zip(contacts, values):
+            try:
+                async with db.begin_nested():
+                    await _insert_many(db, [value])
+            except IntegrityError as e:
+                failed.append((row, str(e.orig)))
+    await db.commit()
+    return failed
+
+
+def _contacts_after(user: UserDB, after_id: int | None):
+    """
+    Builds the keyset query for a user's contacts ordered by ID.
+
+    :param user: The user whose contacts are selected.
+    :type user: UserDB
+    :param after_id: Only contacts with an ID greater than this one are selected.
+    :type after_id: int | None
+    :return: The select statement.
+    :rtype: Select
+    """
+    stmt = select(ContactDB).filter(ContactDB.user_id == user.id)
+    if after_id is not None:
+        stmt = stmt.filter(ContactDB.id > after_id)
+    return stmt.order_by(ContactDB.id)
+
+
+# Columns of a contact row, in the field order of ContactResponse
+CONTACT_ROW_COLUMNS = (
+    ContactDB.first_name, ContactDB.last_name, ContactDB.email, ContactDB.phone_number,
+    ContactDB.birthday, ContactDB.additional_data, ContactDB.id,
+)
+
+
+async def get_contacts(db: AsyncSession, user: UserDB, limit: int | None = None, after_id: int | None = None):
+    """
+    Retrieves a page of contacts for a specific user.
+
+    Contacts are ordered by ID and paginated by keyset: pass the ID of the last
+    contact of the previous page as ``after_id`` to get the next one, so every
+    page costs the same no matter how deep into the list it is.
 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user to retrieve contacts for.
     :type user: UserDB
+    :param limit: The maximum number of contacts to return, or None for all of them.
+    :type limit: int | None
+    :param after_id: Only return contacts with an ID greater than this one.
+    :type after_id: int | None
     :return: A list of contacts.
     :rtype: List[ContactDB]
     """
-    contacts = db.query(ContactDB).filter(ContactDB.user_id == user.id).all()
-    return contacts
+    stmt = _contacts_after(user, after_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    contacts = await db.scalars(stmt)
+    return contacts.all()
+
+
+async def get_contact_rows(db: AsyncSession, user: UserDB, limit: int | None = None, after_id: int | None = None):
+    """
+    Retrieves a page of contacts for a specific user as plain rows.
+
+    Same page as :func:`get_contacts`, but no ORM object is built: each row is a
+    tuple of :data:`CONTACT_ROW_COLUMNS`, ready to be serialized.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param user: The user to retrieve contacts for.
+    :type user: UserDB
+    :param limit: The maximum number of contacts to return, or None for all of them.
+    :type limit: int | None
+    :param after_id: Only return contacts with an ID greater than this one.
+    :type after_id: int | None
+    :return: A list of rows.
+    :rtype: List[Row]
+    """
+    stmt = _contacts_after(user, after_id).with_only_columns(*CONTACT_ROW_COLUMNS)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return (await db.execute(stmt)).all()
+
+
+async def stream_contacts(db: AsyncSession, user: UserDB, after_id: int | None = None, batch_size: int = 500):
+    """
+    Streams the contacts of a specific user from the database in batches.
+
+    Rows are fetched through a server-side cursor, so only one batch is held
+    in memory at a time regardless of how many contacts the user has.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param user: The user to retrieve contacts for.
+    :type user: UserDB
+    :param after_id: Only yield contacts with an ID greater than this one.
+    :type after_id: int | None
+    :param batch_size: The number of contacts fetched per round trip.
+    :type batch_size: int
+    :return: An async iterator over lists of contacts.
+    :rtype: AsyncIterator[List[ContactDB]]
+    """
+    stmt = _contacts_after(user, after_id).execution_options(yield_per=batch_size)
+    result = await db.stream_scalars(stmt)
+    async for batch in result.partitions():
+        yield batch
+
+
+async def stream_contact_rows(db: AsyncSession, user: UserDB, after_id: int | None = None, batch_size: int = 500):
+    """
+    Streams the contacts of a specific user from the database in batches of plain rows.
+
+    Same batches as :func:`stream_contacts`, as tuples of :data:`CONTACT_ROW_COLUMNS`.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param user: The user to retrieve contacts for.
+    :type user: UserDB
+    :param after_id: Only yield contacts with an ID greater than this one.
+    :type after_id: int | None
+    :param batch_size: The number of contacts fetched per round trip.
+    :type batch_size: int
+    :return: An async iterator over lists of rows.
+    :rtype: AsyncIterator[List[Row]]
+    """
+    stmt = (
+        _contacts_after(user, after_id)
+        .with_only_columns(*CONTACT_ROW_COLUMNS)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream(stmt)
+    async for batch in result.partitions():
+        yield batch
 
-async def get_contact_by_id(db: Session, contact_id: int, user: UserDB):
+async def get_contact_by_id(db: AsyncSession, contact_id: int, user: UserDB):
     """
     Retrieves a single contact with the specified ID for a specific user.
 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param contact_id: The ID of the contact to retrieve.
     :type contact_id: int
     :param user: The user to retrieve the contact for.
@@ -53,15 +257,15 @@ async def get_contact_by_id(db: Session, contact_id: int, user: UserDB):
     :return: The contact with the specified ID, or None if it does not exist.
     :rtype: ContactDB | None
     """
-    db_contact = db.query(ContactDB).filter(and_(ContactDB.id == contact_id, ContactDB.user_id == user.id)).first()
+    db_contact = await db.scalar(select(ContactDB).filter(and_(ContactDB.id == contact_id, ContactDB.user_id == user.id)))
     return db_contact
 
-async def update_contact(db: Session, contact, db_contact, contact_id: int, user: UserDB):
+async def update_contact(db: AsyncSession, contact, db_contact, contact_id: int, user: UserDB):
     """
     Updates a single contact with the specified ID for a specific user.
 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param contact: The updated data for the contact.
     :type contact: ContactUpdate
     :param db_contact: The contact to update.
@@ -73,21 +277,21 @@ async def update_contact(db: Session, contact, db_contact, contact_id: int, user
     :return: The updated contact, or None if it does not exist.
     :rtype: ContactDB | None
     """
-    db_contact = db.query(ContactDB).filter(and_(ContactDB.id == contact_id, ContactDB.user_id == user.id)).first()
+    db_contact = await db.scalar(select(ContactDB).filter(and_(ContactDB.id == contact_id, ContactDB.user_id == user.id)))
     if db_contact:
         for key, value in contact.model_dump().items():
             setattr(db_contact, key, value)
-        db.commit()
-        db.refresh(db_contact)
+        await db.commit()
+        await db.refresh(db_contact)
         return db_contact
 
 
-async def delete_contact(db: Session, db_contact, contact_id: int, user: UserDB):
+async def delete_contact(db: AsyncSession, db_contact, contact_id: int, user: UserDB):
     """
     Deletes a single contact with the specified ID for a specific user.
 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param db_contact: The contact to delete.
     :type db_contact: ContactDB
     :param contact_id: The ID of the contact to delete.
@@ -95,55 +299,249 @@ async def delete_contact(db: Session, db_contact, contact_id: int, user: UserDB)
     :param user: The user to delete the contact for.
     :type user: UserDB
     """
-    db_contact = db.query(ContactDB).filter(and_(ContactDB.id == contact_id, ContactDB.user_id == user.id)).first()
+    db_contact = await db.scalar(select(ContactDB).filter(and_(ContactDB.id == contact_id, ContactDB.user_id == user.id)))
     if db_contact:
-        db.delete(db_contact)
-        db.commit()
+        await db.delete(db_contact)
+        await db.commit()
+
+
+def _like_pattern(query: str) -> str:
+    """
+    Builds a ``%query%`` pattern with LIKE wildcards in the query escaped.
+
+    :param query: The search query.
+    :type query: str
+    :return: The LIKE pattern, using ``\\`` as the escape character.
+    :rtype: str
+    """
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _search_predicate(query: str):
+    """
+    Builds the substring match on first name, last name and email.
+
+    :param query: The search query.
+    :type query: str
+    :return: The filter clause.
+    :rtype: ColumnElement[bool]
+    """
+    pattern = _like_pattern(query)
+    return or_(
+        ContactDB.first_name.ilike(pattern, escape="\\"),
+        ContactDB.last_name.ilike(pattern, escape="\\"),
+        ContactDB.email.ilike(pattern, escape="\\"),
+    )
+
+
+def _search_postgresql(query: str, user: UserDB, limit: int):
+    """
+    Builds the PostgreSQL search query.
+
+    The ILIKE predicates are served by the ``pg_trgm`` GIN indexes on first name,
+    last name and email, and results are ranked by trigram similarity.
+
+    :param query: The search query.
+    :type query: str
+    :param user: The user to search contacts for.
+    :type user: UserDB
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :return: The select statement.
+    :rtype: Select
+    """
+    rank = func.greatest(
+        func.similarity(ContactDB.first_name, query),
+        func.similarity(ContactDB.last_name, query),
+        func.similarity(ContactDB.email, query),
+    )
+    return (
+        select(ContactDB)
+        .filter(ContactDB.user_id == user.id, _search_predicate(query))
+        .order_by(rank.desc(), ContactDB.id)
+        .limit(limit)
+    )
+
+
+def _search_sqlite(query: str, user: UserDB, limit: int):
+    """
+    Builds the SQLite search query on the ``contacts_fts`` FTS5 trigram index.
+
+    Results are ranked by ``bm25``.
+
+    :param query: The search query.
+    :type query: str
+    :param user: The user to search contacts for.
+    :type user: UserDB
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :return: The select statement.
+    :rtype: Select
+    """
+    fts = literal_column(CONTACTS_FTS_TABLE)
+    phrase = '"' + query.replace('"', '""') + '"'
+    return (
+        select(ContactDB)
+        .join(contacts_fts, contacts_fts.c.rowid == ContactDB.id)
+        .filter(ContactDB.user_id == user.id, fts.op("MATCH")(phrase))
+        .order_by(func.bm25(fts), ContactDB.id)
+        .limit(limit)
+    )
+
+
+def _search_like(query: str, user: UserDB, limit: int):
+    """
+    Builds the portable ILIKE search query used by other databases.
+
+    :param query: The search query.
+    :type query: str
+    :param user: The user to search contacts for.
+    :type user: UserDB
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :return: The select statement.
+    :rtype: Select
+    """
+    return (
+        select(ContactDB)
+        .filter(ContactDB.user_id == user.id, _search_predicate(query))
+        .order_by(ContactDB.id)
+        .limit(limit)
+    )
+
+
+SEARCH_ENGINES = {
+    "postgresql": _search_postgresql,
+    "sqlite": _search_sqlite,
+}
+
+
+def _search(query: str, db: AsyncSession, user: UserDB, limit: int):
+    """
+    Builds the search query for the current database.
+
+    :param query: The search query.
+    :type query: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :param user: The user to search contacts for.
+    :type user: UserDB
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :return: The select statement, or None if the query is blank.
+    :rtype: Select | None
+    """
+    query = query.strip().lower()
+    if not query:
+        return None
+    if len(query) < 3:
+        # Shorter than a trigram: the trigram indexes cannot serve it, the user's rows are filtered instead
+        engine = _search_like
+    else:
+        engine = SEARCH_ENGINES.get(db.get_bind().dialect.name, _search_like)
+    return engine(query, user, limit)
 
 
-async def search_contacts(query: str, db: Session, user: UserDB):
+async def search_contacts(query: str, db: AsyncSession, user: UserDB, limit: int = 20):
     """
     Searches for contacts by a query for a specific user.
 
+    The query is matched as a case-insensitive substring of the first name,
+    last name or email, using the trigram index of the current database
+    (``pg_trgm`` on PostgreSQL, FTS5 on SQLite), and the best matches come first.
+    Queries of one or two characters are matched the same way, without the
+    trigram index and in insertion order.
+
     :param query: The search query.
     :type query: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user to search contacts for.
     :type user: UserDB
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
     :return: A list of contacts matching the query.
     :rtype: List[ContactDB]
     """
-    query = query.lower()
-    contacts = db.query(ContactDB).filter(
-        and_(
-            ContactDB.user_id == user.id,
-            or_(
-                ContactDB.first_name.ilike("%"+query+"%"),
-                ContactDB.last_name.ilike("%"+query+"%"),
-                ContactDB.email.ilike("%"+query+"%")
-            )
-        )
-    ).all()
-    return contacts
+    stmt = _search(query, db, user, limit)
+    if stmt is None:
+        return []
+    contacts = await db.scalars(stmt)
+    return contacts.all()
+
 
-async def get_upcoming_birthdays(db: Session, user: UserDB):
+async def search_contact_rows(query: str, db: AsyncSession, user: UserDB, limit: int = 20):
+    """
+    Searches for contacts by a query for a specific user, as plain rows.
+
+    Same matches as :func:`search_contacts`, as tuples of :data:`CONTACT_ROW_COLUMNS`.
+
+    :param query: The search query.
+    :type query: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :param user: The user to search contacts for.
+    :type user: UserDB
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :return: A list of rows matching the query.
+    :rtype: List[Row]
+    """
+    stmt = _search(query, db, user, limit)
+    if stmt is None:
+        return []
+    return (await db.execute(stmt.with_only_columns(*CONTACT_ROW_COLUMNS))).all()
+
+
+def birthday_window(start: date, days: int):
+    """
+    Builds the ``birthday_mmdd`` predicate for birthdays in the next ``days`` days.
+
+    Birthdays are compared by their month/day key, so the window wraps around
+    New Year with an OR of two ranges, and February 29 birthdays fall inside
+    any window that spans the end of February, leap year or not.
+
+    :param start: The first day of the window.
+    :type start: date
+    :param days: The number of days after ``start`` included in the window.
+    :type days: int
+    :return: The filter clause.
+    :rtype: ColumnElement[bool]
+    """
+    if days >= 365:
+        return ContactDB.birthday_mmdd.is_not(None)
+    end = start + timedelta(days=days)
+    start_key = birthday_mmdd(start)
+    end_key = birthday_mmdd(end)
+    if start_key <= end_key:
+        return ContactDB.birthday_mmdd.between(start_key, end_key)
+    return or_(ContactDB.birthday_mmdd >= start_key, ContactDB.birthday_mmdd <= end_key)
+
+
+async def get_upcoming_birthdays(db: AsyncSession, user: UserDB, days: int = 7, today: date | None = None):
     """
     Retrieves a list of upcoming birthdays for contacts of a specific user.
 
+    The filtering runs in the database on the indexed ``(user_id, birthday_mmdd)``
+    pair, so only matching rows are loaded.
+
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user to retrieve upcoming birthdays for.
     :type user: UserDB
-    :return: A list of contacts whose birthday is within the next 7 days.
+    :param days: The size of the window in days, counting from today.
+    :type days: int
+    :param today: The first day of the window, defaults to the current date.
+    :type today: date | None
+    :return: A list of contacts whose birthday is within the window, soonest first.
     :rtype: List[ContactDB]
     """
-    today = datetime.now().date()
-    next_week = today + timedelta(days=7)
-    contacts = db.query(ContactDB).filter(ContactDB.user_id == user.id).all()
-    contacts_list = []
-    for contact in contacts:
-        contact_birthday = contact.birthday.replace(year=today.year)
-        if today <= contact_birthday.date() <= next_week:
-            contacts_list.append(contact)
-    return contacts_list
\ No newline at end of file
+    today = today or date.today()
+    start_key = birthday_mmdd(today)
+    contacts = await db.scalars(
+        select(ContactDB)
+        .filter(ContactDB.user_id == user.id, birthday_window(today, days))
+        .order_by(case((ContactDB.birthday_mmdd >= start_key, 0), else_=1), ContactDB.birthday_mmdd)
+    )
+    return contacts.all()
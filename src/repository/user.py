@@ -5,91 +5,92 @@ User repository module.
 
 This module contains the functions to interact with the UserDB model in the database.
 It includes functions to get a user by email, create a new user, update a user's token,
-confirm a user's email, and update a user's avatar.
+update a user's password hash, confirm a user's email, update a user's avatar, and fill in
+default avatars.
+Every change to an existing user invalidates its entry in the user cache.
 """
 
 from src.models.models import UserDB
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.schemas.schemas import UserModel
-from libgravatar import Gravatar 
+from src.services.user_cache import user_cache
 
 
 
-async def get_user_by_email(email: str, db: Session) -> UserDB:
+async def get_user_by_email(email: str, db: AsyncSession) -> UserDB:
     """
     Retrieves a user from the database by their email.
 
     :param email: The email of the user to retrieve.
     :type email: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The user with the specified email, or None if the user does not exist.
     :rtype: UserDB | None
     """
-    return db.query(UserDB).filter(UserDB.email == email).first()
+    return await db.scalar(select(UserDB).filter(UserDB.email == email))
 
 
-async def create_user(body: UserModel, db: Session) -> UserDB:
+async def create_user(body: UserModel, db: AsyncSession) -> UserDB:
     """
     Creates a new user in the database.
 
+    The user is created without an avatar; its Gravatar is filled in afterwards by
+    :func:`src.services.gravatar.assign_gravatar`.
+
     :param body: The data for the new user.
     :type body: UserModel
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The newly created user.
     :rtype: UserDB
     """
-    avatar = None
-    try:
-        g = Gravatar(body.email)
-        avatar = g.get_image()
-    except Exception as e:
-        print(e)
-    new_user = UserDB(**body.dict(), avatar=avatar)
+    new_user = UserDB(**body.dict())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: UserDB, token: str | None, db: Session) -> None:
+async def update_password(user: UserDB, password: str, db: AsyncSession) -> None:
     """
-    Updates the refresh token for a user.
+    Updates the password hash of a user.
 
-    :param user: The user to update the token for.
+    :param user: The user to update the password for.
     :type user: UserDB
-    :param token: The new refresh token.
-    :type token: str | None
+    :param password: The new password hash.
+    :type password: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     """
-    user.refresh_token = token
-    db.commit()
+    user.password = password
+    await db.commit()
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     Marks a user's email as confirmed.
 
     :param email: The email of the user to confirm.
     :type email: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(email)
 
-# async def update_avatar(email: str, avatar_path: str, db: Session) -> UserDB:
+# async def update_avatar(email: str, avatar_path: str, db: AsyncSession) -> UserDB:
 #     print(email)
 #     user = db.query(UserDB).filter(UserDB.email == email).first()
 #     print(user)
 #     user.avatar = avatar_path
-#     db.commit()
+#     await db.commit()
 #     db.refresh(user)
 #     return user
 
-async def update_avatar(email, url: str, db: Session) -> UserDB:
+async def update_avatar(email, url: str, db: AsyncSession) -> UserDB:
     """
     Updates the avatar for a user with the given email.
     Using the service Cloudinary
@@ -102,11 +103,60 @@ async def update_avatar(email, url: str, db: Session) -> UserDB:
     :param url: The new URL of the avatar image.
     :type url: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated user object.
     :rtype: UserDB
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
-    return user
\ No newline at end of file
+    await db.commit()
+    await user_cache.invalidate(email)
+    return user
+
+
+async def set_default_avatar(email: str, url: str, db: AsyncSession) -> bool:
+    """
+    Sets the avatar of a user unless the user already has one.
+
+    :param email: The email of the user.
+    :type email: str
+    :param url: The URL of the default avatar.
+    :type url: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: True if the avatar was set.
+    :rtype: bool
+    """
+    result = await db.execute(
+        update(UserDB).where(UserDB.email == email, UserDB.avatar.is_(None)).values(avatar=url)
+    )
+    await db.commit()
+    if result.rowcount:
+        await user_cache.invalidate(email)
+    return bool(result.rowcount)
+
+
+async def set_default_avatars(avatars: dict[str, str], db: AsyncSession) -> int:
+    """
+    Sets the avatars of several users, in one statement, skipping users that already have one.
+
+    :param avatars: The avatar URL of each user, keyed by email.
+    :type avatars: dict[str, str]
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The number of users updated.
+    :rtype: int
+    """
+    if not avatars:
+        return 0
+    connection = await db.connection()
+    result = await connection.execute(
+        update(UserDB.__table__)
+        .where(UserDB.email == bindparam("b_email"), UserDB.avatar.is_(None))
+        .values(avatar=bindparam("b_avatar")),
+        [{"b_email": email, "b_avatar": url} for email, url in avatars.items()],
+    )
+    await db.commit()
+    for email in avatars:
+        await user_cache.invalidate(email)
+    return result.rowcount
@@ -8,22 +8,117 @@ It includes routes for creating, reading, updating, deleting, and searching cont
 as well as retrieving upcoming birthdays.
 """
 
+import base64
+import binascii
+import json
 from src.repository import contacts as repository_contacts
-from fastapi import APIRouter, Depends, HTTPException, status
-from ..schemas.schemas import ContactResponse, ContactCreate
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
+from ..schemas.schemas import ContactResponse, ContactCreate, ImportReport, ImportRowError
+from src.services.contacts_io import (
+    IMPORT_FORMATS, EXPORT_FORMATS, EXPORT_MEDIA_TYPES, detect_format, read_contact_batches, encode_contacts,
+)
 from  src.db.database import get_db
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..models.models import UserDB
 from src.auth.auth import auth_service
-from fastapi_limiter.depends import RateLimiter
+from src.services.rate_limit import RateLimiter
+from src.services.serialization import ContactListResponse, dump_contact_rows
 
 
 # Initialize the router with a prefix and tags for grouping related routes
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
+# Rows validated and inserted per database round trip during an import
+IMPORT_BATCH_SIZE = 1000
+# Rejected rows listed in an import report; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+def encode_cursor(after_id: int) -> str:
+    """
+    Encode the keyset position of a contact list page as an opaque cursor.
+
+    :param after_id: The ID of the last contact on the page.
+    :type after_id: int
+    :return: The URL-safe cursor.
+    :rtype: str
+    """
+    raw = json.dumps({"after_id": after_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> int | None:
+    """
+    Decode a cursor produced by :func:`encode_cursor`.
+
+    :param cursor: The cursor received from the client.
+    :type cursor: str | None
+    :return: The ID to continue after, or None if no cursor was given.
+    :rtype: int | None
+    :raises HTTPException: If the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        after_id = json.loads(raw)["after_id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if not isinstance(after_id, int):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return after_id
+
+
+async def stream_contact_batches(db: AsyncSession, user: UserDB, after_id: int | None = None):
+    """
+    Yield the user's contacts from the database in batches for a streaming response.
+
+    The stream runs on its own session bound to the same engine, because the
+    request-scoped session may already be closed while the body is being sent.
+
+    :param db: The request database session.
+    :type db: AsyncSession
+    :param user: The user whose contacts are streamed.
+    :type user: UserDB
+    :param after_id: Only stream contacts with an ID greater than this one.
+    :type after_id: int | None
+    :return: An async iterator of contact lists.
+    :rtype: AsyncIterator[list[ContactDB]]
+    """
+    async with AsyncSession(db.bind, expire_on_commit=False) as stream_db:
+        async for batch in repository_contacts.stream_contacts(stream_db, user, after_id=after_id):
+            yield batch
+
+
+async def stream_contacts_json(db: AsyncSession, user: UserDB, after_id: int | None):
+    """
+    Yield the user's contacts as a JSON array, one database batch at a time.
+
+    Batches are read as plain rows on their own session, like
+    :func:`stream_contact_batches`, and encoded without building models.
+
+    :param db: The request database session.
+    :type db: AsyncSession
+    :param user: The user whose contacts are streamed.
+    :type user: UserDB
+    :param after_id: Only stream contacts with an ID greater than this one.
+    :type after_id: int | None
+    :return: An async iterator of JSON chunks.
+    :rtype: AsyncIterator[bytes]
+    """
+    yield b"["
+    separator = b""
+    async with AsyncSession(db.bind, expire_on_commit=False) as stream_db:
+        async for batch in repository_contacts.stream_contact_rows(stream_db, user, after_id=after_id):
+            # Drop the brackets of each batch array to splice it into the outer one
+            yield separator + dump_contact_rows(batch)[1:-1]
+            separator = b","
+    yield b"]"
+
 @router.post("/contacts/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED,
              dependencies=[Depends(RateLimiter(times=2, seconds=5))])
-async def create_contact(contact: ContactCreate, db: Session = Depends(get_db), 
+async def create_contact(contact: ContactCreate, db: AsyncSession = Depends(get_db), 
                     current_user: UserDB = Depends(auth_service.get_current_user)):
     """
     Create a new contact for the current user.
@@ -31,7 +126,7 @@ async def create_contact(contact: ContactCreate, db: Session = Depends(get_db),
     :param contact: The data for the contact to create.
     :type contact: ContactCreate
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The currently authenticated user.
     :type current_user: UserDB
     :return: The newly created contact.
@@ -40,27 +135,123 @@ async def create_contact(contact: ContactCreate, db: Session = Depends(get_db),
     db_contact = await repository_contacts.create_contact(contact, db, current_user)
     return db_contact
 
+@router.post("/contacts/import", response_model=ImportReport,
+             description='No more than 2 imports per minute',
+             dependencies=[Depends(RateLimiter(times=2, seconds=60))])
+async def import_contacts(file: UploadFile = File(...),
+                          file_format: str | None = Query(None, alias="format", pattern="^(csv|ndjson)$"),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: UserDB = Depends(auth_service.get_current_user)):
+    """
+    Import contacts for the current user from a CSV or NDJSON file.
+
+    CSV files need a header row with the ``ContactCreate`` field names; NDJSON
+    files hold one contact object per line. The file is read and validated in
+    batches, and each batch is inserted in one round trip. Rows that fail
+    validation or database constraints are skipped and reported.
+
+    :param file: The uploaded file.
+    :type file: UploadFile
+    :param file_format: ``csv`` or ``ndjson``; guessed from the file name or content type if omitted.
+    :type file_format: str | None
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The currently authenticated user.
+    :type current_user: UserDB
+    :return: The number of imported and rejected rows, with the rejected rows.
+    :rtype: ImportReport
+    :raises HTTPException: If the file format cannot be determined.
+    """
+    file_format = file_format or detect_format(file.filename, file.content_type)
+    if file_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Upload a .csv or .ndjson file or pass format=csv|ndjson")
+    report = ImportReport()
+    async for valid, invalid in read_contact_batches(file.file, file_format, IMPORT_BATCH_SIZE):
+        failed = invalid + await repository_contacts.bulk_create_contacts(db, valid, current_user)
+        report.imported += len(valid) + len(invalid) - len(failed)
+        report.failed += len(failed)
+        for row, error in sorted(failed)[:MAX_REPORTED_ERRORS - len(report.errors)]:
+            report.errors.append(ImportRowError(row=row, error=error))
+    return report
+
+
+@router.get("/contacts/export", response_class=StreamingResponse,
+            description='No more than 2 exports per minute',
+            dependencies=[Depends(RateLimiter(times=2, seconds=60))])
+async def export_contacts(file_format: str = Query("csv", alias="format", pattern="^(csv|ndjson|vcard)$"),
+                          gzip: bool = False, db: AsyncSession = Depends(get_db),
+                          current_user: UserDB = Depends(auth_service.get_current_user)):
+    """
+    Export all contacts of the current user as a CSV, NDJSON or vCard file.
+
+    Contacts are read through a server-side cursor and written to the response
+    as they are fetched, so the export never holds more than one batch in memory.
+
+    :param file_format: ``csv``, ``ndjson`` or ``vcard``.
+    :type file_format: str
+    :param gzip: Whether to gzip the file on the fly.
+    :type gzip: bool
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The currently authenticated user.
+    :type current_user: UserDB
+    :return: The streamed file.
+    :rtype: StreamingResponse
+    """
+    media_type, extension = EXPORT_MEDIA_TYPES[file_format]
+    filename = f"contacts.{extension}"
+    if gzip:
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        encode_contacts(stream_contact_batches(db, current_user), file_format, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @router.get("/contacts/", response_model=list[ContactResponse], 
             description='No more than 10 requests per minute',
             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def read_contacts(db: Session = Depends(get_db),
-                    current_user: UserDB = Depends(auth_service.get_current_user)):
+async def read_contacts(limit: int = Query(100, ge=1, le=1000), cursor: str | None = None,
+                        stream: bool = False, db: AsyncSession = Depends(get_db),
+                        current_user: UserDB = Depends(auth_service.get_current_user)):
     """
-    Retrieve a list of contacts for the current user.
+    Retrieve a page of contacts for the current user.
+
+    Contacts are ordered by ID. When more contacts follow the returned page, the
+    ``X-Next-Cursor`` response header holds the cursor for the next request.
+    With ``stream=true`` every contact after the cursor is streamed as one JSON
+    array, fetched from the database in batches, and ``limit`` is ignored.
+    Contacts are read as plain rows and encoded directly, without building a
+    ``ContactResponse`` per contact.
 
+    :param limit: The maximum number of contacts on the page.
+    :type limit: int
+    :param cursor: The opaque cursor returned with the previous page.
+    :type cursor: str | None
+    :param stream: Whether to stream all remaining contacts instead of a page.
+    :type stream: bool
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The currently authenticated user.
     :type current_user: UserDB
     :return: A list of contacts.
-    :rtype: list[ContactResponse]
+    :rtype: ContactListResponse
     """
-    contacts = await repository_contacts.get_contacts(db, current_user)
-    return contacts
+    after_id = decode_cursor(cursor)
+    if stream:
+        return StreamingResponse(stream_contacts_json(db, current_user, after_id), media_type="application/json")
+    rows = await repository_contacts.get_contact_rows(db, current_user, limit=limit + 1, after_id=after_id)
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
+    return ContactListResponse(rows, headers=headers)
 
 
 @router.put("/contacts/{contact_id}", response_model=ContactResponse)
-async def update_contact(contact_id: int, contact: ContactCreate, db: Session = Depends(get_db), 
+async def update_contact(contact_id: int, contact: ContactCreate, db: AsyncSession = Depends(get_db), 
                     current_user: UserDB = Depends(auth_service.get_current_user)):
     """
     Update a contact with the specified ID for the current user.
@@ -70,7 +261,7 @@ async def update_contact(contact_id: int, contact: ContactCreate, db: Session =
     :param contact: The updated data for the contact.
     :type contact: ContactCreate
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The currently authenticated user.
     :type current_user: UserDB
     :return: The updated contact.
@@ -84,7 +275,7 @@ async def update_contact(contact_id: int, contact: ContactCreate, db: Session =
     return db_contact
 
 @router.delete("/contacts/{contact_id}")
-async def delete_contact(contact_id: int, db: Session = Depends(get_db), 
+async def delete_contact(contact_id: int, db: AsyncSession = Depends(get_db), 
                     current_user: UserDB = Depends(auth_service.get_current_user)):
     """
     Delete a contact with the specified ID for the current user.
@@ -92,7 +283,7 @@ async def delete_contact(contact_id: int, db: Session = Depends(get_db),
     :param contact_id: The ID of the contact to delete.
     :type contact_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The currently authenticated user.
     :type current_user: UserDB
     :return: A success message.
@@ -108,36 +299,42 @@ async def delete_contact(contact_id: int, db: Session = Depends(get_db),
 @router.get("/contacts/search/", response_model=list[ContactResponse], 
             description='No more than 10 requests per minute',
             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def search_contacts(query: str, db: Session = Depends(get_db), 
+async def search_contacts(query: str, limit: int = Query(20, ge=1, le=100), db: AsyncSession = Depends(get_db),
                     current_user: UserDB = Depends(auth_service.get_current_user)):
     """
     Search for contacts by a query for the current user.
 
+    The query matches any part of the first name, last name or email, ignoring case.
+
     :param query: The search query.
     :type query: str
+    :param limit: The maximum number of contacts to return, best matches first.
+    :type limit: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The currently authenticated user.
     :type current_user: UserDB
     :return: A list of contacts matching the query.
-    :rtype: list[ContactResponse]
+    :rtype: ContactListResponse
     """
-    contacts = await repository_contacts.search_contacts(query, db, current_user)
-    return contacts
+    rows = await repository_contacts.search_contact_rows(query, db, current_user, limit=limit)
+    return ContactListResponse(rows)
 
 @router.get("/contacts/birthdays/", response_model=list[ContactResponse])
-async def get_upcoming_birthdays(db: Session = Depends(get_db), 
+async def get_upcoming_birthdays(days: int = Query(7, ge=0, le=366), db: AsyncSession = Depends(get_db),
                     current_user: UserDB = Depends(auth_service.get_current_user)):
     """
     Retrieve a list of upcoming birthdays for contacts of the current user.
 
+    :param days: The number of days ahead to look for birthdays.
+    :type days: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The currently authenticated user.
     :type current_user: UserDB
-    :return: A list of contacts whose birthday is within the next 7 days.
+    :return: A list of contacts whose birthday is within the next ``days`` days.
     :rtype: list[ContactResponse]
     """
-    contacts = await repository_contacts.get_upcoming_birthdays(db, current_user)
+    contacts = await repository_contacts.get_upcoming_birthdays(db, current_user, days=days)
 
     return contacts
\ No newline at end of file
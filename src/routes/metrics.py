@@ -0,0 +1,126 @@
+#src.routes.metrics.py
+
+"""
+Metrics routes module.
+
+This module contains the FastAPI routes exposing the runtime metrics of the
+process. They are meant to be scraped from the internal network and carry no
+user data: statements are listed with their placeholders, never their parameters.
+
+The metrics describe the internals of the service, so a route is only served
+to requests carrying the ``metrics_token`` setting as a bearer token, and not
+found at all while the setting is empty.
+"""
+
+import hmac
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from starlette import status
+
+from src.auth.auth import auth_service
+from src.conf.config import settings
+from src.db.database import db_metrics, replicas, session_metrics
+from src.db.metrics import DatabaseMetrics
+from src.services.instrumentation import http_metrics
+from src.services.metrics import PrometheusText
+from src.services.rate_limit import buckets
+from src.services.user_cache import user_cache
+
+# Initialize the router with a prefix and tags for grouping related routes
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+def require_metrics_token(request: Request):
+    """
+    Route dependency admitting only the requests that carry the metrics token.
+
+    :param request: The HTTP request.
+    :type request: Request
+    :raises HTTPException: ``404`` while no token is configured, ``401`` for a missing or wrong token.
+    """
+    if not settings.metrics_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.metrics_token.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.get("/db", dependencies=[Depends(require_metrics_token)])
+async def database_metrics(top: int = 20):
+    """
+    Report the connection pool and query metrics of the primary and of each replica,
+    and the connection hold time of the request sessions.
+
+    :param top: The number of statements listed per engine, by total time.
+    :type top: int
+    :return: The metrics of the ``primary``, the ``replicas`` and the ``sessions``.
+    :rtype: dict
+    """
+    return {
+        "primary": db_metrics.snapshot(top=top),
+        "replicas": [metrics.snapshot(top=top) for metrics in replicas.metrics],
+        "sessions": session_metrics.snapshot(),
+    }
+
+
+def export_database(page: PrometheusText, metrics: DatabaseMetrics, engine: str):
+    """
+    Add the pool and statement metrics of an engine to a metrics page.
+
+    :param page: The page.
+    :type page: PrometheusText
+    :param metrics: The metrics of the engine.
+    :type metrics: DatabaseMetrics
+    :param engine: ``primary`` or the name of a replica.
+    :type engine: str
+    """
+    pool = getattr(metrics.engine, "pool", None)
+    capacity = getattr(pool, "capacity", None)
+    if capacity is not None:
+        page.gauge("db_pool_capacity", "The most connections the pool opens.", capacity, engine=engine)
+    page.gauge("db_pool_checked_out", "Connections checked out of the pool.", metrics.in_use, engine=engine)
+    page.counter("db_pool_checkouts_total", "Connections checked out of the pool.", metrics.checkouts, engine=engine)
+    page.counter("db_pool_saturated_total", "Checkouts that found the pool exhausted.", metrics.saturated,
+                 engine=engine)
+    page.counter("db_pool_timeouts_total", "Checkouts that timed out.", metrics.timeouts, engine=engine)
+    page.histogram("db_pool_checkout_wait_seconds", "Time waited for a connection.", metrics.checkout_wait,
+                   engine=engine)
+    page.histogram("db_statement_duration_seconds", "Time taken by SQL statements.", metrics.statement_latency,
+                   engine=engine)
+    page.counter("db_slow_statements_total", "Statements slower than the slow query threshold.",
+                 metrics.slow_queries, engine=engine)
+
+
+@router.get("", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_token)])
+async def prometheus_metrics():
+    """
+    Report the metrics of the process in the Prometheus text format: requests per
+    route, database, rate limits, caches and password hashing.
+
+    :return: The metrics page.
+    :rtype: PlainTextResponse
+    """
+    page = PrometheusText()
+    http_metrics.export(page)
+    export_database(page, db_metrics, "primary")
+    for i, metrics in enumerate(replicas.metrics):
+        export_database(page, metrics, f"replica{i}")
+        page.counter("db_replica_failures_total", "Times a replica was left out after failing to connect.",
+                     replicas.failures[i], engine=f"replica{i}")
+    page.histogram("db_session_connection_hold_seconds", "Time request sessions held a connection.",
+                   session_metrics.hold_time)
+    page.counter("rate_limit_rejected_total", "Requests rejected by a rate limit.", buckets.rejected)
+    page.counter("rate_limit_degraded_total", "Rate limit checks made without Redis.", buckets.degraded)
+    lookups = "Lookups of the users authenticating requests, by the tier that answered."
+    page.counter("user_cache_lookups_total", lookups, user_cache.local.hits, result="local")
+    page.counter("user_cache_lookups_total", lookups, user_cache.redis_hits, result="redis")
+    page.counter("user_cache_lookups_total", lookups, user_cache.misses, result="miss")
+    token_lookups = "Lookups of verified access tokens."
+    page.counter("token_cache_lookups_total", token_lookups, auth_service.token_cache.hits, result="hit")
+    page.counter("token_cache_lookups_total", token_lookups, auth_service.token_cache.misses, result="miss")
+    page.gauge("password_hash_pending", "Password hashing jobs running or queued.", auth_service.hasher.pending)
+    page.counter("password_hash_rejected_total", "Password hashing jobs rejected as the pool was full.",
+                 auth_service.hasher.rejected)
+    return PlainTextResponse(page.render(), media_type=PrometheusText.content_type)
@@ -5,21 +5,22 @@ User routes module.
 
 This module contains the FastAPI routes for user-related operations.
 It includes routes for user signup, login, requesting email confirmation,
-refreshing tokens, confirming email, updating avatar, and retrieving the current user's information.
+refreshing tokens, logging out, confirming email, updating avatar, and retrieving the current user's information.
 """
 
-import cloudinary
-import cloudinary.uploader
 from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request, UploadFile, File
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db.database import get_db
+from src.db.database import get_db, get_primary_db
 from src.schemas.schemas import UserModel, UserResponse, TokenModel, RequestEmail, UserDb
 from src.repository import user as repository_users
 from src.conf.config import settings
 from src.auth.auth import auth_service
+from src.services import avatars
 from src.services.email import send_email
+from src.services.gravatar import assign_gravatar
+from src.services.token_store import token_store
 from src.models.models import UserDB
 
 # Initialize the router with a prefix and tags for grouping related routes
@@ -27,7 +28,7 @@ router = APIRouter(prefix='/auth', tags=["auth"])
 security = HTTPBearer()
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Sign up a new user.
 
@@ -38,7 +39,7 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
     :param request: The HTTP request.
     :type request: Request
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The newly created user and a confirmation message.
     :rtype: dict
     :raises HTTPException: If the user already exists.
@@ -46,40 +47,46 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
     background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
+    background_tasks.add_task(assign_gravatar, new_user.email)
     return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
 
 @router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     Log in a user.
 
     :param body: The OAuth2 password request form.
     :type body: OAuth2PasswordRequestForm
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The access and refresh tokens.
     :rtype: TokenModel
     :raises HTTPException: If the email is invalid, the email is not confirmed, or the password is invalid.
+
+    A password hashed with an outdated number of bcrypt rounds is rehashed and stored.
     """
     user = await repository_users.get_user_by_email(body.username, db)
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not auth_service.verify_password(body.password, user.password):
+    verified, new_hash = await auth_service.verify_and_update_password(body.password, user.password)
+    if not verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
-    # Generate JWT
+    if new_hash is not None:
+        await repository_users.update_password(user, new_hash, db)
+    # Generate JWT; the refresh token starts a new session in the token store
+    session = await token_store.issue(user.email)
     access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, db)
+    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email, **session})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 @router.post('/request_email')
 async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)):
+                        db: AsyncSession = Depends(get_db)):
     """
     Request a new email confirmation.
 
@@ -90,7 +97,7 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     :param request: The HTTP request.
     :type request: Request
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A confirmation message.
     :rtype: dict
     """
@@ -103,40 +110,61 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     return {"message": "Check your email for confirmation."}
 
 @router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Refresh the access token.
 
+    The refresh token is rotated within its session in the token store, so no
+    database write is needed. Reusing a refresh token that was already rotated
+    ends the session.
+
     :param credentials: The HTTP authorization credentials.
     :type credentials: HTTPAuthorizationCredentials
-    :param db: The database session.
-    :type db: Session
     :return: The new access and refresh tokens.
     :rtype: TokenModel
-    :raises HTTPException: If the refresh token is invalid.
+    :raises HTTPException: If the refresh token is invalid, expired or reused.
     """
-    token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, db)
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
-
+    claims = await auth_service.decode_refresh_token(credentials.credentials)
+    session = await token_store.rotate(claims)
+    email = claims["sub"]
     access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
-    await repository_users.update_token(user, refresh_token, db)
+    refresh_token = await auth_service.create_refresh_token(data={"sub": email, **session})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
+@router.post('/logout', status_code=status.HTTP_204_NO_CONTENT)
+async def logout(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    End the session of a refresh token.
+
+    :param credentials: The HTTP authorization credentials carrying the refresh token.
+    :type credentials: HTTPAuthorizationCredentials
+    :raises HTTPException: If the refresh token is invalid.
+    """
+    claims = await auth_service.decode_refresh_token(credentials.credentials)
+    await token_store.revoke(claims)
+
+
+@router.post('/logout_all', status_code=status.HTTP_204_NO_CONTENT)
+async def logout_all(current_user: UserDB = Depends(auth_service.get_current_user)):
+    """
+    End every session of the current user, on every device.
+
+    :param current_user: The currently authenticated user.
+    :type current_user: UserDB
+    """
+    await token_store.revoke_all(current_user.email)
+
+
 @router.get('/confirmed_email/{token}')
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_primary_db)):
     """
     Confirm the user's email.
 
     :param token: The confirmation token.
     :type token: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A confirmation message.
     :rtype: dict
     :raises HTTPException: If the verification fails.
@@ -153,7 +181,7 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
 @router.post("/avatar")
 async def update_avatar( file: UploadFile = File(...),
                         current_user: UserDb = Depends(auth_service.get_current_user),
-                        db: Session = Depends(get_db),
+                        db: AsyncSession = Depends(get_db),
                     ):
     """
     Update the user's avatar.
@@ -163,7 +191,7 @@ async def update_avatar( file: UploadFile = File(...),
     :param current_user: The currently authenticated user.
     :type current_user: UserDb
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A confirmation message and the updated user.
     :rtype: dict
     """
@@ -185,29 +213,23 @@ async def read_users_me(current_user: UserDB = Depends(auth_service.get_current_
 
 @router.patch('/avatar', response_model=UserDb)
 async def update_avatar_user(file: UploadFile = File(), current_user: UserDB = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)):
+                             db: AsyncSession = Depends(get_db)):
     """
-    Update the user's avatar using Cloudinary.
-    Using the service Cloudinary
-    
+    Update the user's avatar.
+
+    The image is resized to 250x250 off the event loop and stored through the
+    avatar storage backend (local files by default, or Cloudinary).
+
     :param file: The uploaded file.
     :type file: UploadFile
     :param current_user: The currently authenticated user.
     :type current_user: UserDB
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated user.
     :rtype: UserDb
+    :raises HTTPException: If the file is too large or is not an image.
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
-    r = cloudinary.uploader.upload(file.file, public_id=f'ContactsApp/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'ContactsApp/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    src_url = await avatars.store_avatar(file)
     user = await repository_users.update_avatar(current_user.email, src_url, db)
     return user
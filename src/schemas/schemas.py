@@ -55,6 +55,30 @@ class ContactResponse(ContactBase):
         from_attributes = True
 
 
+class ImportRowError(BaseModel):
+    """
+    Pydantic model for a row that could not be imported.
+
+    - row: The number of the row in the file, starting at 1 for the first data row.
+    - error: Why the row was rejected.
+    """
+    row: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    """
+    Pydantic model for the result of a bulk contact import.
+
+    - imported: The number of contacts created.
+    - failed: The number of rows that were rejected.
+    - errors: The rejected rows, up to a fixed number of them.
+    """
+    imported: int = 0
+    failed: int = 0
+    errors: list[ImportRowError] = []
+
+
 class UserModel(BaseModel):
     """
     Pydantic model for a User.
@@ -86,7 +110,7 @@ class UserDb(BaseModel):
     username: str
     email: str
     created_at: datetime
-    avatar: str
+    avatar: str | None = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,245 @@
+#src.services.avatars.py
+
+"""
+Avatar Service Module.
+
+This module contains the avatar upload pipeline. An uploaded image is streamed
+to a temporary file while its SHA-256 digest is computed, then cropped and
+resized to 250x250 in a dedicated thread pool, and finally stored through a
+storage backend. Nothing in the pipeline blocks the event loop.
+
+Avatars are content-addressed: the key of an avatar is the digest of the
+uploaded file, so uploading the same image again (by any user) finds the
+stored avatar and skips the resize and the upload.
+
+Two storage backends are available, selected by the ``avatar_storage`` setting:
+
+- ``local`` (default): JPEG files in ``avatar_dir``, served under ``avatar_url_prefix``.
+- ``cloudinary``: images uploaded to Cloudinary.
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cloudinary
+import cloudinary.api
+import cloudinary.uploader
+from cloudinary.exceptions import NotFound
+from fastapi import HTTPException, UploadFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+from starlette import status
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+
+AVATAR_SIZE = (250, 250)
+
+# Bytes read from the upload at a time
+CHUNK_SIZE = 64 * 1024
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Return the thread pool used to resize avatars, creating it on first use.
+
+    :return: The thread pool.
+    :rtype: ThreadPoolExecutor
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.avatar_workers, thread_name_prefix="avatar")
+    return _executor
+
+
+async def spool_upload(file: UploadFile, max_bytes: int) -> tuple[str, str]:
+    """
+    Copy an upload to a temporary file, chunk by chunk, hashing it on the way.
+
+    :param file: The uploaded file.
+    :type file: UploadFile
+    :param max_bytes: The largest accepted upload.
+    :type max_bytes: int
+    :return: The path of the temporary file, which the caller must remove, and the
+             hex SHA-256 digest of its content.
+    :rtype: tuple[str, str]
+    :raises HTTPException: If the upload is larger than ``max_bytes``.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="avatar-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                        detail=f"Avatar larger than {max_bytes} bytes")
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def resize_avatar(path: str) -> bytes:
+    """
+    Crop an image to a square around its centre and resize it to :data:`AVATAR_SIZE`.
+
+    :param path: The path of the image.
+    :type path: str
+    :return: The avatar as JPEG.
+    :rtype: bytes
+    :raises UnidentifiedImageError: If the file is not an image.
+    """
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+        avatar = ImageOps.fit(image, AVATAR_SIZE, method=Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    avatar.save(out, format="JPEG", quality=85, optimize=True)
+    return out.getvalue()
+
+
+class LocalAvatarStorage:
+    """
+    Avatars stored as files named after their key.
+    """
+
+    def __init__(self, root: str, url_prefix: str):
+        """
+        :param root: The directory of the avatar files.
+        :type root: str
+        :param url_prefix: The URL the directory is served under.
+        :type url_prefix: str
+        """
+        self.root = root
+        self.url_prefix = url_prefix.rstrip("/")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.jpg")
+
+    async def find(self, key: str) -> str | None:
+        """
+        Return the URL of a stored avatar.
+
+        :param key: The avatar key.
+        :type key: str
+        :return: The URL, or None if no avatar has this key.
+        :rtype: str | None
+        """
+        exists = await run_in_threadpool(os.path.exists, self._path(key))
+        return f"{self.url_prefix}/{key}.jpg" if exists else None
+
+    async def save(self, key: str, data: bytes) -> str:
+        """
+        Store an avatar.
+
+        :param key: The avatar key.
+        :type key: str
+        :param data: The JPEG image.
+        :type data: bytes
+        :return: The URL of the avatar.
+        :rtype: str
+        """
+        await run_in_threadpool(self._write, key, data)
+        return f"{self.url_prefix}/{key}.jpg"
+
+    def _write(self, key: str, data: bytes):
+        os.makedirs(self.root, exist_ok=True)
+        # Write then rename, so a concurrent reader never sees a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".avatar-")
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.replace(tmp, self._path(key))
+
+
+class CloudinaryAvatarStorage:
+    """
+    Avatars uploaded to Cloudinary under ``ContactsApp/avatars/<key>``.
+    """
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str):
+        """
+        :param cloud_name: The name of the Cloudinary account.
+        :type cloud_name: str
+        :param api_key: The API key for Cloudinary.
+        :type api_key: str
+        :param api_secret: The API secret for Cloudinary.
+        :type api_secret: str
+        """
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+
+    @staticmethod
+    def _public_id(key: str) -> str:
+        return f"ContactsApp/avatars/{key}"
+
+    async def find(self, key: str) -> str | None:
+        """
+        Return the URL of a stored avatar, or None if no avatar has this key.
+        """
+        try:
+            resource = await run_in_threadpool(cloudinary.api.resource, self._public_id(key))
+        except NotFound:
+            return None
+        return resource["secure_url"]
+
+    async def save(self, key: str, data: bytes) -> str:
+        """
+        Upload an avatar and return its URL.
+        """
+        result = await run_in_threadpool(cloudinary.uploader.upload, io.BytesIO(data),
+                                         public_id=self._public_id(key), overwrite=False)
+        return result["secure_url"]
+
+
+def create_storage():
+    """
+    Build the storage backend named by the ``avatar_storage`` setting.
+
+    :return: The storage backend.
+    :rtype: LocalAvatarStorage | CloudinaryAvatarStorage
+    """
+    if settings.avatar_storage == "cloudinary":
+        return CloudinaryAvatarStorage(settings.cloudinary_name, settings.cloudinary_api_key,
+                                       settings.cloudinary_api_secret)
+    return LocalAvatarStorage(settings.avatar_dir, settings.avatar_url_prefix)
+
+
+storage = create_storage()
+
+
+async def store_avatar(file: UploadFile) -> str:
+    """
+    Run an uploaded image through the avatar pipeline.
+
+    :param file: The uploaded image.
+    :type file: UploadFile
+    :return: The URL of the stored avatar.
+    :rtype: str
+    :raises HTTPException: If the upload is too large or is not an image.
+    """
+    path, key = await spool_upload(file, settings.avatar_max_bytes)
+    try:
+        url = await storage.find(key)
+        if url is not None:
+            return url
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(get_executor(), resize_avatar, path)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The file is not a valid image")
+        return await storage.save(key, data)
+    finally:
+        os.remove(path)
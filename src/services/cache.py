@@ -0,0 +1,96 @@
+#src.services.cache.py
+
+"""
+In-Process Cache Module.
+
+This module contains a small LRU cache with per-entry expiry, used wherever a
+value is read far more often than it changes and a short staleness window is
+acceptable.
+"""
+
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Least-recently-used cache whose entries also expire after a time to live.
+
+    The cache is meant to be used from a single event loop and is not thread-safe.
+    Hits and misses are counted for instrumentation.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        :param maxsize: The maximum number of entries; the least recently used one is evicted first.
+        :type maxsize: int
+        :param ttl: The default number of seconds an entry stays valid.
+        :type ttl: float
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Return the value stored under ``key`` if it has not expired.
+
+        :param key: The cache key.
+        :param default: The value returned on a miss.
+        :return: The cached value, or ``default``.
+        """
+        item = self._data.get(key)
+        if item is not None:
+            value, expires_at = item
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl: float | None = None):
+        """
+        Store ``value`` under ``key``.
+
+        :param key: The cache key.
+        :param value: The value to store.
+        :param ttl: The number of seconds the entry stays valid, defaults to the cache TTL.
+        :type ttl: float | None
+        """
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """
+        Remove ``key`` from the cache.
+
+        :param key: The cache key.
+        :param default: The value returned if the key is not cached.
+        :return: The removed value, or ``default``.
+        """
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters.
+        """
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """
+        The share of lookups answered from the cache, between 0 and 1.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,316 @@
+#src.services.compression.py
+
+"""
+Response Compression Module.
+
+This module contains :class:`CompressionMiddleware`, which compresses response
+bodies with the best encoding the client accepts, negotiated from its
+``Accept-Encoding`` header: ``zstd``, ``br`` (brotli) or ``gzip``. Brotli and
+zstd are only offered when the ``brotli`` and ``zstandard`` packages are
+installed; gzip always is.
+
+- Only textual bodies (JSON, NDJSON, CSV, vCard, HTML...) are compressed, and
+  only from ``minimum_size`` bytes: below that, compressing saves too little to
+  be worth the CPU.
+- Streamed responses are compressed chunk by chunk, each chunk flushed, so the
+  client still receives the stream as it is produced.
+- Compressing a large body can take milliseconds of CPU, during which the event
+  loop would serve nothing else. Chunks of ``offload_size`` bytes or more are
+  therefore compressed in a dedicated thread pool (the compression libraries
+  release the GIL), while small ones are compressed inline, where a thread hop
+  would cost more than the compression itself.
+"""
+
+import asyncio
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+}
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Return the thread pool compressing large bodies, creating it on first use.
+
+    :return: The thread pool.
+    :rtype: ThreadPoolExecutor
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.compression_workers, thread_name_prefix="compression")
+    return _executor
+
+
+class GzipCompressor:
+    """
+    Streaming gzip compressor.
+    """
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliCompressor:
+    """
+    Streaming brotli compressor.
+    """
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdCompressor:
+    """
+    Streaming zstd compressor.
+    """
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+# The encodings this process can produce, preferred first
+AVAILABLE_ENCODINGS = tuple(name for name, module in (("zstd", zstandard), ("br", brotli), ("gzip", zlib))
+                            if module is not None)
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """
+    Parse an ``Accept-Encoding`` header.
+
+    :param header: The header value, e.g. ``gzip, br;q=0.8``.
+    :type header: str
+    :return: The quality value of every listed encoding.
+    :rtype: dict[str, float]
+    """
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with a negotiated encoding.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, offload_size: int = 64 * 1024,
+                 encodings: list[str] | None = None, gzip_level: int = 6, brotli_quality: int = 4,
+                 zstd_level: int = 3):
+        """
+        :param app: The application.
+        :type app: ASGIApp
+        :param minimum_size: The smallest body compressed, in bytes.
+        :type minimum_size: int
+        :param offload_size: The smallest chunk compressed in the thread pool, in bytes.
+        :type offload_size: int
+        :param encodings: The encodings offered, preferred first; unavailable ones are ignored.
+        :type encodings: list[str] | None
+        :param gzip_level: The gzip compression level (1-9).
+        :type gzip_level: int
+        :param brotli_quality: The brotli quality (0-11).
+        :type brotli_quality: int
+        :param zstd_level: The zstd compression level (1-22).
+        :type zstd_level: int
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.encodings = [e for e in (encodings or AVAILABLE_ENCODINGS) if e in AVAILABLE_ENCODINGS]
+        self.levels = {"gzip": gzip_level, "br": brotli_quality, "zstd": zstd_level}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, CompressionResponder(self, encoding, send))
+
+    def negotiate(self, accept_encoding: str) -> str | None:
+        """
+        Choose the encoding of a response.
+
+        The encoding with the highest quality value wins; between equal values,
+        the one listed first in ``encodings``.
+
+        :param accept_encoding: The ``Accept-Encoding`` header of the request.
+        :type accept_encoding: str
+        :return: The encoding, or None to send the body as is.
+        :rtype: str | None
+        """
+        accepted = parse_accept_encoding(accept_encoding)
+        best, best_quality = None, 0.0
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, accepted.get("*", 0.0))
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compressor(self, encoding: str):
+        """
+        Create a streaming compressor.
+
+        :param encoding: ``gzip``, ``br`` or ``zstd``.
+        :type encoding: str
+        :return: The compressor.
+        :rtype: GzipCompressor | BrotliCompressor | ZstdCompressor
+        """
+        if encoding == "zstd":
+            return ZstdCompressor(self.levels["zstd"])
+        if encoding == "br":
+            return BrotliCompressor(self.levels["br"])
+        return GzipCompressor(self.levels["gzip"])
+
+    async def run(self, func, data: bytes) -> bytes:
+        """
+        Compress data inline, or in the thread pool if it is large.
+
+        :param func: The compressor method.
+        :type func: Callable[[bytes], bytes]
+        :param data: The data.
+        :type data: bytes
+        :return: The compressed data.
+        :rtype: bytes
+        """
+        if len(data) >= self.offload_size:
+            return await asyncio.get_running_loop().run_in_executor(get_executor(), func, data)
+        return func(data)
+
+    @staticmethod
+    def compressible(headers: Headers) -> bool:
+        """
+        Tell whether a response may be compressed, from its headers.
+
+        :param headers: The response headers.
+        :type headers: Headers
+        :return: True for textual bodies neither encoded nor partial.
+        :rtype: bool
+        """
+        if "content-encoding" in headers or "content-range" in headers:
+            return False
+        media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+        return (media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+                or media_type.endswith(("+json", "+xml")))
+
+
+class CompressionResponder:
+    """
+    The ``send`` callable of one compressed response.
+
+    The start of the response is held back until enough of the body is known:
+    the whole body if it is smaller than ``minimum_size``, which is then sent
+    as is, or its first ``minimum_size`` bytes, after which the body is
+    compressed as it comes.
+    """
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start = None
+        self.passthrough = False
+        self.pending = []
+        self.pending_size = 0
+        self.compressor = None
+
+    async def __call__(self, message: Message):
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            if self.middleware.compressible(headers):
+                self.start = message
+            else:
+                self.passthrough = True
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            self.pending.append(body)
+            self.pending_size += len(body)
+            if more_body and self.pending_size < self.middleware.minimum_size:
+                return
+            body, self.pending = b"".join(self.pending), []
+            headers = MutableHeaders(scope=self.start)
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body and len(body) < self.middleware.minimum_size:
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            self.compressor = self.middleware.compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            if not more_body:
+                body = await self.middleware.run(self.compressor.finish, body)
+                headers["Content-Length"] = str(len(body))
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self.send(self.start)
+
+        if more_body:
+            body = await self.middleware.run(self.compressor.compress, body)
+            if body:
+                await self.send({"type": "http.response.body", "body": body, "more_body": True})
+        else:
+            body = await self.middleware.run(self.compressor.finish, body)
+            await self.send({"type": "http.response.body", "body": body})
@@ -0,0 +1,317 @@
+#src.services.contacts_io.py
+
+"""
+Contacts Import/Export Service Module.
+
+This module contains the file formats used to move contacts in and out of the
+application in bulk. Uploaded CSV and NDJSON files are read lazily, a batch of
+rows at a time, and every row is validated with ``ContactCreate`` so one bad
+row is reported instead of failing the whole upload. Exports are encoded batch
+by batch as the rows arrive from the database, optionally gzip-compressed on
+the fly, so memory use does not grow with the number of contacts.
+"""
+
+import codecs
+import csv
+import io
+import json
+import zlib
+from typing import Iterator
+
+from pydantic import ValidationError
+from starlette.concurrency import iterate_in_threadpool
+
+from src.schemas.schemas import ContactCreate
+
+# Columns of a contact in import and export files, in file order
+CONTACT_FIELDS = ["first_name", "last_name", "email", "phone_number", "birthday", "additional_data"]
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+EXPORT_FORMATS = ("csv", "ndjson", "vcard")
+
+# Media type and file extension of each export format
+EXPORT_MEDIA_TYPES = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "vcard": ("text/vcard", "vcf"),
+}
+
+
+def detect_format(filename: str | None, content_type: str | None) -> str | None:
+    """
+    Guess the import format of an uploaded file.
+
+    :param filename: The name of the uploaded file.
+    :type filename: str | None
+    :param content_type: The content type sent with the file.
+    :type content_type: str | None
+    :return: ``"csv"``, ``"ndjson"`` or None if the format is unknown.
+    :rtype: str | None
+    """
+    name = (filename or "").lower()
+    content_type = (content_type or "").lower()
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    return None
+
+
+def _iter_text_lines(raw, encoding: str = "utf-8-sig", chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """
+    Decode a binary file into lines without reading it all at once.
+
+    :param raw: The binary file object.
+    :param encoding: The text encoding of the file.
+    :type encoding: str
+    :param chunk_size: The number of bytes read at a time.
+    :type chunk_size: int
+    :return: An iterator of lines, line endings included.
+    :rtype: Iterator[str]
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    while True:
+        chunk = raw.read(chunk_size)
+        pending += decoder.decode(chunk, final=not chunk)
+        lines = pending.splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        yield from lines
+        if not chunk:
+            break
+    if pending:
+        yield pending
+
+
+def _iter_csv(raw) -> Iterator[tuple[int, dict | None, str | None]]:
+    """
+    Read CSV records keyed by the header row.
+
+    :param raw: The binary file object.
+    :return: An iterator of ``(row, record, error)`` tuples, row 1 being the first data row.
+    :rtype: Iterator[tuple[int, dict | None, str | None]]
+    """
+    reader = csv.DictReader(_iter_text_lines(raw))
+    for row, record in enumerate(reader, start=1):
+        if None in record:
+            yield row, None, "Too many columns"
+            continue
+        yield row, {key: (value if value != "" else None) for key, value in record.items()}, None
+
+
+def _iter_ndjson(raw) -> Iterator[tuple[int, dict | None, str | None]]:
+    """
+    Read one JSON object per line, skipping blank lines.
+
+    :param raw: The binary file object.
+    :return: An iterator of ``(row, record, error)`` tuples, row 1 being the first line.
+    :rtype: Iterator[tuple[int, dict | None, str | None]]
+    """
+    for row, line in enumerate(_iter_text_lines(raw), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield row, None, "Expected a JSON object"
+            continue
+        yield row, record, None
+
+
+READERS = {"csv": _iter_csv, "ndjson": _iter_ndjson}
+
+
+def _validation_message(error: ValidationError) -> str:
+    """
+    Flatten a pydantic validation error into one line.
+
+    :param error: The validation error.
+    :type error: ValidationError
+    :return: The ``field: message`` pairs joined by ``; ``.
+    :rtype: str
+    """
+    return "; ".join(f"{'.'.join(str(loc) for loc in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+def _iter_batches(raw, fmt: str, batch_size: int):
+    """
+    Group validated rows into batches.
+
+    :param raw: The binary file object.
+    :param fmt: The file format, one of :data:`IMPORT_FORMATS`.
+    :type fmt: str
+    :param batch_size: The number of rows per batch.
+    :type batch_size: int
+    :return: An iterator of ``(valid, invalid)`` pairs, where ``valid`` is a list of
+             ``(row, ContactCreate)`` and ``invalid`` a list of ``(row, error)``.
+    :rtype: Iterator[tuple[list, list]]
+    """
+    valid, invalid = [], []
+    for row, record, error in READERS[fmt](raw):
+        if error is None:
+            try:
+                valid.append((row, ContactCreate.model_validate(record)))
+            except ValidationError as e:
+                error = _validation_message(e)
+        if error is not None:
+            invalid.append((row, error))
+        if len(valid) + len(invalid) >= batch_size:
+            yield valid, invalid
+            valid, invalid = [], []
+    if valid or invalid:
+        yield valid, invalid
+
+
+async def read_contact_batches(raw, fmt: str, batch_size: int = 1000):
+    """
+    Read and validate an uploaded contacts file in batches.
+
+    Reading and validation run in the thread pool, one batch at a time, so only
+    one batch of rows is in memory and the event loop is never blocked by parsing.
+
+    :param raw: The binary file object, e.g. ``UploadFile.file``.
+    :param fmt: The file format, one of :data:`IMPORT_FORMATS`.
+    :type fmt: str
+    :param batch_size: The number of rows per batch.
+    :type batch_size: int
+    :return: An async iterator of ``(valid, invalid)`` pairs, see :func:`_iter_batches`.
+    :rtype: AsyncIterator[tuple[list, list]]
+    """
+    async for batch in iterate_in_threadpool(_iter_batches(raw, fmt, batch_size)):
+        yield batch
+
+
+def _contact_row(contact) -> list:
+    """
+    Return the exported values of a contact in :data:`CONTACT_FIELDS` order.
+
+    :param contact: The contact.
+    :type contact: ContactDB
+    :return: The field values, with the birthday as an ISO date.
+    :rtype: list
+    """
+    return [
+        contact.birthday.isoformat() if field == "birthday" and contact.birthday else getattr(contact, field)
+        for field in CONTACT_FIELDS
+    ]
+
+
+def _write_csv(contacts, first: bool) -> str:
+    """
+    Encode a batch of contacts as CSV, with the header before the first batch.
+
+    :param contacts: The contacts of the batch.
+    :type contacts: list[ContactDB]
+    :param first: Whether this is the first batch of the file.
+    :type first: bool
+    :return: The CSV text.
+    :rtype: str
+    """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if first:
+        writer.writerow(CONTACT_FIELDS)
+    writer.writerows(_contact_row(contact) for contact in contacts)
+    return out.getvalue()
+
+
+def _write_ndjson(contacts, first: bool) -> str:
+    """
+    Encode a batch of contacts as one JSON object per line.
+
+    :param contacts: The contacts of the batch.
+    :type contacts: list[ContactDB]
+    :param first: Whether this is the first batch of the file.
+    :type first: bool
+    :return: The NDJSON text.
+    :rtype: str
+    """
+    return "".join(
+        json.dumps(dict(zip(CONTACT_FIELDS, _contact_row(contact))), ensure_ascii=False) + "\n"
+        for contact in contacts
+    )
+
+
+def _vcard_escape(value) -> str:
+    """
+    Escape a vCard text value as described in RFC 6350.
+
+    :param value: The value, or None.
+    :return: The escaped text.
+    :rtype: str
+    """
+    if value is None:
+        return ""
+    return (str(value).replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _write_vcard(contacts, first: bool) -> str:
+    """
+    Encode a batch of contacts as vCard 3.0 entries.
+
+    :param contacts: The contacts of the batch.
+    :type contacts: list[ContactDB]
+    :param first: Whether this is the first batch of the file.
+    :type first: bool
+    :return: The vCard text.
+    :rtype: str
+    """
+    cards = []
+    for contact in contacts:
+        first_name, last_name = _vcard_escape(contact.first_name), _vcard_escape(contact.last_name)
+        lines = [
+            "BEGIN:VCARD",
+            "VERSION:3.0",
+            f"N:{last_name};{first_name};;;",
+            f"FN:{' '.join(name for name in (first_name, last_name) if name)}",
+        ]
+        if contact.email:
+            lines.append(f"EMAIL;TYPE=INTERNET:{_vcard_escape(contact.email)}")
+        if contact.phone_number:
+            lines.append(f"TEL:{_vcard_escape(contact.phone_number)}")
+        if contact.birthday:
+            lines.append(f"BDAY:{contact.birthday.isoformat()}")
+        if contact.additional_data:
+            lines.append(f"NOTE:{_vcard_escape(contact.additional_data)}")
+        lines.append("END:VCARD")
+        cards.append("\r\n".join(lines) + "\r\n")
+    return "".join(cards)
+
+
+WRITERS = {"csv": _write_csv, "ndjson": _write_ndjson, "vcard": _write_vcard}
+
+
+async def encode_contacts(batches, fmt: str, compress: bool = False):
+    """
+    Encode batches of contacts into an export file, chunk by chunk.
+
+    :param batches: An async iterator of contact lists, e.g. from
+                    :func:`src.repository.contacts.stream_contacts`.
+    :type batches: AsyncIterator[list[ContactDB]]
+    :param fmt: The export format, one of :data:`EXPORT_FORMATS`.
+    :type fmt: str
+    :param compress: Whether to gzip the output.
+    :type compress: bool
+    :return: An async iterator of encoded chunks.
+    :rtype: AsyncIterator[bytes]
+    """
+    write = WRITERS[fmt]
+    gzip = zlib.compressobj(wbits=31) if compress else None
+    first = True
+    async for contacts in batches:
+        chunk = write(contacts, first).encode()
+        first = False
+        if gzip is not None:
+            chunk = gzip.compress(chunk)
+        if chunk:
+            yield chunk
+    if first and fmt == "csv":
+        chunk = write([], first).encode()
+        yield gzip.compress(chunk) if gzip is not None else chunk
+    if gzip is not None:
+        yield gzip.flush()
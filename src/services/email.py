@@ -5,14 +5,23 @@ Email Service Module.
 
 This module contains the configuration for the email service and the function
 to send an email with a verification token.
+
+Emails are not sent from the web process: :func:`send_email` only adds the
+message to the Redis queue of :mod:`src.services.email_queue`, and the worker
+in :mod:`src.services.email_worker` delivers it.
 """
 
+import logging
 from pathlib import Path
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+from fastapi_mail import ConnectionConfig
 from pydantic import EmailStr
+from redis.exceptions import RedisError
 from src.auth.auth import auth_service
 from src.conf.config import settings
+from src.services.email_queue import EmailQueue, encode_message
+from src.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
 
 # Email service configuration
 conf = ConnectionConfig(
@@ -30,9 +39,23 @@ conf = ConnectionConfig(
 )
 
 
+def get_email_queue() -> EmailQueue | None:
+    """
+    Return the email queue on the shared Redis client.
+
+    :return: The queue, or None if Redis has been disabled.
+    :rtype: EmailQueue | None
+    """
+    client = get_redis()
+    if client is None:
+        return None
+    return EmailQueue(client, max_attempts=settings.email_max_attempts, retry_base=settings.email_retry_base,
+                      retry_max=settings.email_retry_max)
+
+
 async def send_email(email: EmailStr, username: str, host: str):
     """
-    Send an email with a verification token to the specified email address.
+    Queue an email with a verification token to the specified email address.
 
     :param email: The email address to send the verification token to.
     :type email: EmailStr
@@ -40,22 +63,14 @@ async def send_email(email: EmailStr, username: str, host: str):
     :type username: str
     :param host: The host URL for the application.
     :type host: str
-    :raises ConnectionErrors: If there is an error connecting to the email server.
     """
+    token_verification = await auth_service.create_email_token({"sub": email})
+    message = encode_message("email_template.html", email, "Confirm your email ",
+                             {"host": str(host), "username": username, "token": token_verification})
+    queue = get_email_queue()
     try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        # Initialize FastMail with the configuration
-        fm = FastMail(conf)
-        
-        # Send the email message using the defined template
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
-
+        if queue is None:
+            raise RedisError("Redis is disabled")
+        await queue.put(message)
+    except (RedisError, OSError) as err:
+        logger.error("Could not queue the confirmation email to %s: %s", email, err)
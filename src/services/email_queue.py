@@ -0,0 +1,198 @@
+#src.services.email_queue.py
+
+"""
+Email Queue Module.
+
+This module contains the persistent queue of outgoing emails, kept in Redis so
+the web process only has to record a message and return. Messages are sent by
+the worker in :mod:`src.services.email_worker`, running in its own process.
+
+A message is a small JSON document naming a template, its recipient and the
+template variables. The queue is reliable: a worker moves the messages it
+takes into its own processing list and removes them only once they are sent or
+rescheduled, so messages taken by a worker that crashes are picked up again
+when it restarts.
+
+Keys:
+
+- ``email:queue``: messages ready to be sent, oldest at the right.
+- ``email:processing:<worker>``: messages taken by a worker and not yet settled.
+- ``email:retry``: a sorted set of failed messages scored by the time of their next attempt.
+- ``email:dead``: messages that failed ``max_attempts`` times.
+"""
+
+import json
+import time
+
+QUEUE_KEY = "email:queue"
+RETRY_KEY = "email:retry"
+DEAD_KEY = "email:dead"
+
+# Moves up to ARGV[2] messages whose retry time ARGV[1] has come back to the queue.
+# KEYS: retry set, queue. Returns the number of messages moved.
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, message in ipairs(due) do
+    redis.call('ZREM', KEYS[1], message)
+    redis.call('LPUSH', KEYS[2], message)
+end
+return #due
+"""
+
+
+def processing_key(worker: str) -> str:
+    return f"email:processing:{worker}"
+
+
+def encode_message(template: str, to: str, subject: str, body: dict, attempts: int = 0) -> str:
+    """
+    Build a queued message.
+
+    :param template: The file name of the template in ``src/services/templates``.
+    :type template: str
+    :param to: The recipient.
+    :type to: str
+    :param subject: The subject line.
+    :type subject: str
+    :param body: The template variables.
+    :type body: dict
+    :param attempts: The number of failed delivery attempts so far.
+    :type attempts: int
+    :return: The message as JSON.
+    :rtype: str
+    """
+    return json.dumps({"template": template, "to": to, "subject": subject, "body": body, "attempts": attempts},
+                      separators=(",", ":"))
+
+
+class EmailQueue:
+    """
+    Queue operations on a Redis client.
+    """
+
+    def __init__(self, client, max_attempts: int, retry_base: float, retry_max: float):
+        """
+        :param client: The asyncio Redis client.
+        :type client: redis.asyncio.Redis
+        :param max_attempts: The number of attempts before a message is moved to the dead list.
+        :type max_attempts: int
+        :param retry_base: The delay before the first retry, in seconds; it doubles on every attempt.
+        :type retry_base: float
+        :param retry_max: The longest delay between two attempts, in seconds.
+        :type retry_max: float
+        """
+        self.client = client
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._promote = client.register_script(PROMOTE_SCRIPT)
+
+    async def put(self, message: str) -> None:
+        """
+        Add a message to the queue.
+
+        :param message: A message built by :func:`encode_message`.
+        :type message: str
+        """
+        await self.client.lpush(QUEUE_KEY, message)
+
+    async def take(self, worker: str, count: int, timeout: float) -> list[str]:
+        """
+        Move up to ``count`` messages into the processing list of ``worker``.
+
+        Waits up to ``timeout`` seconds for the first message, then takes whatever
+        else is ready without waiting.
+
+        :param worker: The name of the worker.
+        :type worker: str
+        :param count: The maximum number of messages.
+        :type count: int
+        :param timeout: The longest wait for the first message, in seconds.
+        :type timeout: float
+        :return: The messages taken, possibly none.
+        :rtype: list[str]
+        """
+        first = await self.client.blmove(QUEUE_KEY, processing_key(worker), timeout, "RIGHT", "LEFT")
+        if first is None:
+            return []
+        messages = [first]
+        while len(messages) < count:
+            message = await self.client.lmove(QUEUE_KEY, processing_key(worker), "RIGHT", "LEFT")
+            if message is None:
+                break
+            messages.append(message)
+        return [m.decode() if isinstance(m, bytes) else m for m in messages]
+
+    async def done(self, worker: str, message: str) -> None:
+        """
+        Remove a sent message from the processing list of ``worker``.
+        """
+        await self.client.lrem(processing_key(worker), 1, message)
+
+    def retry_delay(self, attempts: int) -> float:
+        """
+        The delay before the next attempt of a message that failed ``attempts`` times.
+        """
+        return min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+
+    async def failed(self, worker: str, message: str) -> bool:
+        """
+        Reschedule a message that could not be sent, or give up on it.
+
+        :param worker: The name of the worker.
+        :type worker: str
+        :param message: The message, as taken from the queue.
+        :type message: str
+        :return: True if the message will be retried, False if it was moved to the dead list.
+        :rtype: bool
+        """
+        data = json.loads(message)
+        data["attempts"] += 1
+        retried = data["attempts"] < self.max_attempts
+        async with self.client.pipeline(transaction=True) as pipe:
+            if retried:
+                pipe.zadd(RETRY_KEY, {json.dumps(data, separators=(",", ":")):
+                                      time.time() + self.retry_delay(data["attempts"])})
+            else:
+                pipe.lpush(DEAD_KEY, json.dumps(data, separators=(",", ":")))
+            pipe.lrem(processing_key(worker), 1, message)
+            await pipe.execute()
+        return retried
+
+    async def promote_due(self, limit: int = 1000) -> int:
+        """
+        Move the messages whose retry time has come back to the queue.
+
+        :param limit: The maximum number of messages moved.
+        :type limit: int
+        :return: The number of messages moved.
+        :rtype: int
+        """
+        return await self._promote(keys=[RETRY_KEY, QUEUE_KEY], args=[time.time(), limit])
+
+    async def recover(self, worker: str) -> int:
+        """
+        Put back the messages a previous run of ``worker`` took but never settled.
+
+        :param worker: The name of the worker.
+        :type worker: str
+        :return: The number of messages put back.
+        :rtype: int
+        """
+        moved = 0
+        while await self.client.lmove(processing_key(worker), QUEUE_KEY, "LEFT", "RIGHT") is not None:
+            moved += 1
+        return moved
+
+    async def size(self) -> dict:
+        """
+        Count the messages in each state.
+
+        :return: The number of ``queued``, ``retrying`` and ``dead`` messages.
+        :rtype: dict
+        """
+        return {
+            "queued": await self.client.llen(QUEUE_KEY),
+            "retrying": await self.client.zcard(RETRY_KEY),
+            "dead": await self.client.llen(DEAD_KEY),
+        }
@@ -0,0 +1,238 @@
+#src.services.email_worker.py
+
+"""
+Email Worker Module.
+
+This module contains the worker that delivers the emails queued by
+:mod:`src.services.email`. It runs outside the web processes::
+
+    python -m src.services.email_worker --name worker-1
+
+The worker keeps one SMTP connection open between messages and sends queued
+messages in batches over it, reconnecting only when the server drops the
+connection. A message that cannot be sent is retried with exponential backoff
+and moved to the dead list after ``email_max_attempts`` attempts. While Redis is
+unavailable the worker keeps retrying, with exponential backoff.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import socket
+from email.message import EmailMessage
+from email.utils import formataddr
+from pathlib import Path
+
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.email import conf
+from src.services.email_queue import EmailQueue
+from src.services.redis_client import get_blocking_redis
+
+logger = logging.getLogger(__name__)
+
+templates = Environment(loader=FileSystemLoader(Path(__file__).parent / "templates"),
+                        autoescape=select_autoescape(["html"]))
+
+
+def build_message(message: dict, sender: str) -> EmailMessage:
+    """
+    Render a queued message into an email.
+
+    :param message: The decoded queued message.
+    :type message: dict
+    :param sender: The ``From`` header.
+    :type sender: str
+    :return: The email.
+    :rtype: EmailMessage
+    """
+    email = EmailMessage()
+    email["From"] = sender
+    email["To"] = message["to"]
+    email["Subject"] = message["subject"]
+    email.set_content(templates.get_template(message["template"]).render(**message["body"]), subtype="html")
+    return email
+
+
+class EmailWorker:
+    """
+    Sends queued emails over a persistent SMTP connection.
+    """
+
+    def __init__(self, queue: EmailQueue, name: str, hostname: str, port: int, sender: str,
+                 username: str | None = None, password: str | None = None, use_tls: bool = False,
+                 start_tls: bool = False, batch_size: int = 50, timeout: float = 30):
+        """
+        :param queue: The email queue.
+        :type queue: EmailQueue
+        :param name: The worker name; a restarted worker recovers the messages of its previous run.
+        :type name: str
+        :param hostname: The SMTP server.
+        :type hostname: str
+        :param port: The SMTP port.
+        :type port: int
+        :param sender: The ``From`` header.
+        :type sender: str
+        :param username: The SMTP user, or None to send without logging in.
+        :type username: str | None
+        :param password: The SMTP password.
+        :type password: str | None
+        :param use_tls: Whether to connect with implicit TLS.
+        :type use_tls: bool
+        :param start_tls: Whether to upgrade the connection with STARTTLS.
+        :type start_tls: bool
+        :param batch_size: The maximum number of messages taken from the queue at once.
+        :type batch_size: int
+        :param timeout: The SMTP timeout, in seconds.
+        :type timeout: float
+        """
+        self.queue = queue
+        self.name = name
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.batch_size = batch_size
+        self.smtp = aiosmtplib.SMTP(hostname=hostname, port=port, use_tls=use_tls, start_tls=start_tls,
+                                    timeout=timeout)
+        self.sent = 0
+        self.failed = 0
+        self.connections = 0
+
+    async def connect(self):
+        """
+        Open the SMTP connection unless it is already open.
+        """
+        if self.smtp.is_connected:
+            return
+        await self.smtp.connect()
+        if self.username:
+            await self.smtp.login(self.username, self.password)
+        self.connections += 1
+
+    async def close(self):
+        """
+        Close the SMTP connection.
+        """
+        if self.smtp.is_connected:
+            try:
+                await self.smtp.quit()
+            except aiosmtplib.SMTPException:
+                self.smtp.close()
+
+    async def send_batch(self, messages: list[str]):
+        """
+        Send a batch of queued messages, settling each one in the queue.
+
+        :param messages: The messages taken from the queue.
+        :type messages: list[str]
+        """
+        for raw in messages:
+            try:
+                await self.connect()
+                await self.smtp.send_message(build_message(json.loads(raw), self.sender))
+            except (aiosmtplib.SMTPException, OSError) as e:
+                self.failed += 1
+                retried = await self.queue.failed(self.name, raw)
+                logger.warning("Email to %s failed (%s), %s", json.loads(raw)["to"], e,
+                               "will retry" if retried else "giving up")
+                if isinstance(e, (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, OSError)):
+                    self.smtp.close()
+                continue
+            await self.queue.done(self.name, raw)
+            self.sent += 1
+
+    async def run_once(self, timeout: float = 1.0) -> int:
+        """
+        Promote due retries, then send one batch.
+
+        :param timeout: The longest wait for a message, in seconds.
+        :type timeout: float
+        :return: The number of messages taken.
+        :rtype: int
+        """
+        await self.queue.promote_due()
+        messages = await self.queue.take(self.name, self.batch_size, timeout)
+        if messages:
+            await self.send_batch(messages)
+        return len(messages)
+
+    async def run(self, idle_timeout: float = 60, retry_delay: float = 1.0, max_retry_delay: float = 30.0):
+        """
+        Deliver messages until cancelled, backing off while Redis is unavailable.
+
+        :param idle_timeout: How long the SMTP connection may stay idle before it is closed, in seconds.
+        :type idle_timeout: float
+        :param retry_delay: The wait after the first Redis error, in seconds; it doubles on every error in a row.
+        :type retry_delay: float
+        :param max_retry_delay: The longest wait between two attempts to reach Redis, in seconds.
+        :type max_retry_delay: float
+        """
+        recovered = None
+        idle = 0.0
+        delay = retry_delay
+        try:
+            while True:
+                if asyncio.current_task().cancelling():
+                    # A cancelled blocking Redis call can return as if its wait timed out
+                    raise asyncio.CancelledError()
+                try:
+                    if recovered is None:
+                        recovered = await self.queue.recover(self.name)
+                        if recovered:
+                            logger.info("Recovered %s unsettled emails", recovered)
+                    # An empty run_once waits about one second for a message
+                    taken = await self.run_once(timeout=1.0)
+                except (RedisError, OSError) as e:
+                    if asyncio.current_task().cancelling():
+                        # Or turn the cancellation into a timeout
+                        raise asyncio.CancelledError() from e
+                    logger.warning("Email queue unavailable (%s), retrying in %.1f s", e, delay)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, max_retry_delay)
+                    continue
+                delay = retry_delay
+                if taken:
+                    idle = 0.0
+                else:
+                    idle += 1.0
+                    if idle >= idle_timeout:
+                        await self.close()
+        finally:
+            await self.close()
+
+
+def create_worker(name: str) -> EmailWorker:
+    """
+    Build a worker from the settings.
+
+    :param name: The worker name.
+    :type name: str
+    :return: The worker.
+    :rtype: EmailWorker
+    """
+    # BLMOVE blocks longer than the socket timeout of the shared client
+    queue = EmailQueue(get_blocking_redis(), max_attempts=settings.email_max_attempts,
+                       retry_base=settings.email_retry_base, retry_max=settings.email_retry_max)
+    return EmailWorker(queue, name, hostname=conf.MAIL_SERVER, port=conf.MAIL_PORT,
+                       sender=formataddr((conf.MAIL_FROM_NAME, conf.MAIL_FROM)),
+                       username=conf.MAIL_USERNAME if conf.USE_CREDENTIALS else None,
+                       password=conf.MAIL_PASSWORD,
+                       use_tls=conf.MAIL_SSL_TLS, start_tls=conf.MAIL_STARTTLS,
+                       batch_size=settings.email_batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver queued emails.")
+    parser.add_argument("--name", default=socket.gethostname(),
+                        help="Worker name; reuse it across restarts to recover unsent messages")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(create_worker(args.name).run())
+
+
+if __name__ == "__main__":
+    main()
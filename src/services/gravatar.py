@@ -0,0 +1,162 @@
+#src.services.gravatar.py
+
+"""
+Gravatar Service Module.
+
+This module fills in the default avatar of users from Gravatar, outside the
+signup transaction. After a user is committed, :func:`assign_gravatar` runs as
+a background task: it resolves the Gravatar URL of the email and stores it
+unless the user already has an avatar.
+
+With the ``gravatar_verify`` setting, resolution asks Gravatar whether the email
+has an image at all, and users without one keep no avatar. Results are cached
+in process by email hash, including negative ones.
+
+Users created before this module, or whose resolution failed, can be filled in
+with the backfill command::
+
+    python -m src.services.gravatar --batch-size 500 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import httpx
+from libgravatar import Gravatar
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.conf.config import settings
+from src.db.database import SessionLocal
+from src.models.models import UserDB
+from src.repository import user as repository_users
+from src.services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Resolved avatar URL (or None) keyed by Gravatar email hash
+cache = TTLCache(maxsize=settings.gravatar_cache_size, ttl=settings.gravatar_cache_ttl)
+
+_MISSING = object()
+
+
+async def resolve_gravatar(email: str, client: httpx.AsyncClient | None = None) -> str | None:
+    """
+    Return the Gravatar URL of an email.
+
+    :param email: The email.
+    :type email: str
+    :param client: The HTTP client used to verify that the image exists, if enabled.
+    :type client: httpx.AsyncClient | None
+    :return: The avatar URL, or None if verification is enabled and the email has no Gravatar.
+    :rtype: str | None
+    :raises httpx.HTTPError: If verification is enabled and Gravatar cannot be reached.
+    """
+    gravatar = Gravatar(email)
+    url = cache.get(gravatar.email_hash, _MISSING)
+    if url is not _MISSING:
+        return url
+    url = gravatar.get_image(default=settings.gravatar_default)
+    if settings.gravatar_verify:
+        async with _client(client) as http:
+            response = await http.head(gravatar.get_image(default="404"))
+        if response.status_code == 404:
+            url = None
+        else:
+            response.raise_for_status()
+    cache.set(gravatar.email_hash, url)
+    return url
+
+
+@asynccontextmanager
+async def _client(client: httpx.AsyncClient | None):
+    """Use the given HTTP client, or a short-lived one."""
+    if client is not None:
+        yield client
+        return
+    async with httpx.AsyncClient(timeout=settings.gravatar_timeout) as owned:
+        yield owned
+
+
+async def assign_gravatar(email: str):
+    """
+    Resolve and store the Gravatar of a newly created user.
+
+    Meant to run as a background task after the user is committed; failures are
+    logged and left for the backfill command.
+
+    :param email: The email of the user.
+    :type email: str
+    """
+    try:
+        url = await resolve_gravatar(email)
+    except httpx.HTTPError as e:
+        logger.warning("Could not resolve the Gravatar of %s: %s", email, e)
+        return
+    if url is None:
+        return
+    try:
+        async with SessionLocal() as db:
+            await repository_users.set_default_avatar(email, url, db)
+    except (SQLAlchemyError, OSError) as e:
+        logger.warning("Could not store the Gravatar of %s: %s", email, e)
+
+
+async def backfill(batch_size: int = 500, concurrency: int = 20, session_factory=None,
+                   client: httpx.AsyncClient | None = None) -> int:
+    """
+    Fill in the Gravatar of every user without an avatar.
+
+    Users are read in batches by id; the Gravatars of a batch are resolved
+    concurrently and stored with one commit per batch.
+
+    :param batch_size: The number of users per batch.
+    :type batch_size: int
+    :param concurrency: The maximum number of Gravatar requests in flight.
+    :type concurrency: int
+    :param session_factory: Creates the database session, by default :data:`SessionLocal`.
+    :param client: The HTTP client used for verification.
+    :type client: httpx.AsyncClient | None
+    :return: The number of users updated.
+    :rtype: int
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(email):
+        async with semaphore:
+            try:
+                return await resolve_gravatar(email, http)
+            except httpx.HTTPError as e:
+                logger.warning("Could not resolve the Gravatar of %s: %s", email, e)
+                return None
+
+    updated, after_id = 0, 0
+    async with _client(client) as http, (session_factory or SessionLocal)() as db:
+        while True:
+            users = (await db.execute(
+                select(UserDB.id, UserDB.email)
+                .filter(UserDB.avatar.is_(None), UserDB.id > after_id)
+                .order_by(UserDB.id).limit(batch_size)
+            )).all()
+            if not users:
+                return updated
+            after_id = users[-1].id
+            urls = await asyncio.gather(*(resolve(user.email) for user in users))
+            avatars = {user.email: url for user, url in zip(users, urls) if url is not None}
+            updated += await repository_users.set_default_avatars(avatars, db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill in the Gravatar of users without an avatar.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    updated = asyncio.run(backfill(args.batch_size, args.concurrency))
+    logger.info("Updated %s users", updated)
+
+
+if __name__ == "__main__":
+    main()
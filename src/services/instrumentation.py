@@ -0,0 +1,301 @@
+#src.services.instrumentation.py
+
+"""
+Request Instrumentation Module.
+
+This module contains :class:`InstrumentationMiddleware`, which records, for
+every route, the latency and status of the requests it serves, the requests in
+flight, and how many Redis calls and SQL statements each request made.
+
+Routes are identified by their path template (``/contacts/contacts/{contact_id}``),
+never by the requested path, so the number of series stays bounded. Requests no
+route matched, including static files, are recorded under ``<other>``.
+
+Redis calls and SQL statements are attributed to the request being served
+through a context variable: the Redis client (see
+:func:`src.services.redis_client.instrument`) and the database metrics (see
+:class:`src.db.metrics.DatabaseMetrics`) call :func:`count_redis_call`,
+:func:`count_db_statement` and :func:`add_db_time`, which do nothing outside a
+request.
+
+With ``debug_queries`` on, every response also tells how many statements its
+request ran and how long they took, in an ``X-DB-Queries`` and a
+``Server-Timing`` header, and every request is logged with the same figures on
+the ``src.db.queries`` logger. Statements running after the response has
+started, as in streamed responses, only appear in the log. A statement shape
+(the SQL text, with the placeholders of an ``IN`` list collapsed) running more
+than ``n_plus_one_threshold`` times in one request is logged as a likely N+1
+query, typically a lazy load in a loop, and counted per route.
+"""
+
+import logging
+import re
+import time
+from contextvars import ContextVar
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.services.metrics import COUNT_BUCKETS, Histogram, PrometheusText
+
+logger = logging.getLogger("src.db.queries")
+
+OTHER_ROUTE = "<other>"
+
+# A parenthesized list of placeholders, as expanded for IN clauses
+PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%s|\$\d+|:\w+))+\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Reduce a statement to its shape, the same for every run of the same query.
+
+    :param statement: The SQL text, with bound parameters as placeholders.
+    :type statement: str
+    :return: The text with placeholder lists collapsed and whitespace normalized.
+    :rtype: str
+    """
+    return " ".join(PLACEHOLDER_LIST.sub("(?)", statement).split())
+
+
+class RequestStats:
+    """
+    What a request has done so far.
+    """
+
+    def __init__(self, track_statements: bool = False):
+        """
+        :param track_statements: Whether to count the runs of each statement.
+        :type track_statements: bool
+        """
+        self.redis_calls = 0
+        self.db_statements = 0
+        self.db_time = 0.0
+        self.statements = {} if track_statements else None
+
+    def repeated_statements(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        List the statement shapes run more than ``threshold`` times.
+
+        :param threshold: The most runs of a shape not flagged.
+        :type threshold: int
+        :return: The shapes and their number of runs, most run first.
+        :rtype: list[tuple[str, int]]
+        """
+        shapes = {}
+        for statement, count in (self.statements or {}).items():
+            shape = statement_shape(statement)
+            shapes[shape] = shapes.get(shape, 0) + count
+        return sorted(((shape, count) for shape, count in shapes.items() if count > threshold),
+                      key=lambda item: -item[1])
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def count_redis_call():
+    """
+    Count a Redis command or pipeline towards the current request.
+    """
+    stats = current_request.get()
+    if stats is not None:
+        stats.redis_calls += 1
+
+
+def count_db_statement(statement: str):
+    """
+    Count an SQL statement towards the current request.
+
+    :param statement: The SQL text, with bound parameters as placeholders.
+    :type statement: str
+    """
+    stats = current_request.get()
+    if stats is not None:
+        stats.db_statements += 1
+        if stats.statements is not None:
+            stats.statements[statement] = stats.statements.get(statement, 0) + 1
+
+
+def add_db_time(seconds: float):
+    """
+    Add the execution time of an SQL statement to the current request.
+
+    :param seconds: The execution time.
+    :type seconds: float
+    """
+    stats = current_request.get()
+    if stats is not None:
+        stats.db_time += seconds
+
+
+class HTTPMetrics:
+    """
+    Latency, status and resource usage of the requests, per route.
+    """
+
+    def __init__(self):
+        self.duration = {}
+        self.responses = {}
+        self.redis_calls = {}
+        self.db_statements = {}
+        self.in_flight = {}
+        self.n_plus_one = {}
+
+    def started(self, method: str):
+        """
+        Count a request in flight.
+
+        :param method: The request method.
+        :type method: str
+        """
+        self.in_flight[method] = self.in_flight.get(method, 0) + 1
+
+    def finished(self, method: str, route: str, status_code: int, seconds: float, redis_calls: int,
+                 db_statements: int):
+        """
+        Record a served request.
+
+        :param method: The request method.
+        :type method: str
+        :param route: The path template of the route.
+        :type route: str
+        :param status_code: The response status.
+        :type status_code: int
+        :param seconds: The time taken to send the response.
+        :type seconds: float
+        :param redis_calls: The Redis calls made by the request.
+        :type redis_calls: int
+        :param db_statements: The SQL statements run by the request.
+        :type db_statements: int
+        """
+        self.in_flight[method] -= 1
+        key = (method, route)
+        if key not in self.duration:
+            self.duration[key] = Histogram()
+            self.redis_calls[key] = Histogram(COUNT_BUCKETS)
+            self.db_statements[key] = Histogram(COUNT_BUCKETS)
+        self.duration[key].observe(seconds)
+        self.redis_calls[key].observe(redis_calls)
+        self.db_statements[key].observe(db_statements)
+        self.responses[key + (status_code,)] = self.responses.get(key + (status_code,), 0) + 1
+
+    def flagged_n_plus_one(self, method: str, route: str):
+        """
+        Count a request flagged as a likely N+1 query.
+
+        :param method: The request method.
+        :type method: str
+        :param route: The path template of the route.
+        :type route: str
+        """
+        self.n_plus_one[(method, route)] = self.n_plus_one.get((method, route), 0) + 1
+
+    def export(self, page: PrometheusText):
+        """
+        Add the request metrics to a metrics page.
+
+        :param page: The page.
+        :type page: PrometheusText
+        """
+        for method, count in self.in_flight.items():
+            page.gauge("http_requests_in_flight", "Requests being served.", count, method=method)
+        for (method, route, status_code), count in self.responses.items():
+            page.counter("http_requests_total", "Requests served, by route and status.", count,
+                         method=method, route=route, status=status_code)
+        for (method, route), histogram in self.duration.items():
+            page.histogram("http_request_duration_seconds", "Time to send the response, by route.", histogram,
+                           method=method, route=route)
+        for (method, route), histogram in self.redis_calls.items():
+            page.histogram("http_request_redis_calls", "Redis commands and pipelines per request, by route.",
+                           histogram, method=method, route=route)
+        for (method, route), histogram in self.db_statements.items():
+            page.histogram("http_request_db_statements", "SQL statements per request, by route.", histogram,
+                           method=method, route=route)
+        for (method, route), count in self.n_plus_one.items():
+            page.counter("http_requests_n_plus_one_total", "Requests repeating a statement, likely N+1 queries.",
+                         count, method=method, route=route)
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI middleware recording every HTTP request in :class:`HTTPMetrics`.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: HTTPMetrics, debug_queries: bool = False,
+                 n_plus_one_threshold: int = 5):
+        """
+        :param app: The application.
+        :type app: ASGIApp
+        :param metrics: Where the requests are recorded.
+        :type metrics: HTTPMetrics
+        :param debug_queries: Whether to report the statements of each request in headers and logs.
+        :type debug_queries: bool
+        :param n_plus_one_threshold: The most runs of a statement in one request not flagged as N+1.
+        :type n_plus_one_threshold: int
+        """
+        self.app = app
+        self.metrics = metrics
+        self.debug_queries = debug_queries
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats(track_statements=self.debug_queries)
+        token = current_request.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+        sent = None
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, sent
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.debug_queries:
+                    headers = MutableHeaders(scope=message)
+                    headers["X-DB-Queries"] = str(stats.db_statements)
+                    headers.append("Server-Timing",
+                                   f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_statements} queries"')
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Background tasks still to run are not part of the response
+                sent = (time.perf_counter(), stats.redis_calls, stats.db_statements)
+
+        self.metrics.started(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end, redis_calls, db_statements = sent or (time.perf_counter(), stats.redis_calls, stats.db_statements)
+            route = getattr(scope.get("route"), "path", OTHER_ROUTE)
+            self.metrics.finished(method, route, status_code, end - start, redis_calls, db_statements)
+            current_request.reset(token)
+            if self.debug_queries:
+                self.report_queries(method, route, status_code, stats)
+
+    def report_queries(self, method: str, route: str, status_code: int, stats: RequestStats):
+        """
+        Log the statements of a request, and flag the likely N+1 queries.
+
+        :param method: The request method.
+        :type method: str
+        :param route: The path template of the route.
+        :type route: str
+        :param status_code: The response status.
+        :type status_code: int
+        :param stats: What the request has done.
+        :type stats: RequestStats
+        """
+        logger.info("%s %s %s: %d queries in %.1f ms", method, route, status_code, stats.db_statements,
+                    stats.db_time * 1000)
+        repeated = stats.repeated_statements(self.n_plus_one_threshold)
+        if repeated:
+            self.metrics.flagged_n_plus_one(method, route)
+        for shape, count in repeated:
+            logger.warning("Likely N+1 query in %s %s, run %d times: %s", method, route, count, shape)
+
+
+# Request metrics of the application
+http_metrics = HTTPMetrics()
@@ -0,0 +1,186 @@
+#src.services.metrics.py
+
+"""
+Metrics Module.
+
+This module contains the small in-process metric types the application is
+instrumented with. They are updated from the event loop on hot paths, so they
+only keep counts: no locking, no per-observation storage. :class:`PrometheusText`
+renders them for a Prometheus scraper.
+"""
+
+import bisect
+import math
+
+# Upper bounds of the default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        :param buckets: The increasing upper bounds of the buckets; a last ``+Inf`` bucket is implied.
+        :type buckets: tuple[float, ...]
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """
+        Record a value.
+
+        :param value: The value.
+        :type value: float
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile as the upper bound of the bucket it falls in.
+
+        :param q: The quantile, between 0 and 1.
+        :type q: float
+        :return: The estimate, capped by the largest observed value; 0 without observations.
+        :rtype: float
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        """
+        Summarize the histogram.
+
+        :return: The count, sum, mean, maximum and estimated 50th, 95th and 99th percentiles.
+        :rtype: dict
+        """
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+    def reset(self):
+        """
+        Forget all observations.
+        """
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+# Upper bounds of the buckets of per-request call counts
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class PrometheusText:
+    """
+    Metrics page in the Prometheus text exposition format.
+
+    Samples may be added in any order: they are grouped by metric when the page
+    is rendered, each metric under its ``HELP`` and ``TYPE`` lines.
+    """
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.families = {}
+
+    def _family(self, name: str, kind: str, help: str) -> list:
+        if name not in self.families:
+            self.families[name] = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        return self.families[name]
+
+    def counter(self, name: str, help: str, value: float, **labels):
+        """
+        Add a sample of a counter.
+
+        :param name: The metric name, ending with ``_total``.
+        :type name: str
+        :param help: The description of the metric.
+        :type help: str
+        :param value: The count.
+        :type value: float
+        :param labels: The labels of the sample.
+        """
+        self._family(name, "counter", help).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def gauge(self, name: str, help: str, value: float, **labels):
+        """
+        Add a sample of a gauge.
+
+        :param name: The metric name.
+        :type name: str
+        :param help: The description of the metric.
+        :type help: str
+        :param value: The current value.
+        :type value: float
+        :param labels: The labels of the sample.
+        """
+        self._family(name, "gauge", help).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def histogram(self, name: str, help: str, histogram: Histogram, **labels):
+        """
+        Add the cumulative buckets, sum and count of a histogram.
+
+        :param name: The metric name.
+        :type name: str
+        :param help: The description of the metric.
+        :type help: str
+        :param histogram: The histogram.
+        :type histogram: Histogram
+        :param labels: The labels of the histogram.
+        """
+        lines = self._family(name, "histogram", help)
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (math.inf,), histogram.counts):
+            cumulative += count
+            bucket_labels = _format_labels({**labels, "le": _format_value(float(bound))})
+            lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+    def render(self) -> str:
+        """
+        Render the page.
+
+        :return: The metrics, one sample per line.
+        :rtype: str
+        """
+        return "".join(line + "\n" for lines in self.families.values() for line in lines)
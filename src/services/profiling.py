@@ -0,0 +1,283 @@
+#src.services.profiling.py
+
+"""
+Request Profiling Module.
+
+This module contains :class:`ProfilerMiddleware`, which profiles single
+requests in place, with a sampling profiler cheap enough to run in production.
+A request is profiled when it carries the admin profiling token in an
+``X-Profile`` header, or at random at the rate of ``sample_rate``; other
+requests only pay for that check.
+
+While a profiled request is in flight, a background thread of
+:class:`StackSampler` looks at the stack of the event loop thread every
+``interval`` seconds. A sample is kept when the request's task is the one
+running: time the request spends awaiting, and the other requests served
+concurrently, do not show up in its profile. The event loop frames below the
+task are left out.
+
+Each profile is saved to ``directory`` as collapsed stacks, one line per
+distinct stack with its number of samples (``outer;...;inner count``), the
+input of ``flamegraph.pl`` which https://www.speedscope.app also opens. The
+oldest profiles are deleted beyond ``max_files`` files or ``max_age`` seconds.
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+
+# Suffix of the profile files, also used to recognize them when pruning
+PROFILE_SUFFIX = ".collapsed.txt"
+
+# Where the frames of a task start: the event loop runs tasks from this file
+_EVENTS_FILE = os.path.join("asyncio", "events.py")
+
+
+def frame_label(code) -> str:
+    """
+    Name a frame of a collapsed stack.
+
+    :param code: The code object of the frame.
+    :type code: types.CodeType
+    :return: The function name and where it is defined.
+    :rtype: str
+    """
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collapse_stack(frame) -> str:
+    """
+    Collapse a stack into one line, outermost frame first.
+
+    :param frame: The innermost frame.
+    :type frame: types.FrameType
+    :return: The labels of the frames above the event loop, joined with ``;``.
+    :rtype: str
+    """
+    labels = []
+    while frame is not None and not frame.f_code.co_filename.endswith(_EVENTS_FILE):
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Profile:
+    """
+    The samples of one profiled request.
+    """
+
+    def __init__(self, thread_id: int, loop: asyncio.AbstractEventLoop, task: asyncio.Task):
+        """
+        :param thread_id: The thread running the event loop.
+        :type thread_id: int
+        :param loop: The event loop.
+        :type loop: asyncio.AbstractEventLoop
+        :param task: The task serving the request.
+        :type task: asyncio.Task
+        """
+        self.thread_id = thread_id
+        self.loop = loop
+        self.task = task
+        self.stacks = {}
+        self.samples = 0
+
+    def collapsed(self) -> str:
+        """
+        Render the samples as collapsed stacks.
+
+        :return: One line per distinct stack, most sampled first.
+        :rtype: str
+        """
+        lines = sorted(self.stacks.items(), key=lambda item: -item[1])
+        return "".join(f"{stack} {count}\n" for stack, count in lines)
+
+
+class StackSampler:
+    """
+    Background thread sampling the stacks of the profiled requests.
+
+    The thread only runs while at least one profile is active.
+    """
+
+    def __init__(self, interval: float):
+        """
+        :param interval: The time between two samples, in seconds.
+        :type interval: float
+        """
+        self.interval = interval
+        self.profiles = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, profile: Profile):
+        """
+        Start sampling for a profile.
+
+        :param profile: The profile.
+        :type profile: Profile
+        """
+        with self._lock:
+            self.profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self, profile: Profile):
+        """
+        Stop sampling for a profile.
+
+        :param profile: The profile.
+        :type profile: Profile
+        """
+        with self._lock:
+            self.profiles.discard(profile)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self.profiles:
+                    self._thread = None
+                    return
+                profiles = list(self.profiles)
+            self.sample(profiles)
+            time.sleep(self.interval)
+
+    @staticmethod
+    def sample(profiles: list[Profile]):
+        """
+        Take one sample for each profile whose task is running.
+
+        :param profiles: The active profiles.
+        :type profiles: list[Profile]
+        """
+        frames = sys._current_frames()
+        for profile in profiles:
+            frame = frames.get(profile.thread_id)
+            if frame is None or asyncio.current_task(profile.loop) is not profile.task:
+                continue
+            stack = collapse_stack(frame)
+            profile.stacks[stack] = profile.stacks.get(stack, 0) + 1
+            profile.samples += 1
+
+
+class ProfilerMiddleware:
+    """
+    ASGI middleware profiling the requests chosen by header or at random.
+    """
+
+    def __init__(self, app: ASGIApp, directory: str, token: str = "", sample_rate: float = 0.0,
+                 interval: float = 0.005, max_files: int = 200, max_age: float = 7 * 24 * 3600):
+        """
+        :param app: The application.
+        :type app: ASGIApp
+        :param directory: Where the profiles are saved.
+        :type directory: str
+        :param token: The admin token profiling a request sent in the ``X-Profile`` header; empty to disable.
+        :type token: str
+        :param sample_rate: The share of requests profiled at random.
+        :type sample_rate: float
+        :param interval: The time between two samples, in seconds.
+        :type interval: float
+        :param max_files: The most profiles kept.
+        :type max_files: int
+        :param max_age: How long profiles are kept, in seconds.
+        :type max_age: float
+        """
+        self.app = app
+        self.directory = directory
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+        self.sampler = StackSampler(interval)
+        self.max_files = max_files
+        self.max_age = max_age
+
+    def requested(self, scope: Scope) -> bool:
+        """
+        Tell whether a request asks to be profiled with the admin token.
+
+        :param scope: The request scope.
+        :type scope: Scope
+        :return: True if the ``X-Profile`` header holds the token.
+        :rtype: bool
+        """
+        if not self.token:
+            return False
+        value = Headers(scope=scope).get(PROFILE_HEADER)
+        return value is not None and hmac.compare_digest(value.encode(), self.token)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = self.requested(scope)
+        if not requested and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        started = datetime.now()
+        name = f"{started:%Y%m%dT%H%M%S%f}-{scope['method']}-{os.getpid()}"
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start" and requested:
+                MutableHeaders(scope=message)["X-Profile-Id"] = name
+            await send(message)
+
+        profile = Profile(threading.get_ident(), asyncio.get_running_loop(), asyncio.current_task())
+        self.sampler.start(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.sampler.stop(profile)
+            elapsed = time.perf_counter() - start
+            try:
+                await run_in_threadpool(self.save, name, profile.collapsed())
+            except OSError as e:
+                logger.warning("Could not save the profile %s: %s", name, e)
+            else:
+                logger.info("Profiled %s %s in %.1f ms, %d samples: %s", scope["method"],
+                            getattr(scope.get("route"), "path", scope["path"]), elapsed * 1000, profile.samples,
+                            name)
+
+    def save(self, name: str, content: str):
+        """
+        Save a profile, then delete the profiles beyond the retention limits.
+
+        :param name: The name of the profile.
+        :type name: str
+        :param content: The collapsed stacks.
+        :type content: str
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name + PROFILE_SUFFIX), "w") as file:
+            file.write(content)
+        self.prune()
+
+    def prune(self):
+        """
+        Delete the profiles older than ``max_age`` and the oldest beyond ``max_files``.
+        """
+        paths = [entry.path for entry in os.scandir(self.directory)
+                 if entry.is_file() and entry.name.endswith(PROFILE_SUFFIX)]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        expired = time.time() - self.max_age
+        for i, path in enumerate(paths):
+            if i >= self.max_files or os.path.getmtime(path) < expired:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,264 @@
+#src.services.rate_limit.py
+
+"""
+Rate Limiting Service Module.
+
+This module contains the ``RateLimiter`` dependency used by the routes. Limits
+are token buckets shared by every application process through Redis, but a
+process does not ask Redis for every request: it reserves a batch of tokens
+with one Lua script call and spends them locally until the batch is used up or
+its lease runs out. Unused reserved tokens are simply lost when the lease
+ends, so the shared limit is never exceeded.
+
+Requests are counted per user (the ``sub`` of the bearer token) and per route;
+anonymous requests are counted per client IP. The ``X-Forwarded-For`` header is
+only read when the request comes from one of the ``trusted_proxies``, and then
+the client is the last address before the trusted hops.
+
+When Redis is unavailable the limiter either degrades open, enforcing the limit
+within each process only, or degrades closed, rejecting requests with ``503``,
+depending on the ``rate_limit_fail_open`` setting.
+
+The ``rate_limit_enabled`` setting turns every limit off, for load tests.
+"""
+
+import ipaddress
+import logging
+import math
+import time
+from functools import lru_cache
+
+from fastapi import HTTPException, Request
+from jose import JWTError
+from redis.exceptions import RedisError
+from starlette import status
+
+from src.auth.auth import auth_service
+from src.conf.config import settings
+from src.services.cache import TTLCache
+from src.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Takes up to ARGV[3] tokens from a bucket of ARGV[1] tokens refilled over ARGV[2] ms.
+# KEYS: bucket. Returns the number of tokens granted and, if none, the ms until one is available.
+RESERVE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * capacity / period)
+local granted = math.min(wanted, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], period)
+if granted > 0 then
+    return {granted, 0}
+end
+return {0, math.ceil((1 - tokens) * period / capacity)}
+"""
+
+
+class TokenBuckets:
+    """
+    The tokens each process has reserved from the shared buckets.
+    """
+
+    def __init__(self, batch_fraction: float, lease: float, maxsize: int, fail_open: bool):
+        """
+        :param batch_fraction: The share of a limit reserved from Redis at a time.
+        :type batch_fraction: float
+        :param lease: The longest time reserved tokens may be spent locally, in seconds.
+        :type lease: float
+        :param maxsize: The maximum number of local buckets.
+        :type maxsize: int
+        :param fail_open: Whether to keep serving, limited per process, when Redis is unavailable.
+        :type fail_open: bool
+        """
+        self.batch_fraction = batch_fraction
+        self.lease = lease
+        self.fail_open = fail_open
+        self.local = TTLCache(maxsize=maxsize, ttl=lease)
+        self.reservations = 0
+        self.rejected = 0
+        self.degraded = 0
+        self._script = None
+
+    def batch_size(self, times: int) -> int:
+        return max(1, int(times * self.batch_fraction))
+
+    async def acquire(self, key: str, times: int, seconds: int) -> float:
+        """
+        Take one token for ``key``.
+
+        :param key: The bucket key.
+        :type key: str
+        :param times: The bucket capacity.
+        :type times: int
+        :param seconds: The time the bucket takes to refill completely.
+        :type seconds: int
+        :return: 0 if a token was taken, otherwise the seconds until one is available.
+        :rtype: float
+        :raises HTTPException: If Redis is unavailable and the limiter degrades closed.
+        """
+        lease = self.local.get(key)
+        if lease is not None:
+            tokens, local_until = lease
+            if tokens > 0:
+                lease[0] -= 1
+                return 0
+            if local_until is not None:
+                # Redis was unavailable: this process' own window is used up
+                self.rejected += 1
+                return max(local_until - time.monotonic(), 0.001)
+
+        try:
+            granted, retry_after = await self._reserve(key, times, seconds)
+            ttl, local_until = min(self.lease, seconds), None
+        except (RedisError, OSError) as e:
+            self.degraded += 1
+            if not self.fail_open:
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    detail="Rate limiter unavailable")
+            logger.warning("Rate limiter degraded to per-process limits: %s", e)
+            granted, retry_after = times, 0
+            ttl = seconds
+            local_until = time.monotonic() + seconds
+        if not granted:
+            self.rejected += 1
+            return retry_after
+        # Tokens left in the batch, spent locally until the lease ends
+        self.local.set(key, [granted - 1, local_until], ttl=ttl)
+        return 0
+
+    async def _reserve(self, key: str, times: int, seconds: int) -> tuple[int, float]:
+        """
+        Reserve a batch of tokens from the shared bucket in Redis.
+
+        :return: The number of tokens granted and, if none, the seconds until one is available.
+        :rtype: tuple[int, float]
+        :raises RedisError: If Redis is unavailable.
+        """
+        client = get_redis()
+        if client is None:
+            raise RedisError("Redis is disabled")
+        # Registered once per client, and again only when the client is replaced
+        if self._script is None or self._script[0] is not client:
+            self._script = (client, client.register_script(RESERVE_SCRIPT))
+        script = self._script[1]
+        granted, wait_ms = await script(keys=[f"ratelimit:{key}"],
+                                        args=[times, seconds * 1000, self.batch_size(times)])
+        self.reservations += 1
+        return int(granted), int(wait_ms) / 1000
+
+
+buckets = TokenBuckets(batch_fraction=settings.rate_limit_batch_fraction, lease=settings.rate_limit_lease,
+                       maxsize=settings.rate_limit_local_size, fail_open=settings.rate_limit_fail_open)
+
+
+@lru_cache(maxsize=8)
+def proxy_networks(proxies: tuple[str, ...]) -> tuple[list, set]:
+    """
+    Parse the trusted proxies into networks, keeping the entries that are not addresses as names.
+    """
+    networks, names = [], set()
+    for proxy in proxies:
+        try:
+            networks.append(ipaddress.ip_network(proxy, strict=False))
+        except ValueError:
+            names.add(proxy)
+    return networks, names
+
+
+def is_trusted_proxy(host: str) -> bool:
+    """
+    Check whether an address is one of the ``trusted_proxies``.
+
+    :param host: The address.
+    :type host: str
+    :return: True if requests from the address may carry a client address in ``X-Forwarded-For``.
+    :rtype: bool
+    """
+    networks, names = proxy_networks(tuple(settings.trusted_proxies))
+    if host in names:
+        return True
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def client_ip(request: Request) -> str:
+    """
+    Find the address of the client behind the trusted proxies.
+
+    ``X-Forwarded-For`` is appended to by every proxy, so only its entries after
+    the last untrusted hop are known to be genuine; anything before may have
+    been sent by the client itself.
+
+    :param request: The HTTP request.
+    :type request: Request
+    :return: The first untrusted address, reading from the peer back through ``X-Forwarded-For``.
+    :rtype: str
+    """
+    ip = request.client.host if request.client else "unknown"
+    if not is_trusted_proxy(ip):
+        return ip
+    forwarded = request.headers.get("X-Forwarded-For", "")
+    for hop in reversed([hop.strip() for hop in forwarded.split(",") if hop.strip()]):
+        ip = hop
+        if not is_trusted_proxy(hop):
+            break
+    return ip
+
+
+def client_identity(request: Request) -> str:
+    """
+    Identify who a request is counted against.
+
+    :param request: The HTTP request.
+    :type request: Request
+    :return: ``user:<sub>`` for a valid bearer token, ``ip:<address>`` otherwise.
+    :rtype: str
+    """
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            sub = auth_service.decode_access_token(token).get("sub")
+            if sub:
+                return f"user:{sub}"
+        except JWTError:
+            pass
+    return f"ip:{client_ip(request)}"
+
+
+class RateLimiter:
+    """
+    Route dependency allowing ``times`` requests every ``seconds`` per user and route.
+    """
+
+    def __init__(self, times: int, seconds: int):
+        """
+        :param times: The number of requests allowed.
+        :type times: int
+        :param seconds: The length of the window, in seconds.
+        :type seconds: int
+        """
+        self.times = times
+        self.seconds = seconds
+
+    async def __call__(self, request: Request):
+        if not settings.rate_limit_enabled:
+            return
+        route = request.scope.get("route")
+        path = route.path if route is not None else request.url.path
+        key = f"{client_identity(request)}:{request.method}:{path}:{self.times}/{self.seconds}"
+        retry_after = await buckets.acquire(key, self.times, self.seconds)
+        if retry_after:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                headers={"Retry-After": str(math.ceil(retry_after))})
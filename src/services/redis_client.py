@@ -0,0 +1,107 @@
+#src.services.redis_client.py
+
+"""
+Redis Client Module.
+
+This module holds the shared asyncio Redis client used by the application
+services. The client is created lazily from the settings, and can be replaced
+(for instance by a stand-in during tests) or disabled with :func:`set_redis`.
+Either way, the calls made through the client are counted towards the request
+being served, see :mod:`src.services.instrumentation`.
+
+Blocking commands and subscriptions wait longer than the read timeout of the
+shared client, so they get a client of their own from
+:func:`get_blocking_redis`, without a read timeout.
+"""
+
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.services.instrumentation import count_redis_call
+
+_UNSET = object()
+_client = _UNSET
+_blocking_client = _UNSET
+
+# How often an idle subscription or blocking connection is checked with PING, in seconds
+HEALTH_CHECK_INTERVAL = 30
+
+
+def get_redis():
+    """
+    Return the shared Redis client, creating it on first use.
+
+    :return: The Redis client, or None if Redis has been disabled.
+    :rtype: redis.asyncio.Redis | None
+    """
+    global _client
+    if _client is _UNSET:
+        _client = instrument(redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0,
+                                         socket_connect_timeout=settings.redis_timeout,
+                                         socket_timeout=settings.redis_timeout))
+    return _client
+
+
+def get_blocking_redis():
+    """
+    Return the Redis client for blocking commands and subscriptions, creating it on first use.
+
+    Its reads never time out, so a ``BLMOVE`` or an idle subscription can wait
+    as long as it needs; dead connections are detected by periodic health checks.
+
+    :return: The Redis client, or None if Redis has been disabled.
+    :rtype: redis.asyncio.Redis | None
+    """
+    global _blocking_client
+    if _blocking_client is _UNSET:
+        _blocking_client = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0,
+                                       socket_connect_timeout=settings.redis_timeout, socket_timeout=None,
+                                       health_check_interval=HEALTH_CHECK_INTERVAL)
+    return _blocking_client
+
+
+def set_redis(client):
+    """
+    Replace the shared Redis client, and the client for blocking commands.
+
+    :param client: The client to use from now on, or None to run without Redis.
+    :type client: redis.asyncio.Redis | None
+    """
+    global _client, _blocking_client
+    _client = instrument(client) if client is not None else None
+    _blocking_client = _client
+
+
+def instrument(client):
+    """
+    Count the calls made through a client towards the current request.
+
+    Every command is a call, scripts included; a pipeline is one call, as its
+    commands are sent together.
+
+    :param client: The Redis client.
+    :type client: redis.asyncio.Redis
+    :return: The same client.
+    :rtype: redis.asyncio.Redis
+    """
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+
+    async def counted_execute_command(*args, **options):
+        count_redis_call()
+        return await execute_command(*args, **options)
+
+    def counted_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def counted_execute(*execute_args, **execute_kwargs):
+            count_redis_call()
+            return await execute(*execute_args, **execute_kwargs)
+
+        pipe.execute = counted_execute
+        return pipe
+
+    client.execute_command = counted_execute_command
+    client.pipeline = counted_pipeline
+    return client
@@ -0,0 +1,253 @@
+#src.services.token_store.py
+
+"""
+Refresh Token Store Module.
+
+This module keeps track of refresh tokens in Redis instead of the users table.
+Every login starts a new token family (one per device session); a family
+remembers only the id (``jti``) of its latest refresh token. Refreshing rotates
+the family to a new token id, so the previous refresh token stops working.
+
+Presenting a token that is no longer the latest of its family means it was
+stolen or replayed, so the whole family is revoked and the device must log in
+again. Families expire after the refresh token lifetime without use, and a user
+keeps at most ``max_sessions`` families, the ones closest to expiring being
+dropped first.
+
+Keys:
+
+- ``refresh:family:<family>``: a hash with the latest ``jti`` and the ``email`` of the owner.
+- ``refresh:user:<email>``: a sorted set of the user's families, scored by expiry time.
+"""
+
+import logging
+import time
+import uuid
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from starlette import status
+
+from src.conf.config import settings
+from src.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Starts a family and drops the user's expired and surplus families.
+# KEYS: family, user set. ARGV: jti, email, family id, ttl, now, max sessions
+ISSUE_SCRIPT = """
+redis.call('HSET', KEYS[1], 'jti', ARGV[1], 'email', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[5])
+redis.call('ZADD', KEYS[2], ARGV[5] + ARGV[4], ARGV[3])
+local surplus = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[6])
+if surplus > 0 then
+    local popped = redis.call('ZPOPMIN', KEYS[2], surplus)
+    for i = 1, #popped, 2 do
+        redis.call('DEL', 'refresh:family:' .. popped[i])
+    end
+end
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return 1
+"""
+
+# Moves a family to a new token id if the presented one is its latest.
+# KEYS: family, user set. ARGV: presented jti, new jti, family id, ttl, now
+# Returns 1 when rotated, 0 when the family is unknown, -1 on reuse (family revoked).
+ROTATE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'jti')
+if not current then
+    return 0
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('ZREM', KEYS[2], ARGV[3])
+    return -1
+end
+redis.call('HSET', KEYS[1], 'jti', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('ZADD', KEYS[2], ARGV[5] + ARGV[4], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return 1
+"""
+
+
+# Ends a family, whether the presented token id is its latest or not.
+# KEYS: family, user set. ARGV: presented jti, family id
+# Returns 1 when revoked, 0 when the family is unknown, -1 when the token was already replaced.
+REVOKE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'jti')
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[2])
+if not current then
+    return 0
+end
+if current ~= ARGV[1] then
+    return -1
+end
+return 1
+"""
+
+
+def _family_key(family: str) -> str:
+    return f"refresh:family:{family}"
+
+
+def _user_key(email: str) -> str:
+    return f"refresh:user:{email}"
+
+
+def _unavailable(e: Exception | str) -> HTTPException:
+    # The error names internal hosts, so it is logged rather than returned
+    logger.warning("Session store unavailable: %s", e)
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Session store unavailable")
+
+
+class RefreshTokenStore:
+    """
+    Refresh token families kept in Redis.
+    """
+
+    def __init__(self, ttl: int, max_sessions: int):
+        """
+        :param ttl: How long a family stays valid without being refreshed, in seconds.
+        :type ttl: int
+        :param max_sessions: The maximum number of families per user.
+        :type max_sessions: int
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.reuse_detected = 0
+        self._scripts = None
+
+    def _client(self):
+        client = get_redis()
+        if client is None:
+            raise _unavailable("Redis is disabled")
+        return client
+
+    def _script(self, name: str):
+        """
+        Return a Lua script registered on the current client.
+
+        Scripts are registered once per client, and registered again only when
+        the client is replaced.
+
+        :param name: ``issue``, ``rotate`` or ``revoke``.
+        :type name: str
+        :return: The script, called with ``keys`` and ``args``.
+        :rtype: redis.commands.core.AsyncScript
+        :raises HTTPException: If Redis is disabled.
+        """
+        client = self._client()
+        if self._scripts is None or self._scripts[0] is not client:
+            self._scripts = (client, {
+                "issue": client.register_script(ISSUE_SCRIPT),
+                "rotate": client.register_script(ROTATE_SCRIPT),
+                "revoke": client.register_script(REVOKE_SCRIPT),
+            })
+        return self._scripts[1][name]
+
+    async def issue(self, email: str) -> dict:
+        """
+        Start a new token family for a user, e.g. on login.
+
+        :param email: The email of the user.
+        :type email: str
+        :return: The ``jti`` and ``fam`` claims of the first refresh token of the family.
+        :rtype: dict
+        :raises HTTPException: If Redis is unavailable.
+        """
+        family, jti = uuid.uuid4().hex, uuid.uuid4().hex
+        script = self._script("issue")
+        try:
+            await script(keys=[_family_key(family), _user_key(email)],
+                         args=[jti, email, family, self.ttl, time.time(), self.max_sessions])
+        except (RedisError, OSError) as e:
+            raise _unavailable(e)
+        return {"jti": jti, "fam": family}
+
+    async def rotate(self, claims: dict) -> dict:
+        """
+        Replace the refresh token described by ``claims`` with the next one of its family.
+
+        :param claims: The verified claims of the presented refresh token.
+        :type claims: dict
+        :return: The ``jti`` and ``fam`` claims of the next refresh token.
+        :rtype: dict
+        :raises HTTPException: 401 if the token is unknown, expired, revoked or already
+                               used (the family is then revoked); 503 if Redis is unavailable.
+        """
+        family, jti = claims.get("fam"), claims.get("jti")
+        if not family or not jti:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        new_jti = uuid.uuid4().hex
+        script = self._script("rotate")
+        try:
+            result = await script(keys=[_family_key(family), _user_key(claims["sub"])],
+                                  args=[jti, new_jti, family, self.ttl, time.time()])
+        except (RedisError, OSError) as e:
+            raise _unavailable(e)
+        if result == -1:
+            self.reuse_detected += 1
+        if result != 1:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        return {"jti": new_jti, "fam": family}
+
+    async def revoke(self, claims: dict) -> None:
+        """
+        End the session of a refresh token, e.g. on logout.
+
+        The family is revoked even when the token is no longer its latest, since
+        that token was then stolen or replayed, and the reuse is counted as on
+        rotation.
+
+        :param claims: The verified claims of the refresh token.
+        :type claims: dict
+        :raises HTTPException: If Redis is unavailable.
+        """
+        family = claims.get("fam")
+        if not family:
+            return
+        script = self._script("revoke")
+        try:
+            result = await script(keys=[_family_key(family), _user_key(claims["sub"])],
+                                  args=[claims.get("jti") or "", family])
+        except (RedisError, OSError) as e:
+            raise _unavailable(e)
+        if result == -1:
+            self.reuse_detected += 1
+
+    async def revoke_all(self, email: str) -> None:
+        """
+        End every session of a user.
+
+        :param email: The email of the user.
+        :type email: str
+        :raises HTTPException: If Redis is unavailable.
+        """
+        client = self._client()
+        try:
+            families = await client.zrange(_user_key(email), 0, -1)
+            keys = [_family_key(f.decode() if isinstance(f, bytes) else f) for f in families]
+            await client.delete(_user_key(email), *keys)
+        except (RedisError, OSError) as e:
+            raise _unavailable(e)
+
+    async def sessions(self, email: str) -> int:
+        """
+        Count the active sessions of a user.
+
+        :param email: The email of the user.
+        :type email: str
+        :return: The number of token families that have not expired.
+        :rtype: int
+        :raises HTTPException: If Redis is unavailable.
+        """
+        try:
+            return await self._client().zcount(_user_key(email), time.time(), "+inf")
+        except (RedisError, OSError) as e:
+            raise _unavailable(e)
+
+
+token_store = RefreshTokenStore(ttl=settings.refresh_token_ttl, max_sessions=settings.max_sessions)
@@ -0,0 +1,182 @@
+#src.services.user_cache.py
+
+"""
+User Cache Service Module.
+
+This module contains the two-tier cache of authenticated users used by
+``Auth.get_current_user``. Users are looked up in an in-process LRU first,
+then in Redis, and only then in the database. Redis holds a compact JSON
+document of the user's columns (never the ORM object), and changes to a user
+are broadcast over Redis pub/sub so every process drops its local copy.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime
+
+from redis.exceptions import RedisError
+from sqlalchemy import DateTime, inspect
+
+from src.conf.config import settings
+from src.models.models import UserDB
+from src.services.cache import TTLCache
+from src.services.redis_client import get_blocking_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+# Columns never copied into the cache
+EXCLUDED_COLUMNS = {"password"}
+
+
+def dump_user(user: UserDB) -> bytes:
+    """
+    Serialize the cached columns of a user to JSON.
+
+    :param user: The user.
+    :type user: UserDB
+    :return: The JSON document.
+    :rtype: bytes
+    """
+    data = {}
+    for attr in inspect(UserDB).column_attrs:
+        if attr.key not in EXCLUDED_COLUMNS:
+            value = getattr(user, attr.key)
+            data[attr.key] = value.isoformat() if isinstance(value, datetime) else value
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def load_user(raw: bytes) -> UserDB:
+    """
+    Build a detached user from a document produced by :func:`dump_user`.
+
+    :param raw: The JSON document.
+    :type raw: bytes
+    :return: A user that is not attached to any session.
+    :rtype: UserDB
+    """
+    data = json.loads(raw)
+    for attr in inspect(UserDB).column_attrs:
+        if isinstance(attr.columns[0].type, DateTime) and data.get(attr.key):
+            data[attr.key] = datetime.fromisoformat(data[attr.key])
+    return UserDB(**data)
+
+
+class UserCache:
+    """
+    Two-tier cache of users keyed by email.
+
+    Redis errors never fail a request: the cache then behaves as a miss and the
+    user is loaded from the database.
+    """
+    channel = "user-cache:invalidate"
+
+    def __init__(self, local_ttl: float, redis_ttl: int, maxsize: int):
+        """
+        :param local_ttl: How long a user stays in the in-process tier, in seconds.
+        :type local_ttl: float
+        :param redis_ttl: How long a user stays in Redis, in seconds.
+        :type redis_ttl: int
+        :param maxsize: The maximum number of users in the in-process tier.
+        :type maxsize: int
+        """
+        self.local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self.redis_ttl = redis_ttl
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(email: str) -> str:
+        return f"user:{email}"
+
+    async def get(self, email: str) -> UserDB | None:
+        """
+        Return the cached user with the given email.
+
+        :param email: The email of the user.
+        :type email: str
+        :return: A detached user, or None on a miss.
+        :rtype: UserDB | None
+        """
+        raw = self.local.get(email)
+        if raw is None:
+            raw = await self._redis_call("get", self._key(email))
+            if raw is None:
+                self.misses += 1
+                return None
+            self.redis_hits += 1
+            self.local.set(email, raw)
+        return load_user(raw)
+
+    async def set(self, user: UserDB):
+        """
+        Cache a user in both tiers.
+
+        :param user: The user loaded from the database.
+        :type user: UserDB
+        """
+        raw = dump_user(user)
+        self.local.set(user.email, raw)
+        await self._redis_call("set", self._key(user.email), raw, ex=self.redis_ttl)
+
+    async def invalidate(self, email: str):
+        """
+        Drop a user from both tiers and tell the other processes to drop it too.
+
+        :param email: The email of the user that changed.
+        :type email: str
+        """
+        self.local.pop(email)
+        await self._redis_call("delete", self._key(email))
+        await self._redis_call("publish", self.channel, email)
+
+    async def listen(self, retry_delay: float = 1.0, poll_interval: float = 5.0):
+        """
+        Drop local entries announced on the invalidation channel, until cancelled.
+
+        Run it as a background task for the lifetime of the process. The
+        subscription is made on the client for blocking commands and polled for
+        messages, so an idle channel is not taken for a lost connection. The local
+        tier is cleared on every reconnect, since invalidations may have been
+        missed while disconnected.
+
+        :param retry_delay: The pause before reconnecting after a Redis error, in seconds.
+        :type retry_delay: float
+        :param poll_interval: The longest wait for a message before polling again, in seconds.
+        :type poll_interval: float
+        """
+        reconnecting = False
+        while True:
+            client = get_blocking_redis()
+            if client is None:
+                return
+            try:
+                async with client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    if reconnecting:
+                        self.local.clear()
+                        logger.info("User cache invalidation listener reconnected")
+                    reconnecting = False
+                    while True:
+                        message = await pubsub.get_message(timeout=poll_interval)
+                        if message is not None and message["type"] == "message":
+                            data = message["data"]
+                            self.local.pop(data.decode() if isinstance(data, bytes) else data)
+            except (RedisError, OSError) as e:
+                logger.warning("User cache invalidation listener disconnected: %s", e)
+                reconnecting = True
+                await asyncio.sleep(retry_delay)
+
+    async def _redis_call(self, command: str, *args, **kwargs):
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            return await getattr(client, command)(*args, **kwargs)
+        except (RedisError, OSError) as e:
+            logger.warning("User cache Redis %s failed: %s", command, e)
+            return None
+
+
+user_cache = UserCache(local_ttl=settings.user_cache_local_ttl, redis_ttl=settings.user_cache_ttl,
+                       maxsize=settings.user_cache_size)
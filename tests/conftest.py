@@ -5,20 +5,40 @@ sys.path.append(os.path.abspath('.'))
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import fakeredis
 
-from src.db.database import get_db
+from src.db.database import get_db, get_primary_db
 from main import app
 from src.models.models import Base
+from src.services import gravatar
+from src.services.redis_client import set_redis
 
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
+# Synchronous engine used by the tests themselves to prepare and inspect data
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the application under test. NullPool keeps connections
+# from leaking between the event loops of different TestClient instances.
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def redis_server():
+    # In-process Redis stand-in shared by the application services
+    set_redis(fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer()))
+    yield
+    set_redis(None)
+
 
 @pytest.fixture(scope="module")
 def session():
@@ -38,17 +58,20 @@ def session():
 def client(session):
     # Dependency override
 
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_primary_db] = override_get_db
+    # Background tasks open their own sessions
+    session_local, gravatar.SessionLocal = gravatar.SessionLocal, AsyncTestingSessionLocal
 
     yield TestClient(app)
 
+    gravatar.SessionLocal = session_local
+
 
 @pytest.fixture(scope="module")
 def user():
-    return {"username": "deadpool", "email": "deadpool@example.com", "password": "123456789"}
\ No newline at end of file
+    return {"username": "deadpool", "email": "deadpool@example.com", "password": "123456789"}
@@ -0,0 +1,216 @@
+# tests/test_integration_repository_contacts.py
+
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import json
+import unittest
+from datetime import date
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.models.models import Base, ContactDB, UserDB
+from src.repository.contacts import (
+    CONTACT_ROW_COLUMNS, get_contacts, get_contact_rows, stream_contacts, stream_contact_rows,
+    get_upcoming_birthdays, search_contacts, search_contact_rows, bulk_create_contacts,
+)
+from src.schemas.schemas import ContactCreate, ContactResponse
+from src.services.serialization import CONTACT_FIELDS, dump_contact_rows
+from src.routes.contacts import encode_cursor, decode_cursor
+
+
+class TestContactRepositorySQLite(unittest.IsolatedAsyncioTestCase):
+    """Runs the contact repository against a real in-memory SQLite database."""
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.user = UserDB(id=1, username="owner", email="owner@example.com", password="x")
+        other = UserDB(id=2, username="other", email="other@example.com", password="x")
+        self.session.add_all([self.user, other])
+        self.session.add_all(
+            ContactDB(first_name=f"First{i}", last_name=f"Last{i}", email=f"c{i}@example.com",
+                      phone_number="123", birthday=date(1990, 1, 1 + i % 28), user_id=1 + i % 2)
+            for i in range(20)
+        )
+        await self.session.commit()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_get_contacts_keyset_pages(self):
+        seen = []
+        after_id = None
+        while True:
+            page = await get_contacts(self.session, self.user, limit=3, after_id=after_id)
+            if not page:
+                break
+            seen.extend(contact.id for contact in page)
+            after_id = page[-1].id
+
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(seen, sorted(seen))
+
+    async def test_get_contacts_without_limit(self):
+        contacts = await get_contacts(self.session, self.user)
+
+        self.assertEqual(len(contacts), 10)
+        self.assertTrue(all(contact.user_id == self.user.id for contact in contacts))
+
+    async def test_stream_contacts_batches(self):
+        batches = [batch async for batch in stream_contacts(self.session, self.user, batch_size=4)]
+
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+
+    async def test_stream_contacts_after_id(self):
+        first = (await get_contacts(self.session, self.user, limit=4))[-1]
+        batches = [batch async for batch in stream_contacts(self.session, self.user, after_id=first.id)]
+
+        self.assertEqual(sum(len(batch) for batch in batches), 6)
+
+    async def test_contact_rows_serialize_like_responses(self):
+        self.session.add(ContactDB(first_name="Zoë", last_name="O\"Neil", email="zoe@example.com", phone_number="1",
+                                   birthday=date(1990, 1, 1), additional_data=None, user_id=1))
+        await self.session.commit()
+        contacts = await get_contacts(self.session, self.user, limit=5, after_id=2)
+        rows = await get_contact_rows(self.session, self.user, limit=5, after_id=2)
+
+        self.assertEqual(CONTACT_FIELDS, tuple(column.key for column in CONTACT_ROW_COLUMNS))
+        expected = json.dumps(jsonable_encoder([ContactResponse.model_validate(c) for c in contacts]),
+                              ensure_ascii=False, separators=(",", ":")).encode()
+        self.assertEqual(dump_contact_rows(rows), expected)
+        everything = await get_contact_rows(self.session, self.user)
+        self.assertEqual(json.loads(dump_contact_rows(everything[-1:]))[0]["first_name"], "Zoë")
+
+    async def test_stream_contact_rows_batches(self):
+        batches = [batch async for batch in stream_contact_rows(self.session, self.user, batch_size=4)]
+
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+        self.assertEqual([row.id for batch in batches for row in batch],
+                         [contact.id for contact in await get_contacts(self.session, self.user)])
+
+    async def test_search_contact_rows_match_search(self):
+        for query in ("LAST1", "c4@", "  "):
+            contacts = await search_contacts(query, self.session, self.user)
+            rows = await search_contact_rows(query, self.session, self.user)
+            self.assertEqual([row.id for row in rows], [contact.id for contact in contacts])
+
+    async def _birthday_contacts(self, *birthdays):
+        user = UserDB(id=3, username="birthdays", email="birthdays@example.com", password="x")
+        self.session.add(user)
+        self.session.add_all(
+            ContactDB(first_name="B", last_name=str(birthday), email=f"b{i}@example.com",
+                      phone_number="123", birthday=birthday, user_id=3)
+            for i, birthday in enumerate(birthdays)
+        )
+        await self.session.commit()
+        return user
+
+    async def test_upcoming_birthdays_window(self):
+        user = await self._birthday_contacts(date(1980, 6, 10), date(1985, 6, 17), date(1990, 6, 18))
+
+        result = await get_upcoming_birthdays(self.session, user, days=7, today=date(2024, 6, 10))
+
+        self.assertEqual([contact.birthday for contact in result], [date(1980, 6, 10), date(1985, 6, 17)])
+
+    async def test_upcoming_birthdays_wrap_new_year(self):
+        user = await self._birthday_contacts(date(1980, 1, 2), date(1985, 12, 30), date(1990, 1, 10))
+
+        result = await get_upcoming_birthdays(self.session, user, days=7, today=date(2023, 12, 28))
+
+        self.assertEqual([contact.birthday for contact in result], [date(1985, 12, 30), date(1980, 1, 2)])
+
+    async def test_upcoming_birthdays_february_29(self):
+        user = await self._birthday_contacts(date(2000, 2, 29))
+
+        result = await get_upcoming_birthdays(self.session, user, days=3, today=date(2023, 2, 27))
+
+        self.assertEqual(len(result), 1)
+
+    async def test_upcoming_birthdays_updates_key(self):
+        user = await self._birthday_contacts(date(1980, 3, 1))
+        contact = (await get_upcoming_birthdays(self.session, user, days=0, today=date(2024, 3, 1)))[0]
+        contact.birthday = date(1980, 9, 1)
+        await self.session.commit()
+
+        result = await get_upcoming_birthdays(self.session, user, days=0, today=date(2024, 9, 1))
+
+        self.assertEqual(result, [contact])
+
+    async def test_search_contacts_substring(self):
+        result = await search_contacts("LAST1", self.session, self.user)
+
+        self.assertEqual({contact.last_name for contact in result}, {"Last10", "Last12", "Last14", "Last16", "Last18"})
+
+    async def test_search_contacts_ranked_and_limited(self):
+        self.session.add(ContactDB(first_name="Anna", last_name="Annabelle", email="anna@example.com",
+                                   phone_number="1", birthday=date(1990, 1, 1), user_id=1))
+        self.session.add(ContactDB(first_name="Joanna", last_name="Smith", email="j@example.com",
+                                   phone_number="1", birthday=date(1990, 1, 1), user_id=1))
+        await self.session.commit()
+
+        result = await search_contacts("anna", self.session, self.user, limit=1)
+
+        self.assertEqual([contact.first_name for contact in result], ["Anna"])
+
+    async def test_search_contacts_short_query_and_update(self):
+        contact = (await search_contacts("c4@", self.session, self.user))[0]
+        contact.email = "zz@example.com"
+        await self.session.commit()
+
+        self.assertEqual(await search_contacts("c4@", self.session, self.user), [])
+        self.assertEqual(await search_contacts("zz", self.session, self.user), [contact])
+
+    async def test_search_contacts_short_query_matches_substring(self):
+        self.session.add(ContactDB(first_name="Betty", last_name="Hanks", email="betty@example.com",
+                                   phone_number="1", birthday=date(1990, 1, 1), user_id=1))
+        self.session.add(ContactDB(first_name="Ann", last_name="Lee", email="ann@ty.org",
+                                   phone_number="1", birthday=date(1990, 1, 1), user_id=1))
+        await self.session.commit()
+
+        result = await search_contacts("TY", self.session, self.user)
+
+        self.assertEqual([contact.first_name for contact in result], ["Betty", "Ann"])
+        self.assertEqual(len(await search_contacts("st", self.session, self.user)), 10)
+
+    async def test_search_contacts_escapes_wildcards(self):
+        self.assertEqual(await search_contacts("%", self.session, self.user), [])
+        self.assertEqual(await search_contacts("%%%", self.session, self.user), [])
+
+    async def test_bulk_create_contacts_reports_failed_rows(self):
+        rows = [
+            (i, ContactCreate(first_name="Bulk", last_name=str(i), email=email, phone_number="1",
+                              birthday=date(1990, 3, 4), additional_data=None))
+            for i, email in enumerate(["bulk1@example.com", "c0@example.com", "bulk2@example.com"], start=1)
+        ]
+
+        failed = await bulk_create_contacts(self.session, rows, self.user)
+
+        self.assertEqual([row for row, _ in failed], [2])
+        created = await search_contacts("bulk", self.session, self.user)
+        self.assertEqual(sorted(contact.email for contact in created), ["bulk1@example.com", "bulk2@example.com"])
+        self.assertTrue(all(contact.birthday_mmdd == 304 for contact in created))
+
+
+class TestContactCursor(unittest.TestCase):
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(42)), 42)
+        self.assertIsNone(decode_cursor(None))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(HTTPException):
+            decode_cursor("not-a-cursor")
+
+
+if __name__ == "__main__":
+    unittest.main()
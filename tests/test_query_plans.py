@@ -0,0 +1,165 @@
+# tests/test_query_plans.py
+
+"""
+Query-plan regression suite.
+
+Every repository function is run against a seeded database while its SQL is
+captured, then each captured statement is EXPLAINed. A test fails when any of
+them reads the contacts or users table with a full sequential scan, which is
+what happens when an index is lost or a query stops leading with an indexed
+column.
+
+SQLite always runs. PostgreSQL runs when ``TEST_POSTGRES_URL`` points to a
+scratch database (its tables are dropped and recreated), with
+``enable_seqscan`` turned off so the planner picks an index whenever one applies.
+"""
+
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import re
+import unittest
+from datetime import date
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.db.database import to_async_url
+from src.models.models import Base, ContactDB, UserDB
+from src.schemas.schemas import ContactCreate
+from src.repository import contacts as repository_contacts
+from src.repository import user as repository_users
+
+TEST_POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+CONTACTS_PER_USER = 200
+
+
+class QueryPlanMixin:
+    """
+    Seeds a database, captures repository SQL and checks its query plans.
+
+    Test classes set ``url`` and ``seq_scan``, the pattern of a full table scan
+    in a plan line, and define ``explain(statement, parameters)``, returning the
+    plan of a statement as lines.
+    """
+
+    url = None
+    seq_scan = None
+
+    async def asyncSetUp(self):
+        options = {"poolclass": StaticPool} if self.url.startswith("sqlite") else {}
+        self.engine = create_async_engine(self.url, **options)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.users = [UserDB(id=i, username=f"user{i}", email=f"user{i}@example.com", password="x")
+                      for i in (1, 2, 3)]
+        self.session.add_all(self.users)
+        self.session.add_all(
+            ContactDB(first_name=f"First{i}", last_name=f"Last{i}", email=f"c{u.id}.{i}@example.com",
+                      phone_number="123", birthday=date(1980 + i % 30, 1 + i % 12, 1 + i % 28), user_id=u.id)
+            for u in self.users for i in range(CONTACTS_PER_USER)
+        )
+        await self.session.commit()
+        self.user = self.users[0]
+
+        self.captured = []
+        self.capturing = False
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self._capture)
+
+    async def asyncTearDown(self):
+        event.remove(self.engine.sync_engine, "before_cursor_execute", self._capture)
+        await self.session.close()
+        await self.engine.dispose()
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany):
+        if self.capturing and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            self.captured.append((statement, parameters))
+
+    async def assertIndexed(self, call):
+        """Run ``call()`` and assert none of the statements it issues scans a whole table."""
+        self.captured = []
+        self.capturing = True
+        try:
+            result = call()
+            if hasattr(result, "__anext__"):
+                result = [item async for item in result]
+            else:
+                result = await result
+        finally:
+            self.capturing = False
+        self.assertTrue(self.captured, "no statements were captured")
+        for statement, parameters in self.captured:
+            plan = await self.explain(statement, parameters)
+            scans = [line for line in plan if self.seq_scan.search(line)]
+            self.assertFalse(scans, f"sequential scan in plan for:\n{statement}\n" + "\n".join(plan))
+        return result
+
+    async def test_get_contacts(self):
+        page = await self.assertIndexed(lambda: repository_contacts.get_contacts(self.session, self.user, limit=50))
+        await self.assertIndexed(lambda: repository_contacts.get_contacts(
+            self.session, self.user, limit=50, after_id=page[-1].id))
+
+    async def test_stream_contacts(self):
+        await self.assertIndexed(lambda: repository_contacts.stream_contacts(self.session, self.user, batch_size=50))
+
+    async def test_get_contact_by_id(self):
+        await self.assertIndexed(lambda: repository_contacts.get_contact_by_id(self.session, 5, self.user))
+
+    async def test_update_contact(self):
+        contact = ContactCreate(first_name="New", last_name="Name", email="new@example.com", phone_number="1",
+                                birthday=date(1990, 5, 5), additional_data=None)
+        await self.assertIndexed(lambda: repository_contacts.update_contact(self.session, contact, None, 1, self.user))
+
+    async def test_delete_contact(self):
+        await self.assertIndexed(lambda: repository_contacts.delete_contact(self.session, None, 2, self.user))
+
+    async def test_search_contacts(self):
+        await self.assertIndexed(lambda: repository_contacts.search_contacts("last1", self.session, self.user))
+
+    async def test_search_contacts_short_query(self):
+        await self.assertIndexed(lambda: repository_contacts.search_contacts("la", self.session, self.user))
+
+    async def test_get_upcoming_birthdays(self):
+        await self.assertIndexed(lambda: repository_contacts.get_upcoming_birthdays(
+            self.session, self.user, days=7, today=date(2024, 6, 1)))
+
+    async def test_get_upcoming_birthdays_wrapping_new_year(self):
+        await self.assertIndexed(lambda: repository_contacts.get_upcoming_birthdays(
+            self.session, self.user, days=14, today=date(2024, 12, 25)))
+
+    async def test_get_user_by_email(self):
+        await self.assertIndexed(lambda: repository_users.get_user_by_email("user2@example.com", self.session))
+
+
+class TestQueryPlansSQLite(QueryPlanMixin, unittest.IsolatedAsyncioTestCase):
+    url = "sqlite+aiosqlite://"
+    # "SCAN contacts_fts VIRTUAL TABLE" is the FTS5 index itself and is allowed
+    seq_scan = re.compile(r"^SCAN (contacts|users)\b(?!_)")
+
+    async def explain(self, statement, parameters):
+        async with self.engine.connect() as conn:
+            rows = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+            return [row[-1] for row in rows]
+
+
+@unittest.skipUnless(TEST_POSTGRES_URL, "TEST_POSTGRES_URL is not set")
+class TestQueryPlansPostgreSQL(QueryPlanMixin, unittest.IsolatedAsyncioTestCase):
+    url = to_async_url(TEST_POSTGRES_URL) if TEST_POSTGRES_URL else None
+    seq_scan = re.compile(r"Seq Scan on (contacts|users)\b")
+
+    async def explain(self, statement, parameters):
+        async with self.engine.connect() as conn:
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+            rows = await conn.exec_driver_sql("EXPLAIN " + statement, parameters)
+            return [row[0] for row in rows]
+
+
+if __name__ == "__main__":
+    unittest.main()
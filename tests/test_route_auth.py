@@ -66,4 +66,52 @@ def test_login_wrong_email(client, user):
     )
     assert response.status_code == 401, response.text
     data = response.json()
-    assert data["detail"] == "Invalid email"
\ No newline at end of file
+    assert data["detail"] == "Invalid email"
+
+
+def login(client, user):
+    response = client.post(
+        "auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_refresh_token_rotates(client, user):
+    tokens = login(client, user)
+    response = client.get("auth/refresh_token", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 200, response.text
+    refreshed = response.json()
+    assert refreshed["refresh_token"] != tokens["refresh_token"]
+    response = client.get("auth/refresh_token", headers={"Authorization": f"Bearer {refreshed['refresh_token']}"})
+    assert response.status_code == 200, response.text
+
+
+def test_refresh_token_reuse_revokes_session(client, user):
+    tokens = login(client, user)
+    headers = {"Authorization": f"Bearer {tokens['refresh_token']}"}
+    rotated = client.get("auth/refresh_token", headers=headers).json()
+    response = client.get("auth/refresh_token", headers=headers)
+    assert response.status_code == 401, response.text
+    assert response.json()["detail"] == "Invalid refresh token"
+    response = client.get("auth/refresh_token", headers={"Authorization": f"Bearer {rotated['refresh_token']}"})
+    assert response.status_code == 401, response.text
+
+
+def test_sessions_are_independent(client, user):
+    phone, laptop = login(client, user), login(client, user)
+    response = client.post("auth/logout", headers={"Authorization": f"Bearer {phone['refresh_token']}"})
+    assert response.status_code == 204, response.text
+    response = client.get("auth/refresh_token", headers={"Authorization": f"Bearer {phone['refresh_token']}"})
+    assert response.status_code == 401, response.text
+    response = client.get("auth/refresh_token", headers={"Authorization": f"Bearer {laptop['refresh_token']}"})
+    assert response.status_code == 200, response.text
+
+
+def test_logout_all(client, user):
+    tokens = login(client, user)
+    response = client.post("auth/logout_all", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert response.status_code == 204, response.text
+    response = client.get("auth/refresh_token", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401, response.text
@@ -0,0 +1,53 @@
+from datetime import date
+
+from src.models.models import ContactDB, UserDB
+
+
+def auth_headers(client, session, user):
+    client.post("/auth/signup", json=user)
+    db_user = session.query(UserDB).filter(UserDB.email == user["email"]).first()
+    db_user.confirmed = True
+    session.commit()
+    response = client.post("auth/login", data={"username": user["email"], "password": user["password"]})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def create_contacts(session, user, count):
+    owner = session.query(UserDB).filter(UserDB.email == user["email"]).first()
+    session.add_all(
+        ContactDB(first_name=f"First{i}", last_name=f"Last{i}", email=f"contact{i}@example.com",
+                  phone_number="123", birthday=date(1990, 1, 1 + i), user_id=owner.id)
+        for i in range(count)
+    )
+    session.commit()
+
+
+def test_read_contacts_pages(client, session, user):
+    headers = auth_headers(client, session, user)
+    create_contacts(session, user, 3)
+
+    response = client.get("/contacts/contacts/", params={"limit": 2}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/json"
+    page = response.json()
+    assert [c["first_name"] for c in page] == ["First0", "First1"]
+    assert list(page[0]) == ["first_name", "last_name", "email", "phone_number", "birthday", "additional_data", "id"]
+    assert page[0]["birthday"] == "1990-01-01"
+
+    response = client.get("/contacts/contacts/", params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]},
+                          headers=headers)
+    assert [c["first_name"] for c in response.json()] == ["First2"]
+    assert "X-Next-Cursor" not in response.headers
+
+    streamed = client.get("/contacts/contacts/", params={"stream": True}, headers=headers).json()
+    assert [c["first_name"] for c in streamed] == ["First0", "First1", "First2"]
+    assert streamed[:2] == page
+
+
+def test_search_contacts(client, session, user):
+    headers = auth_headers(client, session, user)
+    response = client.get("/contacts/contacts/search/", params={"query": "last1"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert [c["last_name"] for c in response.json()] == ["Last1"]
+    assert client.get("/contacts/contacts/search/", params={"query": " "}, headers=headers).json() == []
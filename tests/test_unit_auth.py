@@ -0,0 +1,102 @@
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from jose import JWTError, jwt
+
+from src.auth.auth import Auth
+from src.auth.hashing import PasswordHasher
+from src.services.cache import TTLCache
+
+
+class TestAccessTokenCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.auth = Auth()
+        self.auth.SECRET_KEY = "secret"
+        self.auth.ALGORITHM = "HS256"
+        self.auth.token_cache = TTLCache(maxsize=100, ttl=900)
+
+    async def test_second_decode_skips_verification(self):
+        token = await self.auth.create_access_token(data={"sub": "deadpool@example.com"})
+        claims = self.auth.decode_access_token(token)
+        with patch("src.auth.auth.jwt.decode", side_effect=AssertionError("verified twice")):
+            self.assertEqual(self.auth.decode_access_token(token), claims)
+        self.assertEqual(claims["sub"], "deadpool@example.com")
+        self.assertEqual(self.auth.token_cache.hit_ratio, 0.5)
+
+    async def test_claims_are_cached_until_exp(self):
+        token = await self.auth.create_access_token(data={"sub": "deadpool@example.com"}, expires_delta=60)
+        self.auth.decode_access_token(token)
+        later = time.monotonic() + 61
+        with patch("src.services.cache.time.monotonic", return_value=later), \
+                patch("src.auth.auth.jwt.decode", side_effect=JWTError("Signature has expired.")) as decode:
+            with self.assertRaises(JWTError):
+                self.auth.decode_access_token(token)
+        decode.assert_called_once()
+
+    def test_invalid_tokens_are_not_cached(self):
+        token = jwt.encode({"sub": "deadpool@example.com", "exp": time.time() + 60}, "other", algorithm="HS256")
+        for _ in range(2):
+            with self.assertRaises(JWTError):
+                self.auth.decode_access_token(token)
+        self.assertEqual(len(self.auth.token_cache), 0)
+
+
+class TestPasswordHasher(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.hasher = PasswordHasher(rounds=4, workers=2, max_pending=4)
+
+    def tearDown(self):
+        self.hasher.shutdown()
+
+    async def test_hash_and_verify(self):
+        hashed = await self.hasher.hash("123456789")
+        self.assertTrue(hashed.startswith("$2b$04$"))
+        self.assertTrue(await self.hasher.verify("123456789", hashed))
+        self.assertFalse(await self.hasher.verify("wrong", hashed))
+
+    async def test_rehash_when_rounds_change(self):
+        hashed = await self.hasher.hash("123456789")
+        self.assertEqual(await self.hasher.verify_and_update("123456789", hashed), (True, None))
+
+        stronger = PasswordHasher(rounds=5, workers=1, max_pending=1)
+        verified, new_hash = await stronger.verify_and_update("123456789", hashed)
+        stronger.shutdown()
+        self.assertTrue(verified)
+        self.assertTrue(new_hash.startswith("$2b$05$"))
+        self.assertEqual(await stronger.verify_and_update("wrong", hashed), (False, None))
+
+    async def test_runs_off_the_event_loop(self):
+        calls = []
+        with patch.object(self.hasher.pwd_context, "hash",
+                          side_effect=lambda password: calls.append(threading.get_ident()) or "hashed"):
+            self.assertEqual(await self.hasher.hash("123456789"), "hashed")
+        self.assertNotEqual(calls, [threading.get_ident()])
+
+    async def test_rejects_when_saturated(self):
+        release = threading.Event()
+        with patch.object(self.hasher.pwd_context, "hash", side_effect=lambda password: release.wait(5)):
+            jobs = [asyncio.create_task(self.hasher.hash("x")) for _ in range(4)]
+            await asyncio.sleep(0)
+            with self.assertRaises(HTTPException) as error:
+                await self.hasher.hash("x")
+            release.set()
+            await asyncio.gather(*jobs)
+        self.assertEqual(error.exception.status_code, 503)
+        self.assertEqual(self.hasher.rejected, 1)
+        self.assertEqual(self.hasher.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,250 @@
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import InvalidRequestError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.auth.auth import auth_service
+from src.db import database
+from src.db.database import get_db
+from src.db.metrics import DatabaseMetrics, InstrumentedQueuePool, SessionMetrics
+from src.db.routing import STRATEGIES, ReadSession, ReadYourWrites, ReplicaSet, RequestSession
+from src.models.models import Base, UserDB
+from src.services import redis_client
+
+# A stand-in app reporting which database served each request
+app = FastAPI()
+
+
+@app.get("/source")
+async def source(db: AsyncSession = Depends(get_db)):
+    return await db.scalar(text("SELECT name FROM source"))
+
+
+@app.post("/source")
+async def write(db: AsyncSession = Depends(get_db)):
+    return await db.scalar(text("SELECT name FROM source"))
+
+
+@app.get("/idle")
+async def idle(db: AsyncSession = Depends(get_db)):
+    return "cached"
+
+
+def sqlite_file(path: str, name: str) -> str:
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE source (name TEXT)"))
+        conn.execute(text("INSERT INTO source VALUES (:name)"), {"name": name})
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    return f"sqlite+aiosqlite:///{path}"
+
+
+class TestReplicaRouting(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        primary = sqlite_file(f"{self.tmp.name}/primary.db", "primary")
+        replica = sqlite_file(f"{self.tmp.name}/replica.db", "replica")
+        self.replicas = ReplicaSet([create_async_engine(replica, poolclass=NullPool)])
+        primary_engine = create_async_engine(primary, poolclass=NullPool)
+        for patcher in (
+            patch.object(database, "SessionLocal", async_sessionmaker(bind=primary_engine,
+                                                                      sync_session_class=RequestSession)),
+            patch.object(database, "ReadSessionLocal", async_sessionmaker(bind=primary_engine, class_=ReadSession,
+                                                                          sync_session_class=RequestSession)),
+            patch.object(database, "replicas", self.replicas),
+            patch.object(database, "read_your_writes", ReadYourWrites(seconds=60)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        redis_client.set_redis(fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer()))
+        self.addCleanup(redis_client.set_redis, None)
+        self.client = TestClient(app)
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.client.get("/source").json(), "replica")
+        self.assertEqual(self.client.post("/source").json(), "primary")
+
+    def bearer(self, email, **claims):
+        token = asyncio.run(auth_service.create_access_token(data={"sub": email, **claims}))
+        return {"Authorization": f"Bearer {token}"}
+
+    def test_reads_stick_to_primary_after_write(self):
+        alice = self.bearer("alice@example.com")
+        bob = self.bearer("bob@example.com")
+        self.client.post("/source", headers=alice)
+        self.assertEqual(self.client.get("/source", headers=alice).json(), "primary")
+        self.assertEqual(self.client.get("/source", headers=bob).json(), "replica")
+
+    def test_write_window_survives_token_refresh(self):
+        self.client.post("/source", headers=self.bearer("alice@example.com", jti="first"))
+        refreshed = self.bearer("alice@example.com", jti="second")
+        self.assertEqual(self.client.get("/source", headers=refreshed).json(), "primary")
+
+    def test_forwarded_address_ignored_from_untrusted_peer(self):
+        self.client.post("/source", headers={"X-Forwarded-For": "10.0.0.2"})
+        # The peer, not the header, identifies anonymous clients
+        self.assertEqual(self.client.get("/source", headers={"X-Forwarded-For": "10.0.0.3"}).json(), "primary")
+
+    def test_write_window_shared_through_redis(self):
+        alice = self.bearer("alice@example.com")
+        self.client.post("/source", headers=alice)
+        # Another worker only sees the window in Redis
+        with patch.object(database, "read_your_writes", ReadYourWrites(seconds=60)):
+            self.assertEqual(self.client.get("/source", headers=alice).json(), "primary")
+        with patch.object(database.read_your_writes, "seconds", 0):
+            self.assertEqual(self.client.get("/source", headers=alice).json(), "replica")
+
+    def test_reads_fall_back_to_primary_when_replica_down(self):
+        down = ReplicaSet([create_async_engine(f"sqlite+aiosqlite:///{self.tmp.name}/missing/replica.db",
+                                               poolclass=NullPool)])
+        with patch.object(database, "replicas", down), self.assertLogs("src.db.routing", "WARNING"):
+            with self.assertRaises(OperationalError):
+                self.client.get("/source")
+            self.assertEqual(self.client.get("/source").json(), "primary")
+        self.assertEqual(down.failures, [1])
+
+    def test_without_replicas_reads_use_primary(self):
+        with patch.object(database, "replicas", ReplicaSet([])):
+            self.assertEqual(self.client.get("/source").json(), "primary")
+
+    def test_session_hold_time_per_request(self):
+        with patch.object(database, "session_metrics", SessionMetrics()) as metrics:
+            self.client.get("/idle")
+            self.client.get("/source")
+            self.client.post("/source")
+        self.assertEqual(metrics.sessions, 3)
+        self.assertEqual(metrics.without_connection, 1)
+        self.assertEqual(metrics.hold_time.count, 2)
+
+    def test_only_request_sessions_instrumented(self):
+        async def run():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{self.tmp.name}/primary.db", poolclass=NullPool)
+            async with AsyncSession(engine) as other, \
+                    AsyncSession(engine, sync_session_class=RequestSession) as request:
+                await other.scalar(text("SELECT name FROM source"))
+                await request.scalar(text("SELECT name FROM source"))
+                infos = dict(other.info), dict(request.info)
+            await engine.dispose()
+            return infos
+
+        other, request = asyncio.run(run())
+        self.assertEqual(other, {})
+        self.assertIn("connected_at", request)
+
+
+class TestReadSession(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        url = sqlite_file(f"{self.tmp.name}/primary.db", "primary")
+        self.engine = create_async_engine(url, poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0)
+        self.metrics = DatabaseMetrics(slow_query_ms=0)
+        self.metrics.instrument(self.engine)
+        async with AsyncSession(self.engine) as db:
+            db.add(UserDB(username="deadpool", email="deadpool@example.com", password="x"))
+            await db.commit()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        self.tmp.cleanup()
+
+    async def test_connection_released_after_each_statement(self):
+        async with ReadSession(self.engine, autoflush=False, expire_on_commit=False) as db:
+            user = await db.scalar(select(UserDB))
+            self.assertEqual(self.metrics.in_use, 0)
+            self.assertEqual(user.email, "deadpool@example.com")
+            self.assertEqual(len((await db.scalars(select(UserDB))).all()), 1)
+            self.assertEqual(self.metrics.in_use, 0)
+        async with AsyncSession(self.engine, expire_on_commit=False) as db:
+            await db.scalar(select(UserDB))
+            self.assertEqual(self.metrics.in_use, 1)
+        # Including the checkout of the setup
+        self.assertEqual(self.metrics.hold_time.count, 4)
+
+    async def test_pending_changes_keep_the_transaction(self):
+        async with ReadSession(self.engine, autoflush=False, expire_on_commit=False) as db:
+            user = await db.scalar(select(UserDB))
+            user.avatar = "/static/avatars/custom.jpg"
+            await db.scalar(select(UserDB.id))
+            self.assertEqual(self.metrics.in_use, 1)
+            await db.commit()
+            self.assertEqual(self.metrics.in_use, 0)
+
+
+class TestReplicaSet(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        urls = [sqlite_file(f"{self.tmp.name}/replica{i}.db", f"replica{i}") for i in range(2)]
+        self.engines = [create_async_engine(url, poolclass=NullPool) for url in urls]
+
+    async def asyncTearDown(self):
+        for engine in self.engines:
+            await engine.dispose()
+        self.tmp.cleanup()
+
+    async def test_round_robin(self):
+        replicas = ReplicaSet(self.engines)
+        names = []
+        for _ in range(4):
+            async with replicas.session() as db:
+                names.append(await db.scalar(text("SELECT name FROM source")))
+        self.assertEqual(names, ["replica0", "replica1", "replica0", "replica1"])
+
+    async def test_lowest_latency(self):
+        replicas = ReplicaSet(self.engines, strategy="latency")
+        replicas.metrics[0].record_statement("SELECT 1", 0.050)
+        replicas.metrics[1].record_statement("SELECT 1", 0.002)
+        self.assertEqual([replicas.pick() for _ in range(3)], [1, 1, 1])
+        with self.assertRaises(ValueError):
+            ReplicaSet(self.engines, strategy="random")
+
+    async def test_failed_replica_left_out(self):
+        down = create_async_engine(f"sqlite+aiosqlite:///{self.tmp.name}/missing/replica.db", poolclass=NullPool)
+        for strategy in STRATEGIES:
+            replicas = ReplicaSet([down, self.engines[1]], strategy=strategy)
+            with self.assertLogs("src.db.routing", "WARNING"):
+                with self.assertRaises(OperationalError):
+                    async with replicas.session() as db:
+                        await db.scalar(text("SELECT name FROM source"))
+            self.assertEqual([replicas.pick() for _ in range(3)], [1, 1, 1])
+            # Tried again once the retry delay is over
+            replicas.down_until[0] = 0.0
+            self.assertIn(0, [replicas.pick() for _ in range(2)])
+        await down.dispose()
+
+    async def test_no_usable_replica(self):
+        replicas = ReplicaSet(self.engines[:1], retry_seconds=60)
+        with self.assertLogs("src.db.routing", "WARNING"):
+            replicas.mark_down(0)
+        self.assertIsNone(replicas.pick())
+        self.assertIsNone(replicas.session_factory())
+        with self.assertRaises(LookupError):
+            replicas.session()
+
+    async def test_replica_sessions_are_read_only(self):
+        async with ReplicaSet(self.engines).session() as db:
+            db.add(UserDB(username="deadpool", email="deadpool@example.com", password="x"))
+            with self.assertRaises(InvalidRequestError):
+                await db.commit()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,10 +8,10 @@ parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
 
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime, timedelta
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.models.models import ContactDB, UserDB
 from src.schemas.schemas import ContactCreate, ContactBase
@@ -28,7 +28,8 @@ from src.repository.contacts import (
 class TestContactRepository(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.session.add = MagicMock()
         self.user = UserDB(id=1)
 
     async def test_create_contact(self):
@@ -36,12 +37,12 @@ class TestContactRepository(unittest.IsolatedAsyncioTestCase):
         db_contact = await create_contact(contact_data, self.session, self.user)
 
         self.session.add.assert_called_once_with(db_contact)
-        self.session.commit.assert_called_once()
-        self.session.refresh.assert_called_once_with(db_contact)
+        self.session.commit.assert_awaited_once()
+        self.session.refresh.assert_awaited_once_with(db_contact)
 
     async def test_get_contacts(self):
         contacts = [ContactDB(), ContactDB(), ContactDB()]
-        self.session.query().filter().all.return_value = contacts
+        self.session.scalars.return_value = MagicMock(all=MagicMock(return_value=contacts))
 
         result = await get_contacts(self.session, self.user)
 
@@ -49,7 +50,7 @@ class TestContactRepository(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_contact_by_id(self):
         contact = ContactDB(id=1, user_id=self.user.id)
-        self.session.query().filter().first.return_value = contact
+        self.session.scalar.return_value = contact
 
         result = await get_contact_by_id(self.session, 1, self.user)
 
@@ -58,26 +59,26 @@ class TestContactRepository(unittest.IsolatedAsyncioTestCase):
     async def test_update_contact(self):
         contact_data = ContactCreate(first_name="Updated", last_name="User", email="updated@example.com", phone_number="000056789", birthday="2011-04-23", additional_data="2011-04-23")
         db_contact = ContactDB(id=1, user_id=self.user.id)
-        self.session.query().filter().first.return_value = db_contact
+        self.session.scalar.return_value = db_contact
 
         result = await update_contact(self.session, contact_data, db_contact, 1, self.user)
 
         self.assertEqual(result.first_name, "Updated")
-        self.session.commit.assert_called_once()
-        self.session.refresh.assert_called_once_with(db_contact)
+        self.session.commit.assert_awaited_once()
+        self.session.refresh.assert_awaited_once_with(db_contact)
 
     async def test_delete_contact(self):
         db_contact = ContactDB(id=1, user_id=self.user.id)
-        self.session.query().filter().first.return_value = db_contact
+        self.session.scalar.return_value = db_contact
 
         await delete_contact(self.session, db_contact, 1, self.user)
 
-        self.session.delete.assert_called_once_with(db_contact)
-        self.session.commit.assert_called_once()
+        self.session.delete.assert_awaited_once_with(db_contact)
+        self.session.commit.assert_awaited_once()
 
     async def test_search_contacts(self):
         contacts = [ContactDB(first_name="Test", last_name="User", email="test@example.com")]
-        self.session.query().filter().all.return_value = contacts
+        self.session.scalars.return_value = MagicMock(all=MagicMock(return_value=contacts))
 
         result = await search_contacts("test", self.session, self.user)
 
@@ -90,7 +91,7 @@ class TestContactRepository(unittest.IsolatedAsyncioTestCase):
             ContactDB(birthday=datetime(today.year, today.month, today.day)),
             ContactDB(birthday=datetime(next_week.year, next_week.month, next_week.day))
         ]
-        self.session.query().filter().all.return_value = contacts
+        self.session.scalars.return_value = MagicMock(all=MagicMock(return_value=contacts))
 
         result = await get_upcoming_birthdays(self.session, self.user)
 
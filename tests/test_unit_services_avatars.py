@@ -0,0 +1,83 @@
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import io
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from src.services import avatars
+from src.services.avatars import LocalAvatarStorage, resize_avatar, spool_upload, store_avatar
+
+
+def image_bytes(size=(640, 480), mode="RGB", fmt="PNG", color="red") -> bytes:
+    out = io.BytesIO()
+    Image.new(mode, size, color).save(out, format=fmt)
+    return out.getvalue()
+
+
+def upload(data: bytes, filename="avatar.png") -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+class TestAvatarPipeline(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = patch.object(avatars, "storage", LocalAvatarStorage(self.tmp.name, "/static/avatars/"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resize_crops_to_square_jpeg(self):
+        for mode in ("RGB", "RGBA", "P", "L"):
+            with tempfile.NamedTemporaryFile(suffix=".png") as f:
+                f.write(image_bytes(mode=mode, color=1 if mode in ("P", "L") else "red"))
+                f.flush()
+                with Image.open(io.BytesIO(resize_avatar(f.name))) as avatar:
+                    self.assertEqual(avatar.size, (250, 250))
+                    self.assertEqual(avatar.format, "JPEG")
+
+    async def test_spool_upload_hashes_content(self):
+        data = image_bytes()
+        path, digest = await spool_upload(upload(data), max_bytes=len(data))
+        try:
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), data)
+        finally:
+            os.remove(path)
+        self.assertEqual(len(digest), 64)
+
+    async def test_spool_upload_rejects_large_files(self):
+        with self.assertRaises(HTTPException) as error:
+            await spool_upload(upload(b"x" * 100), max_bytes=99)
+        self.assertEqual(error.exception.status_code, 413)
+
+    async def test_store_avatar_is_content_addressed(self):
+        data = image_bytes()
+        url = await store_avatar(upload(data))
+        self.assertTrue(url.startswith("/static/avatars/"))
+        stored = os.path.join(self.tmp.name, url.rsplit("/", 1)[1])
+        with Image.open(stored) as avatar:
+            self.assertEqual(avatar.size, (250, 250))
+
+        with patch.object(avatars, "resize_avatar", side_effect=AssertionError("resized twice")):
+            self.assertEqual(await store_avatar(upload(data, filename="copy.png")), url)
+        self.assertNotEqual(await store_avatar(upload(image_bytes(color="blue"))), url)
+        self.assertEqual(len([f for f in os.listdir(self.tmp.name) if f.endswith(".jpg")]), 2)
+
+    async def test_store_avatar_rejects_non_images(self):
+        with self.assertRaises(HTTPException) as error:
+            await store_avatar(upload(b"not an image", filename="avatar.txt"))
+        self.assertEqual(error.exception.status_code, 400)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
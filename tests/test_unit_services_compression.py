@@ -0,0 +1,136 @@
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import asyncio
+import gzip
+import json
+import unittest
+from unittest.mock import patch
+
+import brotli
+import zstandard
+from starlette.responses import Response, StreamingResponse
+
+from src.services import compression
+from src.services.compression import CompressionMiddleware
+
+PAYLOAD = json.dumps([{"first_name": "Wade", "last_name": "Wilson", "email": f"wade{i}@example.com"}
+                      for i in range(200)]).encode()
+
+DECODERS = {
+    "gzip": gzip.decompress,
+    "br": brotli.decompress,
+    "zstd": lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+}
+
+
+async def call(app, accept_encoding: str = "gzip, br, zstd"):
+    """
+    Send a GET request straight to an ASGI app and collect what it sends.
+    """
+    messages = []
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        # Streaming responses listen for a disconnect until they are done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    await app(scope, receive, send)
+    headers = {k.decode(): v.decode() for k, v in messages[0]["headers"]}
+    chunks = [m["body"] for m in messages[1:] if m.get("body")]
+    return headers, chunks
+
+
+class TestNegotiation(unittest.TestCase):
+
+    def setUp(self):
+        self.middleware = CompressionMiddleware(None)
+
+    def test_preference_and_quality(self):
+        self.assertEqual(self.middleware.negotiate("gzip, deflate, br, zstd"), "zstd")
+        self.assertEqual(self.middleware.negotiate("gzip, br;q=0.9"), "gzip")
+        self.assertEqual(self.middleware.negotiate("zstd;q=0, *"), "br")
+        self.assertEqual(self.middleware.negotiate("GZIP"), "gzip")
+
+    def test_no_acceptable_encoding(self):
+        self.assertIsNone(self.middleware.negotiate(""))
+        self.assertIsNone(self.middleware.negotiate("identity, deflate"))
+        self.assertIsNone(self.middleware.negotiate("*;q=0"))
+
+    def test_offered_encodings(self):
+        middleware = CompressionMiddleware(None, encodings=["gzip", "compress"])
+        self.assertEqual(middleware.encodings, ["gzip"])
+        self.assertEqual(middleware.negotiate("br, gzip;q=0.5"), "gzip")
+
+
+class TestCompressionMiddleware(unittest.IsolatedAsyncioTestCase):
+
+    async def test_large_body_compressed_with_each_encoding(self):
+        app = CompressionMiddleware(Response(PAYLOAD, media_type="application/json"))
+        for encoding, decompress in DECODERS.items():
+            headers, chunks = await call(app, encoding)
+            self.assertEqual(headers["content-encoding"], encoding)
+            self.assertEqual(headers["vary"], "Accept-Encoding")
+            self.assertEqual(int(headers["content-length"]), len(chunks[0]))
+            self.assertLess(len(chunks[0]), len(PAYLOAD) / 4)
+            self.assertEqual(decompress(chunks[0]), PAYLOAD)
+
+    async def test_small_or_binary_body_sent_as_is(self):
+        headers, _ = await call(CompressionMiddleware(Response(b'{"detail": "Not found"}', media_type="application/json")))
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(headers["vary"], "Accept-Encoding")
+        headers, _ = await call(CompressionMiddleware(Response(PAYLOAD, media_type="image/png")))
+        self.assertNotIn("content-encoding", headers)
+        encoded = Response(gzip.compress(PAYLOAD), headers={"Content-Encoding": "gzip"}, media_type="text/csv")
+        headers, chunks = await call(CompressionMiddleware(encoded))
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertEqual(gzip.decompress(chunks[0]), PAYLOAD)
+        headers, chunks = await call(CompressionMiddleware(Response(PAYLOAD, media_type="text/csv")), "identity")
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(chunks, [PAYLOAD])
+
+    async def test_stream_compressed_chunk_by_chunk(self):
+        async def rows():
+            for i in range(0, len(PAYLOAD), 2000):
+                yield PAYLOAD[i:i + 2000]
+
+        app = CompressionMiddleware(StreamingResponse(rows(), media_type="application/x-ndjson"), minimum_size=1000)
+        headers, chunks = await call(app, "gzip")
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertNotIn("content-length", headers)
+        self.assertGreater(len(chunks), 1)
+        # Every chunk is flushed, so the client can decode the stream as it arrives
+        decompressor = compression.zlib.decompressobj(16 + compression.zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(chunks[0]), PAYLOAD[:2000])
+        self.assertEqual(gzip.decompress(b"".join(chunks)), PAYLOAD)
+
+    async def test_short_stream_sent_as_is(self):
+        async def rows():
+            yield b"["
+            yield b"]"
+
+        headers, chunks = await call(CompressionMiddleware(StreamingResponse(rows(), media_type="application/json")))
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(b"".join(chunks), b"[]")
+
+    async def test_large_chunks_compressed_in_thread_pool(self):
+        app = CompressionMiddleware(Response(PAYLOAD, media_type="application/json"), offload_size=len(PAYLOAD))
+        with patch.object(compression, "get_executor", wraps=compression.get_executor) as get_executor:
+            await call(app, "br")
+            self.assertEqual(get_executor.call_count, 1)
+            app.offload_size = len(PAYLOAD) + 1
+            await call(app, "br")
+            self.assertEqual(get_executor.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+# tests/test_unit_services_contacts_io.py
+
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import csv
+import gzip
+import io
+import json
+import unittest
+from datetime import date
+
+from src.models.models import ContactDB
+from src.services.contacts_io import detect_format, read_contact_batches, encode_contacts
+
+CSV_HEADER = "first_name,last_name,email,phone_number,birthday,additional_data\n"
+
+
+async def collect(data: bytes, fmt: str, batch_size: int = 1000):
+    return [batch async for batch in read_contact_batches(io.BytesIO(data), fmt, batch_size)]
+
+
+class TestContactsImport(unittest.IsolatedAsyncioTestCase):
+
+    async def test_csv_rows_are_validated(self):
+        data = (CSV_HEADER + "Ann,Lee,ann@example.com,123,1990-02-03,\n"
+                "Bob,Ray,bob@example.com,456,not-a-date,note\n").encode()
+
+        [(valid, invalid)] = await collect(data, "csv")
+
+        self.assertEqual(valid[0][0], 1)
+        self.assertEqual(valid[0][1].birthday, date(1990, 2, 3))
+        self.assertIsNone(valid[0][1].additional_data)
+        self.assertEqual(invalid[0][0], 2)
+        self.assertIn("birthday", invalid[0][1])
+
+    async def test_csv_quoted_newline_and_bom(self):
+        data = ("\ufeff" + CSV_HEADER + 'Ann,Lee,ann@example.com,123,1990-02-03,"two\nlines"\n').encode()
+
+        [(valid, invalid)] = await collect(data, "csv")
+
+        self.assertEqual(valid[0][1].additional_data, "two\nlines")
+        self.assertEqual(invalid, [])
+
+    async def test_ndjson_reports_bad_lines(self):
+        data = (b'{"first_name": "Ann", "last_name": "Lee", "email": "a@example.com", "phone_number": "1", '
+                b'"birthday": "1990-02-03", "additional_data": null}\n\n[1, 2]\n{broken\n')
+
+        [(valid, invalid)] = await collect(data, "ndjson")
+
+        self.assertEqual(len(valid), 1)
+        self.assertEqual([row for row, _ in invalid], [3, 4])
+
+    async def test_batches(self):
+        data = (CSV_HEADER + "".join(f"A,B,{i}@example.com,1,1990-01-01,\n" for i in range(25))).encode()
+
+        batches = await collect(data, "csv", batch_size=10)
+
+        self.assertEqual([len(valid) for valid, _ in batches], [10, 10, 5])
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format("contacts.CSV", None), "csv")
+        self.assertEqual(detect_format("upload", "application/x-ndjson"), "ndjson")
+        self.assertIsNone(detect_format("contacts.txt", "text/plain"))
+
+
+async def batches_of(*batches):
+    for batch in batches:
+        yield batch
+
+
+async def export(fmt: str, *batches, compress: bool = False) -> bytes:
+    return b"".join([chunk async for chunk in encode_contacts(batches_of(*batches), fmt, compress=compress)])
+
+
+class TestContactsExport(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.contacts = [
+            ContactDB(first_name="Ann", last_name="Lee", email="ann@example.com", phone_number="123",
+                      birthday=date(1990, 2, 3), additional_data="likes, semicolons; and\nlines"),
+            ContactDB(first_name="Bob", last_name="Ray", email="bob@example.com", phone_number="456",
+                      birthday=date(1985, 7, 8), additional_data=None),
+        ]
+
+    async def test_csv_header_once(self):
+        data = await export("csv", self.contacts[:1], self.contacts[1:])
+
+        rows = list(csv.DictReader(io.StringIO(data.decode())))
+        self.assertEqual([row["email"] for row in rows], ["ann@example.com", "bob@example.com"])
+        self.assertEqual(rows[0]["additional_data"], "likes, semicolons; and\nlines")
+
+    async def test_csv_empty_export_has_header(self):
+        data = await export("csv")
+
+        self.assertTrue(data.startswith(b"first_name,last_name"))
+
+    async def test_ndjson_gzip_round_trip(self):
+        data = gzip.decompress(await export("ndjson", self.contacts, compress=True))
+
+        records = [json.loads(line) for line in data.decode().splitlines()]
+        self.assertEqual(records[1]["birthday"], "1985-07-08")
+
+    async def test_vcard_escaping(self):
+        data = (await export("vcard", self.contacts)).decode()
+
+        self.assertEqual(data.count("BEGIN:VCARD"), 2)
+        self.assertIn("NOTE:likes\\, semicolons\\; and\\nlines\r\n", data)
+        self.assertIn("BDAY:1990-02-03\r\n", data)
+
+
+if __name__ == "__main__":
+    unittest.main()
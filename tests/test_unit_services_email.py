@@ -0,0 +1,207 @@
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import asyncio
+import json
+import socket
+from email import message_from_bytes
+from email.policy import default
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+from aiosmtpd.controller import Controller
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from src.services import redis_client
+from src.services.email import send_email
+from src.services.email_queue import DEAD_KEY, QUEUE_KEY, RETRY_KEY, EmailQueue, encode_message, processing_key
+from src.services.email_worker import EmailWorker
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Mailbox:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((session.peer, envelope))
+        return "250 Message accepted for delivery"
+
+
+class TestEmailDelivery(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer())
+        redis_client.set_redis(self.redis)
+        self.queue = EmailQueue(self.redis, max_attempts=3, retry_base=10, retry_max=60)
+        self.port = free_port()
+        self.mailbox = Mailbox()
+        self.start_server()
+        self.worker = EmailWorker(self.queue, "test", hostname="127.0.0.1", port=self.port,
+                                  sender="ContactsApp <noreply@example.com>", batch_size=10, timeout=5)
+
+    def start_server(self):
+        self.controller = Controller(self.mailbox, hostname="127.0.0.1", port=self.port)
+        self.controller.start()
+
+    async def asyncTearDown(self):
+        await self.worker.close()
+        if self.controller is not None:
+            self.controller.stop()
+        redis_client.set_redis(None)
+
+    async def test_send_email_queues_confirmation(self):
+        await send_email("deadpool@example.com", "deadpool", "http://testserver/")
+        message = json.loads(await self.redis.lindex(QUEUE_KEY, 0))
+        self.assertEqual(message["to"], "deadpool@example.com")
+        self.assertEqual(message["template"], "email_template.html")
+        self.assertIsInstance(message["body"]["token"], str)
+        self.assertEqual(self.mailbox.messages, [])
+
+        self.assertEqual(await self.worker.run_once(timeout=0.1), 1)
+        self.assertEqual(len(self.mailbox.messages), 1)
+        _, envelope = self.mailbox.messages[0]
+        self.assertEqual(envelope.rcpt_tos, ["deadpool@example.com"])
+        content = message_from_bytes(envelope.content, policy=default).get_content()
+        self.assertIn(f"http://testserver//auth/confirmed_email/{message['body']['token']}", content)
+
+    async def test_batch_shares_one_connection(self):
+        for i in range(5):
+            await self.queue.put(encode_message("email_template.html", f"user{i}@example.com", "Hi",
+                                                {"host": "http://testserver", "username": f"user{i}", "token": "t"}))
+        self.assertEqual(await self.worker.run_once(timeout=0.1), 5)
+        self.assertEqual(len(self.mailbox.messages), 5)
+        self.assertEqual(len({peer for peer, _ in self.mailbox.messages}), 1)
+        self.assertEqual(self.worker.connections, 1)
+        self.assertEqual(await self.redis.llen(processing_key("test")), 0)
+
+    async def test_failed_delivery_is_retried_with_backoff(self):
+        self.controller.stop()
+        self.controller = None
+        await self.queue.put(encode_message("email_template.html", "deadpool@example.com", "Hi",
+                                            {"host": "h", "username": "u", "token": "t"}))
+        await self.worker.run_once(timeout=0.1)
+        self.assertEqual(await self.queue.size(), {"queued": 0, "retrying": 1, "dead": 0})
+        self.assertEqual(await self.redis.llen(processing_key("test")), 0)
+
+        self.start_server()
+        await self.worker.run_once(timeout=0.1)
+        self.assertEqual(self.mailbox.messages, [])
+
+        with patch("src.services.email_queue.time.time", return_value=10 ** 10):
+            self.assertEqual(await self.worker.run_once(timeout=0.1), 1)
+        self.assertEqual(len(self.mailbox.messages), 1)
+        self.assertEqual(await self.queue.size(), {"queued": 0, "retrying": 0, "dead": 0})
+
+    async def test_gives_up_after_max_attempts(self):
+        await self.queue.put(encode_message("email_template.html", "deadpool@example.com", "Hi", {}))
+        self.controller.stop()
+        self.controller = None
+        self.worker.queue = EmailQueue(self.redis, max_attempts=3, retry_base=0, retry_max=0)
+        for _ in range(3):
+            await self.worker.run_once(timeout=0.1)
+        self.assertEqual(await self.queue.size(), {"queued": 0, "retrying": 0, "dead": 1})
+        self.assertEqual(json.loads(await self.redis.lindex(DEAD_KEY, 0))["attempts"], 3)
+
+    async def run_until_delivered(self, take_errors=(), recover_errors=()):
+        """Run the worker until the mailbox has a message, raising the given errors first."""
+        take_errors, recover_errors = list(take_errors), list(recover_errors)
+        take, recover = self.queue.take, self.queue.recover
+
+        async def flaky_take(name, count, timeout):
+            if take_errors:
+                raise take_errors.pop()
+            messages = await take(name, count, 0.01)
+            if not messages:
+                # fakeredis does not block, which would keep the worker from yielding
+                await asyncio.sleep(0.01)
+            return messages
+
+        async def flaky_recover(name):
+            if recover_errors:
+                raise recover_errors.pop()
+            return await recover(name)
+
+        with patch.object(self.queue, "take", side_effect=flaky_take), \
+                patch.object(self.queue, "recover", side_effect=flaky_recover), \
+                self.assertLogs("src.services.email_worker", "INFO") as logs:
+            task = asyncio.create_task(self.worker.run(retry_delay=0.01))
+            for _ in range(100):
+                if self.mailbox.messages:
+                    break
+                await asyncio.sleep(0.05)
+            self.assertFalse(task.done())
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        return [record for record in logs.records if record.levelname == "WARNING"]
+
+    async def test_worker_survives_redis_timeouts(self):
+        await self.queue.put(encode_message("email_template.html", "user@example.com", "Hi",
+                                            {"host": "http://testserver", "username": "user", "token": "t"}))
+        warnings = await self.run_until_delivered(
+            take_errors=[RedisTimeoutError("Timeout reading from socket") for _ in range(2)])
+        self.assertEqual(len(self.mailbox.messages), 1)
+        self.assertEqual(len(warnings), 2)
+
+    async def test_worker_starts_while_redis_unavailable(self):
+        await self.queue.put(encode_message("email_template.html", "user@example.com", "Hi",
+                                            {"host": "http://testserver", "username": "user", "token": "t"}))
+        # Left unsettled by a previous run of the worker
+        await self.queue.take("test", 10, 0.1)
+        warnings = await self.run_until_delivered(
+            recover_errors=[RedisConnectionError("Error 111 connecting to redis:6379")])
+        self.assertEqual(len(self.mailbox.messages), 1)
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(await self.redis.llen(processing_key("test")), 0)
+
+    async def test_worker_stops_when_cancelled_during_take(self):
+        async def take(name, count, timeout):
+            try:
+                await asyncio.sleep(timeout)
+            except asyncio.CancelledError:
+                # As redis-py may do when cancelled while reading a reply
+                raise RedisTimeoutError("Timeout reading from socket")
+            return []
+
+        async def swallowing_take(name, count, timeout):
+            try:
+                await asyncio.sleep(timeout)
+            except asyncio.CancelledError:
+                # As fakeredis does with a cancelled BLMOVE
+                pass
+            return []
+
+        for side_effect in (take, swallowing_take):
+            with patch.object(self.queue, "take", side_effect=side_effect):
+                task = asyncio.create_task(self.worker.run(retry_delay=0.01))
+                await asyncio.sleep(0.1)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await asyncio.wait_for(task, timeout=5)
+
+    async def test_retry_delay_doubles_up_to_max(self):
+        self.assertEqual([self.queue.retry_delay(n) for n in range(1, 6)], [10, 20, 40, 60, 60])
+
+    async def test_recover_unsettled_messages(self):
+        for i in range(2):
+            await self.queue.put(encode_message("email_template.html", f"user{i}@example.com", "Hi", {}))
+        await self.queue.take("test", 10, 0.1)
+        self.assertEqual(await self.redis.llen(QUEUE_KEY), 0)
+        self.assertEqual(await self.queue.recover("test"), 2)
+        taken = await self.queue.take("other", 10, 0.1)
+        self.assertEqual([json.loads(m)["to"] for m in taken], ["user0@example.com", "user1@example.com"])
+        self.assertEqual(await self.redis.zcard(RETRY_KEY), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
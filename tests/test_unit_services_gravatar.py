@@ -0,0 +1,115 @@
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import httpx
+from libgravatar import Gravatar
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.conf.config import settings
+from src.models.models import Base, UserDB
+from src.services import gravatar
+
+
+class TestGravatar(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{self.tmp.name}/gravatar.db", poolclass=NullPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+        for patcher in (patch.object(gravatar, "SessionLocal", self.sessions),
+                        patch.object(gravatar, "cache", gravatar.TTLCache(maxsize=100, ttl=60))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.requests = []
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        self.tmp.cleanup()
+
+    def client(self, missing=()) -> httpx.AsyncClient:
+        def handler(request):
+            self.requests.append(request)
+            if request.url.path.rsplit("/", 1)[-1] in missing:
+                return httpx.Response(404)
+            return httpx.Response(200)
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def add_users(self, *emails, avatar=None):
+        async with self.sessions() as db:
+            db.add_all([UserDB(username=e.split("@")[0], email=e, password="x", avatar=avatar) for e in emails])
+            await db.commit()
+
+    async def avatars(self) -> dict:
+        async with self.sessions() as db:
+            return dict((await db.execute(select(UserDB.email, UserDB.avatar))).all())
+
+    async def test_resolution_is_cached_by_hash(self):
+        url = await gravatar.resolve_gravatar("Deadpool@Example.com ")
+        self.assertEqual(url, Gravatar("deadpool@example.com").get_image())
+        with patch.object(Gravatar, "get_image") as get_image:
+            self.assertEqual(await gravatar.resolve_gravatar("deadpool@example.com"), url)
+        get_image.assert_not_called()
+
+    async def test_verification_caches_missing_gravatars(self):
+        missing = Gravatar("nobody@example.com").email_hash
+        with patch.object(settings, "gravatar_verify", True):
+            async with self.client(missing={missing}) as client:
+                self.assertIsNone(await gravatar.resolve_gravatar("nobody@example.com", client))
+                self.assertIsNone(await gravatar.resolve_gravatar("nobody@example.com", client))
+                self.assertIsNotNone(await gravatar.resolve_gravatar("deadpool@example.com", client))
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.requests[0].method, "HEAD")
+        self.assertEqual(self.requests[0].url.params["default"], "404")
+
+    async def test_assign_keeps_existing_avatar(self):
+        await self.add_users("deadpool@example.com")
+        await self.add_users("wolverine@example.com", avatar="/static/avatars/custom.jpg")
+        await gravatar.assign_gravatar("deadpool@example.com")
+        await gravatar.assign_gravatar("wolverine@example.com")
+        avatars = await self.avatars()
+        self.assertEqual(avatars["deadpool@example.com"], Gravatar("deadpool@example.com").get_image())
+        self.assertEqual(avatars["wolverine@example.com"], "/static/avatars/custom.jpg")
+
+    async def test_assign_logs_unreachable_gravatar(self):
+        await self.add_users("deadpool@example.com")
+
+        def unreachable(request):
+            raise httpx.ConnectError("unreachable", request=request)
+
+        client = httpx.AsyncClient
+        with patch.object(settings, "gravatar_verify", True), \
+                patch.object(httpx, "AsyncClient", lambda **kw: client(transport=httpx.MockTransport(unreachable))), \
+                self.assertLogs(gravatar.logger, "WARNING"):
+            await gravatar.assign_gravatar("deadpool@example.com")
+        self.assertIsNone((await self.avatars())["deadpool@example.com"])
+
+    async def test_backfill_fills_missing_avatars_in_batches(self):
+        emails = [f"user{i}@example.com" for i in range(7)]
+        await self.add_users(*emails)
+        await self.add_users("custom@example.com", avatar="/static/avatars/custom.jpg")
+        missing = Gravatar(emails[0]).email_hash
+        with patch.object(settings, "gravatar_verify", True):
+            async with self.client(missing={missing}) as client:
+                updated = await gravatar.backfill(batch_size=3, concurrency=2, client=client)
+        self.assertEqual(updated, 6)
+        avatars = await self.avatars()
+        self.assertIsNone(avatars[emails[0]])
+        for email in emails[1:]:
+            self.assertEqual(avatars[email], Gravatar(email).get_image())
+        self.assertEqual(avatars["custom@example.com"], "/static/avatars/custom.jpg")
+        self.assertEqual(len(self.requests), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from main import app as main_app
+from src.conf.config import settings
+from src.db.metrics import DatabaseMetrics
+from src.services import redis_client
+from src.services.instrumentation import HTTPMetrics, InstrumentationMiddleware, statement_shape
+from src.services.metrics import Histogram, PrometheusText
+
+
+class TestPrometheusText(unittest.TestCase):
+
+    def test_samples_grouped_by_metric(self):
+        page = PrometheusText()
+        page.counter("requests_total", "Requests.", 3, route="/a")
+        page.gauge("in_flight", "In flight.", 1)
+        page.counter("requests_total", "Requests.", 2, route='say "hi"\n')
+        self.assertEqual(page.render(), (
+            "# HELP requests_total Requests.\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{route="/a"} 3\n'
+            'requests_total{route="say \\"hi\\"\\n"} 2\n'
+            "# HELP in_flight In flight.\n"
+            "# TYPE in_flight gauge\n"
+            "in_flight 1\n"
+        ))
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value)
+        page = PrometheusText()
+        page.histogram("latency_seconds", "Latency.", histogram, route="/a")
+        self.assertEqual(page.render().splitlines()[2:], [
+            'latency_seconds_bucket{route="/a",le="0.1"} 1',
+            'latency_seconds_bucket{route="/a",le="1"} 3',
+            'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+            'latency_seconds_sum{route="/a"} 4.05',
+            'latency_seconds_count{route="/a"} 4',
+        ])
+
+
+class TestInstrumentationMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{self.tmp.name}/metrics.db", poolclass=NullPool)
+        DatabaseMetrics(slow_query_ms=0).instrument(engine)
+        redis_client.set_redis(fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer()))
+        self.addCleanup(redis_client.set_redis, None)
+
+        app = FastAPI()
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: int):
+            if item_id == 0:
+                raise HTTPException(status_code=404)
+            redis = redis_client.get_redis()
+            await redis.get("item")
+            async with redis.pipeline() as pipe:
+                await pipe.set("a", 1).set("b", 2).execute()
+            async with engine.connect() as conn:
+                for _ in range(item_id):
+                    await conn.execute(text("SELECT 1"))
+            return item_id
+
+        self.metrics = HTTPMetrics()
+        app.add_middleware(InstrumentationMiddleware, metrics=self.metrics)
+        self.client = TestClient(app)
+
+    def test_requests_recorded_per_route(self):
+        self.client.get("/items/3")
+        self.client.get("/items/5")
+        self.client.get("/items/0")
+        self.client.get("/missing")
+        key = ("GET", "/items/{item_id}")
+        self.assertEqual(self.metrics.responses[key + (200,)], 2)
+        self.assertEqual(self.metrics.responses[key + (404,)], 1)
+        self.assertEqual(self.metrics.responses[("GET", "<other>", 404)], 1)
+        self.assertEqual(self.metrics.duration[key].count, 3)
+        self.assertEqual(self.metrics.in_flight["GET"], 0)
+        # A command and a pipeline for the found items
+        self.assertEqual(self.metrics.redis_calls[key].sum, 4)
+        self.assertEqual(self.metrics.db_statements[key].sum, 8)
+        self.assertEqual(self.metrics.db_statements[key].max, 5)
+
+
+class TestQueryDebugging(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{self.tmp.name}/metrics.db", poolclass=NullPool)
+        DatabaseMetrics(slow_query_ms=0).instrument(engine)
+
+        app = FastAPI()
+
+        @app.get("/contacts/{count}")
+        async def contacts(count: int):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1 WHERE 1 IN (:a, :b, :c)"), {"a": 1, "b": 2, "c": 3})
+                # One query per contact, as lazy loads in a loop would do
+                for i in range(count):
+                    await conn.execute(text("SELECT :id"), {"id": i})
+            return count
+
+        self.metrics = HTTPMetrics()
+        app.add_middleware(InstrumentationMiddleware, metrics=self.metrics, debug_queries=True, n_plus_one_threshold=3)
+        self.client = TestClient(app)
+
+    def test_statement_shape(self):
+        self.assertEqual(statement_shape("SELECT id FROM contacts\nWHERE id IN (?, ?, ?)"),
+                         "SELECT id FROM contacts WHERE id IN (?)")
+        self.assertEqual(statement_shape("SELECT * FROM users WHERE id IN ($1, $2) AND age = $3"),
+                         "SELECT * FROM users WHERE id IN (?) AND age = $3")
+
+    def test_queries_reported_in_headers_and_logs(self):
+        with self.assertLogs("src.db.queries", "INFO") as logs:
+            response = self.client.get("/contacts/3")
+        self.assertEqual(response.headers["X-DB-Queries"], "4")
+        self.assertRegex(response.headers["Server-Timing"], r'^db;dur=\d+\.\d;desc="4 queries"$')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("GET /contacts/{count} 200: 4 queries in", logs.output[0])
+        self.assertEqual(self.metrics.n_plus_one, {})
+
+    def test_repeated_statement_flagged(self):
+        with self.assertLogs("src.db.queries", "WARNING") as logs:
+            self.client.get("/contacts/10")
+        self.assertEqual(logs.output, ["WARNING:src.db.queries:Likely N+1 query in GET /contacts/{count}, "
+                                       "run 10 times: SELECT ?"])
+        self.assertEqual(self.metrics.n_plus_one, {("GET", "/contacts/{count}"): 1})
+
+
+class TestPrometheusRoute(unittest.TestCase):
+
+    def test_metrics_page(self):
+        client = TestClient(main_app)
+        client.get("/")
+        with patch.object(settings, "metrics_token", "secret"):
+            response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn('http_requests_total{method="GET",route="/",status="200"}', response.text)
+        self.assertIn("# TYPE http_request_duration_seconds histogram", response.text)
+        self.assertIn('db_pool_checked_out{engine="primary"}', response.text)
+        self.assertIn("rate_limit_rejected_total", response.text)
+        self.assertIn('user_cache_lookups_total{result="miss"}', response.text)
+
+    def test_metrics_page_off_by_default(self):
+        client = TestClient(main_app)
+        self.assertEqual(client.get("/metrics").status_code, 404)
+        with patch.object(settings, "metrics_token", "secret"):
+            self.assertEqual(client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code, 401)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import asyncio
+import tempfile
+import time
+import unittest
+
+import httpx
+from fastapi import FastAPI
+
+from src.services.profiling import PROFILE_SUFFIX, ProfilerMiddleware
+
+
+def crunch(seconds: float) -> int:
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+app = FastAPI()
+
+
+@app.get("/busy")
+async def busy():
+    return crunch(0.05)
+
+
+@app.get("/idle")
+async def idle():
+    await asyncio.sleep(0.1)
+    return "done"
+
+
+class TestProfilerMiddleware(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.middleware = ProfilerMiddleware(app, directory=self.tmp.name, token="s3cret", interval=0.001)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.middleware), base_url="http://test")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        self.tmp.cleanup()
+
+    def profiles(self) -> list[str]:
+        return sorted(name for name in os.listdir(self.tmp.name) if name.endswith(PROFILE_SUFFIX))
+
+    async def test_profile_requested_by_admin(self):
+        response = await self.client.get("/busy", headers={"X-Profile": "s3cret"})
+        self.assertEqual(self.profiles(), [response.headers["X-Profile-Id"] + PROFILE_SUFFIX])
+        with open(os.path.join(self.tmp.name, self.profiles()[0])) as file:
+            lines = file.read().splitlines()
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 5)
+        # Frames run from the request down to where the samples were taken
+        self.assertIn(";__call__ (profiling.py:", stack)
+        self.assertIn(";busy (test_unit_services_profiling.py:", stack)
+        self.assertIn(";crunch (test_unit_services_profiling.py:", stack)
+
+    async def test_other_requests_not_profiled(self):
+        await self.client.get("/busy")
+        response = await self.client.get("/busy", headers={"X-Profile": "guess"})
+        self.assertNotIn("X-Profile-Id", response.headers)
+        self.assertEqual(self.profiles(), [])
+
+    async def test_sampled_requests(self):
+        self.middleware.sample_rate = 1.0
+        response = await self.client.get("/busy")
+        self.assertNotIn("X-Profile-Id", response.headers)
+        self.assertEqual(len(self.profiles()), 1)
+
+    async def test_concurrent_requests_left_out(self):
+        await asyncio.gather(self.client.get("/idle", headers={"X-Profile": "s3cret"}),
+                             self.client.get("/busy"))
+        with open(os.path.join(self.tmp.name, self.profiles()[0])) as file:
+            self.assertNotIn("crunch", file.read())
+
+    async def test_retention(self):
+        now = time.time()
+        for i, age in enumerate((10, 20, 30, 8 * 24 * 3600)):
+            path = os.path.join(self.tmp.name, f"old{i}{PROFILE_SUFFIX}")
+            open(path, "w").close()
+            os.utime(path, (now - age, now - age))
+        open(os.path.join(self.tmp.name, "notes.txt"), "w").close()
+        self.middleware.max_files = 3
+        await self.client.get("/busy", headers={"X-Profile": "s3cret"})
+        self.assertEqual(len(self.profiles()), 3)
+        self.assertIn(f"old0{PROFILE_SUFFIX}", self.profiles())
+        self.assertNotIn(f"old2{PROFILE_SUFFIX}", self.profiles())
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, "notes.txt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+from jose import JWTError
+
+from src.services import redis_client
+from src.services import rate_limit
+from src.services.rate_limit import RateLimiter, TokenBuckets
+
+
+class TestTokenBuckets(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer())
+        redis_client.set_redis(self.redis)
+
+    async def asyncTearDown(self):
+        redis_client.set_redis(None)
+
+    async def test_reserves_in_batches(self):
+        buckets = TokenBuckets(batch_fraction=0.1, lease=5, maxsize=100, fail_open=True)
+        for _ in range(25):
+            self.assertEqual(await buckets.acquire("k", times=100, seconds=60), 0)
+        self.assertEqual(buckets.reservations, 3)
+
+    async def test_script_registered_once(self):
+        buckets = TokenBuckets(batch_fraction=0.1, lease=5, maxsize=100, fail_open=True)
+        with patch.object(self.redis, "register_script", wraps=self.redis.register_script) as register:
+            for key in ("a", "b", "c"):
+                await buckets.acquire(key, times=10, seconds=60)
+        self.assertEqual(buckets.reservations, 3)
+        self.assertEqual(register.call_count, 1)
+
+    async def test_limit_is_shared_between_processes(self):
+        first = TokenBuckets(batch_fraction=0.5, lease=5, maxsize=100, fail_open=True)
+        second = TokenBuckets(batch_fraction=0.5, lease=5, maxsize=100, fail_open=True)
+        results = [await buckets.acquire("k", times=4, seconds=60) for buckets in (first, second, first, second)]
+        self.assertEqual(results, [0, 0, 0, 0])
+        retry_after = await first.acquire("k", times=4, seconds=60)
+        self.assertGreater(retry_after, 0)
+        self.assertLessEqual(retry_after, 15)
+        self.assertGreater(await second.acquire("k", times=4, seconds=60), 0)
+        self.assertEqual(first.rejected + second.rejected, 2)
+
+    async def test_degrades_open_to_per_process_limit(self):
+        redis_client.set_redis(None)
+        buckets = TokenBuckets(batch_fraction=0.1, lease=5, maxsize=100, fail_open=True)
+        results = [await buckets.acquire("k", times=3, seconds=60) for _ in range(4)]
+        self.assertEqual(results[:3], [0, 0, 0])
+        self.assertGreater(results[3], 0)
+        self.assertEqual(buckets.degraded, 1)
+
+    async def test_degrades_closed(self):
+        redis_client.set_redis(None)
+        buckets = TokenBuckets(batch_fraction=0.1, lease=5, maxsize=100, fail_open=False)
+        with self.assertRaises(HTTPException) as error:
+            await buckets.acquire("k", times=3, seconds=60)
+        self.assertEqual(error.exception.status_code, 503)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        redis_client.set_redis(fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer()))
+        self.buckets = TokenBuckets(batch_fraction=0.1, lease=5, maxsize=100, fail_open=True)
+        patcher = patch.object(rate_limit, "buckets", self.buckets)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(redis_client.set_redis, None)
+
+        app = FastAPI()
+
+        @app.get("/limited", dependencies=[Depends(RateLimiter(times=2, seconds=60))])
+        async def limited():
+            return "ok"
+
+        self.client = TestClient(app)
+
+    def decode(self, token):
+        if token.startswith("user-"):
+            return {"sub": token[5:]}
+        raise JWTError("invalid")
+
+    def test_limits_per_user(self):
+        with patch.object(rate_limit.auth_service, "decode_access_token", side_effect=self.decode):
+            for _ in range(2):
+                self.assertEqual(self.client.get("/limited", headers={"Authorization": "Bearer user-a"}).status_code,
+                                 200)
+            response = self.client.get("/limited", headers={"Authorization": "Bearer user-a"})
+            self.assertEqual(response.status_code, 429)
+            self.assertTrue(int(response.headers["Retry-After"]) >= 1)
+            self.assertEqual(self.client.get("/limited", headers={"Authorization": "Bearer user-b"}).status_code,
+                             200)
+
+    def test_anonymous_requests_are_limited_per_ip(self):
+        with patch.object(rate_limit.auth_service, "decode_access_token", side_effect=self.decode):
+            statuses = [self.client.get("/limited", headers={"Authorization": "Bearer forged"}).status_code
+                        for _ in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+            # The header is ignored from a peer that is not a trusted proxy
+            self.assertEqual(self.client.get("/limited", headers={"X-Forwarded-For": "10.0.0.2"}).status_code, 429)
+
+    def test_limits_turned_off(self):
+        with patch.object(rate_limit.settings, "rate_limit_enabled", False):
+            statuses = [self.client.get("/limited").status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 200])
+
+
+class TestClientIp(unittest.TestCase):
+
+    def request(self, peer, forwarded=None):
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return Request({"type": "http", "client": (peer, 50000), "headers": headers})
+
+    def test_forwarded_header_ignored_by_default(self):
+        self.assertEqual(rate_limit.client_ip(self.request("203.0.113.7", "10.0.0.2")), "203.0.113.7")
+
+    def test_forwarded_address_from_trusted_proxy(self):
+        with patch.object(rate_limit.settings, "trusted_proxies", ["10.1.0.0/16", "192.0.2.1"]):
+            self.assertEqual(rate_limit.client_ip(self.request("192.0.2.1", "10.0.0.2, 10.1.0.5")), "10.0.0.2")
+            # A client prepending an address of its own is still identified by the hop before the proxies
+            self.assertEqual(rate_limit.client_ip(self.request("192.0.2.1", "10.0.0.3, 10.0.0.2, 10.1.0.5")),
+                             "10.0.0.2")
+            self.assertEqual(rate_limit.client_ip(self.request("203.0.113.7", "10.0.0.2")), "203.0.113.7")
+            self.assertEqual(rate_limit.client_ip(self.request("192.0.2.1")), "192.0.2.1")
+
+
+if __name__ == "__main__":
+    unittest.main()
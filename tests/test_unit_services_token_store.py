@@ -0,0 +1,105 @@
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+from fastapi import HTTPException
+
+from src.services import redis_client
+from src.services.token_store import RefreshTokenStore
+
+EMAIL = "deadpool@example.com"
+
+
+class TestRefreshTokenStore(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer())
+        redis_client.set_redis(self.redis)
+        self.store = RefreshTokenStore(ttl=3600, max_sessions=3)
+
+    async def asyncTearDown(self):
+        redis_client.set_redis(None)
+
+    async def test_issue_sets_ttl(self):
+        claims = await self.store.issue(EMAIL)
+        self.assertEqual(await self.redis.hget(f"refresh:family:{claims['fam']}", "jti"), claims["jti"].encode())
+        self.assertTrue(0 < await self.redis.ttl(f"refresh:family:{claims['fam']}") <= 3600)
+        self.assertEqual(await self.store.sessions(EMAIL), 1)
+
+    async def test_rotation_and_reuse(self):
+        first = dict(await self.store.issue(EMAIL), sub=EMAIL)
+        second = dict(await self.store.rotate(first), sub=EMAIL)
+        self.assertEqual(second["fam"], first["fam"])
+        self.assertNotEqual(second["jti"], first["jti"])
+
+        with self.assertRaises(HTTPException) as error:
+            await self.store.rotate(first)
+        self.assertEqual(error.exception.status_code, 401)
+        self.assertEqual(self.store.reuse_detected, 1)
+        with self.assertRaises(HTTPException):
+            await self.store.rotate(second)
+        self.assertEqual(await self.store.sessions(EMAIL), 0)
+
+    async def test_oldest_sessions_are_dropped(self):
+        families = [(await self.store.issue(EMAIL))["fam"] for _ in range(5)]
+        self.assertEqual(await self.store.sessions(EMAIL), 3)
+        for family in families[:2]:
+            self.assertFalse(await self.redis.exists(f"refresh:family:{family}"))
+        for family in families[2:]:
+            self.assertTrue(await self.redis.exists(f"refresh:family:{family}"))
+
+    async def test_revoke(self):
+        current = dict(await self.store.issue(EMAIL), sub=EMAIL)
+        await self.store.revoke(current)
+        self.assertEqual(await self.store.sessions(EMAIL), 0)
+        self.assertEqual(self.store.reuse_detected, 0)
+
+    async def test_revoke_with_replaced_token_counts_reuse(self):
+        first = dict(await self.store.issue(EMAIL), sub=EMAIL)
+        second = dict(await self.store.rotate(first), sub=EMAIL)
+        await self.store.revoke(first)
+        self.assertEqual(self.store.reuse_detected, 1)
+        self.assertEqual(await self.store.sessions(EMAIL), 0)
+        with self.assertRaises(HTTPException):
+            await self.store.rotate(second)
+
+    async def test_scripts_registered_once(self):
+        with patch.object(self.redis, "register_script", wraps=self.redis.register_script) as register:
+            claims = dict(await self.store.issue(EMAIL), sub=EMAIL)
+            claims = dict(await self.store.rotate(claims), sub=EMAIL)
+            await self.store.rotate(claims)
+            await self.store.issue(EMAIL)
+        self.assertEqual(register.call_count, 3)
+
+    async def test_revoke_all(self):
+        claims = [dict(await self.store.issue(EMAIL), sub=EMAIL) for _ in range(2)]
+        await self.store.revoke_all(EMAIL)
+        for claim in claims:
+            with self.assertRaises(HTTPException):
+                await self.store.rotate(claim)
+
+    async def test_unavailable_without_redis(self):
+        redis_client.set_redis(None)
+        with self.assertRaises(HTTPException) as error:
+            await self.store.issue(EMAIL)
+        self.assertEqual(error.exception.status_code, 503)
+
+    async def test_unavailable_hides_redis_error(self):
+        error = ConnectionError("Error 111 connecting to redis.internal:6379. Connection refused.")
+        with patch.object(self.redis, "evalsha", side_effect=error), \
+                self.assertLogs("src.services.token_store", "WARNING") as logs:
+            with self.assertRaises(HTTPException) as raised:
+                await self.store.issue(EMAIL)
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(raised.exception.detail, "Session store unavailable")
+        self.assertIn("redis.internal:6379", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+import sys
+import os
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+import asyncio
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import fakeredis
+import redis.asyncio as redis
+from redis.exceptions import ConnectionError
+
+from src.models.models import UserDB
+from src.services import redis_client
+from src.services.cache import TTLCache
+from src.services.user_cache import UserCache, dump_user, load_user
+
+
+def bulk(item: str) -> bytes:
+    return f"${len(item)}\r\n{item}\r\n".encode()
+
+
+class SilentRedis:
+    """A Redis server that confirms subscriptions, then stays silent until told to publish."""
+
+    async def start(self):
+        self.writers = []
+        self.subscriptions = 0
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for writer in self.writers:
+            writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.writers.append(writer)
+        while line := await reader.readline():
+            command = [(await reader.readexactly(int((await reader.readline())[1:]) + 2))[:-2].decode()
+                       for _ in range(int(line[1:]))]
+            if command[0].upper() == "SUBSCRIBE":
+                self.subscriptions += 1
+                writer.write(b"*3\r\n" + bulk("subscribe") + bulk(command[1]) + b":1\r\n")
+            elif command[0].upper() == "PING":
+                writer.write(b"*2\r\n" + bulk("pong") + bulk(""))
+            else:
+                writer.write(b"+OK\r\n")
+            await writer.drain()
+
+    def publish(self, channel: str, data: str):
+        for writer in self.writers:
+            writer.write(b"*3\r\n" + bulk("message") + bulk(channel) + bulk(data))
+
+
+def make_user(**kwargs):
+    values = dict(id=1, username="deadpool", email="deadpool@example.com", password="secret",
+                  created_at=datetime(2024, 3, 1, 12, 30), avatar="avatar.png", confirmed=True)
+    values.update(kwargs)
+    return UserDB(**values)
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_expires_entries(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        with patch("src.services.cache.time.monotonic", return_value=100.0):
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=5)
+        with patch("src.services.cache.time.monotonic", return_value=110.0):
+            self.assertEqual(cache.get("a"), 1)
+            self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.hit_ratio, 0.5)
+
+
+class TestUserSerialization(unittest.TestCase):
+
+    def test_round_trip_keeps_columns_without_secrets(self):
+        user = load_user(dump_user(make_user()))
+        self.assertEqual(user.id, 1)
+        self.assertEqual(user.email, "deadpool@example.com")
+        self.assertEqual(user.created_at, datetime(2024, 3, 1, 12, 30))
+        self.assertTrue(user.confirmed)
+        self.assertIsNone(user.password)
+
+    def test_dump_is_plain_json(self):
+        raw = dump_user(make_user())
+        self.assertTrue(raw.startswith(b"{"))
+        self.assertNotIn(b"secret", raw)
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeAsyncRedis(server=self.server)
+        redis_client.set_redis(self.redis)
+        self.cache = UserCache(local_ttl=60, redis_ttl=900, maxsize=100)
+
+    async def asyncTearDown(self):
+        redis_client.set_redis(None)
+
+    async def test_miss_then_local_hit(self):
+        self.assertIsNone(await self.cache.get("deadpool@example.com"))
+        await self.cache.set(make_user())
+        user = await self.cache.get("deadpool@example.com")
+        self.assertEqual(user.username, "deadpool")
+        self.assertEqual(self.cache.local.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    async def test_redis_hit_fills_local_tier(self):
+        await self.cache.set(make_user())
+        self.assertLessEqual(await self.redis.ttl("user:deadpool@example.com"), 900)
+        other = UserCache(local_ttl=60, redis_ttl=900, maxsize=100)
+        user = await other.get("deadpool@example.com")
+        self.assertEqual(user.id, 1)
+        self.assertEqual(other.redis_hits, 1)
+        self.assertEqual(len(other.local), 1)
+
+    async def test_invalidate_reaches_other_processes(self):
+        other = UserCache(local_ttl=60, redis_ttl=900, maxsize=100)
+        listener = asyncio.create_task(other.listen())
+        try:
+            for _ in range(50):
+                if await self.redis.pubsub_numsub(UserCache.channel) == [(UserCache.channel.encode(), 1)]:
+                    break
+                await asyncio.sleep(0.01)
+            await self.cache.set(make_user())
+            await other.get("deadpool@example.com")
+            self.assertEqual(len(other.local), 1)
+
+            await self.cache.invalidate("deadpool@example.com")
+            for _ in range(50):
+                if not len(other.local):
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual(len(other.local), 0)
+            self.assertEqual(len(self.cache.local), 0)
+            self.assertIsNone(await self.redis.get("user:deadpool@example.com"))
+        finally:
+            listener.cancel()
+
+    async def test_redis_errors_degrade_to_miss(self):
+        broken = MagicMock()
+        broken.get = AsyncMock(side_effect=ConnectionError("down"))
+        broken.set = AsyncMock(side_effect=ConnectionError("down"))
+        redis_client.set_redis(broken)
+        self.assertIsNone(await self.cache.get("deadpool@example.com"))
+        await self.cache.set(make_user())
+        self.assertEqual((await self.cache.get("deadpool@example.com")).id, 1)
+
+    async def test_works_without_redis(self):
+        redis_client.set_redis(None)
+        await self.cache.set(make_user())
+        self.assertEqual((await self.cache.get("deadpool@example.com")).id, 1)
+        await self.cache.invalidate("deadpool@example.com")
+        self.assertIsNone(await self.cache.get("deadpool@example.com"))
+
+
+
+class TestInvalidationListener(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = SilentRedis()
+        await self.server.start()
+        # Reads time out well before the next invalidation arrives
+        redis_client.set_redis(redis.Redis(host="127.0.0.1", port=self.server.port, socket_timeout=0.2))
+        self.cache = UserCache(local_ttl=60, redis_ttl=900, maxsize=100)
+
+    async def asyncTearDown(self):
+        redis_client.set_redis(None)
+        await self.server.stop()
+
+    async def test_idle_channel_keeps_local_tier(self):
+        listener = asyncio.create_task(self.cache.listen(poll_interval=0.5))
+        try:
+            for _ in range(50):
+                if self.server.subscriptions:
+                    break
+                await asyncio.sleep(0.01)
+            self.cache.local.set("deadpool@example.com", dump_user(make_user()))
+            with self.assertNoLogs("src.services.user_cache", "WARNING"):
+                await asyncio.sleep(1.2)
+            self.assertEqual(self.server.subscriptions, 1)
+            self.assertEqual(len(self.cache.local), 1)
+
+            self.server.publish(UserCache.channel, "deadpool@example.com")
+            for _ in range(100):
+                if not len(self.cache.local):
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual(len(self.cache.local), 0)
+        finally:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    unittest.main()